@@ -0,0 +1,119 @@
+# Copyright (c) 2023 Evan Palmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Compares the built-in packet codec against the generic ``crc``/``cobs`` packages.
+
+The reference implementation is only measured when the ``crc`` and ``cobs`` packages
+are installed.
+
+Examples:
+    $ python3 benchmarks/bench_codec.py
+"""
+
+from __future__ import annotations
+
+import struct
+import timeit
+from typing import Callable
+
+from pybravo import DeviceID, Packet, PacketID
+
+ITERATIONS = 20000
+
+
+def reference_codec() -> tuple | None:
+    """Create the encode/decode functions used by the original implementation.
+
+    Returns:
+        The reference encode and decode functions, or None if the reference packages
+        are not installed.
+    """
+    try:
+        from cobs import cobs
+        from crc import Calculator, Configuration
+    except ImportError:
+        return None
+
+    calculator = Calculator(
+        Configuration(
+            width=8,
+            polynomial=0x4D,
+            init_value=0x00,
+            final_xor_value=0xFF,
+            reverse_input=True,
+            reverse_output=True,
+        )
+    )
+
+    def encode(packet: Packet) -> bytes:
+        data = packet.data
+        data += struct.pack(
+            ">BBB", packet.packet_id.value, packet.device_id.value, len(data) + 4
+        )
+        data += struct.pack(">B", calculator.checksum(data))
+        return cobs.encode(data) + b"\x00"
+
+    def decode(data: bytes) -> Packet:
+        decoded = bytearray(cobs.decode(data[:-1]))
+        actual_crc = decoded.pop()
+        if not calculator.verify(decoded, actual_crc):
+            raise ValueError("The expected and actual CRC values do not match.")
+        decoded.pop()
+        device_id = decoded.pop()
+        packet_id = decoded.pop()
+        return Packet(DeviceID(device_id), PacketID(packet_id), bytes(decoded))
+
+    return encode, decode
+
+
+def measure(func: Callable, *args) -> float:
+    """Measure the average execution time of a function.
+
+    Args:
+        func: The function to measure.
+        args: The arguments to call the function with.
+
+    Returns:
+        The average execution time in microseconds.
+    """
+    return timeit.timeit(lambda: func(*args), number=ITERATIONS) / ITERATIONS * 1e6
+
+
+if __name__ == "__main__":
+    packet = Packet(DeviceID.BEND_ELBOW, PacketID.POSITION, struct.pack("<f", 1.5707))
+    frame = packet.encode()
+
+    reference = reference_codec()
+
+    print(f"{'operation':<10}{'pybravo (us)':>16}{'reference (us)':>18}{'speedup':>10}")
+
+    for name, func, arg in (
+        ("encode", Packet.encode, packet),
+        ("decode", Packet.decode, frame),
+    ):
+        ours = measure(func, arg)
+
+        if reference is None:
+            print(f"{name:<10}{ours:>16.2f}{'n/a':>18}{'n/a':>10}")
+            continue
+
+        ref_func = reference[0] if name == "encode" else reference[1]
+        theirs = measure(ref_func, arg)
+        print(f"{name:<10}{ours:>16.2f}{theirs:>18.2f}{theirs / ours:>9.1f}x")
@@ -0,0 +1,407 @@
+# Copyright (c) 2023 Evan Palmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Benchmarks the codec, the driver round trip, throughput, dispatch, and import time.
+
+The round-trip and throughput benchmarks run against the local ``BravoSimulator`` and a
+loopback UDP socket, so they don't require the physical arm. The results are written as
+JSON so that they can be compared across releases; pass a previous result file with
+``--compare`` to print the change in each metric.
+
+Examples:
+    $ python3 benchmarks/bench_suite.py --output results.json
+    $ python3 benchmarks/bench_suite.py --quick --compare results.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import platform
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+import timeit
+from datetime import datetime, timezone
+from importlib.metadata import PackageNotFoundError, version
+from typing import Callable
+
+from pybravo import BravoDriver, DeviceID, Packet, PacketID
+from pybravo.driver import Dispatcher, ThreadPoolDispatcher
+from pybravo.simulator import BravoSimulator
+
+# The payload sizes (bytes) used to benchmark the codec; 251 bytes is the largest
+# payload whose frame length still fits in the length byte
+PAYLOAD_SIZES = (1, 4, 16, 64, 128, 251)
+
+# The statements timed by the import benchmark; each one runs in a fresh interpreter
+IMPORTS = {
+    "interpreter": "pass",
+    "pybravo": "import pybravo",
+    "protocol": "from pybravo import Packet",
+    "driver": "from pybravo import BravoDriver",
+    "async_driver": "from pybravo import AsyncBravoDriver",
+}
+
+# The fraction of packets that may be lost before a send rate is considered unsustained
+MAX_LOSS = 0.001
+
+
+def percentiles(samples: list[float]) -> dict[str, float]:
+    """Summarize a list of latency samples.
+
+    Args:
+        samples: The samples (s).
+
+    Returns:
+        The mean, minimum, maximum, and 50th, 90th, and 99th percentiles (us).
+    """
+    ordered = sorted(samples)
+
+    def at(q: float) -> float:
+        return ordered[min(int(q / 100.0 * len(ordered)), len(ordered) - 1)] * 1e6
+
+    return {
+        "count": len(ordered),
+        "mean_us": sum(ordered) / len(ordered) * 1e6,
+        "min_us": ordered[0] * 1e6,
+        "max_us": ordered[-1] * 1e6,
+        "p50_us": at(50),
+        "p90_us": at(90),
+        "p99_us": at(99),
+    }
+
+
+def measure(func: Callable, iterations: int) -> float:
+    """Measure the average execution time of a function.
+
+    Args:
+        func: The function to measure.
+        iterations: The number of times to call the function.
+
+    Returns:
+        The average execution time (us).
+    """
+    return min(timeit.repeat(func, number=iterations, repeat=3)) / iterations * 1e6
+
+
+def bench_codec(iterations: int) -> dict:
+    """Measure the time taken to encode and decode packets of different sizes.
+
+    Args:
+        iterations: The number of times to encode and decode each packet.
+
+    Returns:
+        The encode and decode time (us) for each payload size.
+    """
+    results = {}
+
+    for size in PAYLOAD_SIZES:
+        packet = Packet(DeviceID.BEND_ELBOW, PacketID.POSITION, bytes(range(size)))
+        frame = packet.encode()
+
+        results[str(size)] = {
+            "encode_us": measure(packet.encode, iterations),
+            "decode_us": measure(lambda frame=frame: Packet.decode(frame), iterations),
+        }
+
+    return results
+
+
+def bench_round_trip(requests: int) -> dict:
+    """Measure the request/reply latency between the driver and the simulator.
+
+    Args:
+        requests: The number of requests to make.
+
+    Returns:
+        A summary of the round-trip latency.
+    """
+    samples = []
+
+    with BravoSimulator() as simulator:
+        bravo = BravoDriver()
+        bravo.connect(*simulator.address)
+
+        for _ in range(requests):
+            start = time.perf_counter()
+            bravo.request(DeviceID.BEND_ELBOW, PacketID.POSITION)
+            samples.append(time.perf_counter() - start)
+
+        bravo.disconnect()
+
+    return percentiles(samples)
+
+
+def send_at_rate(
+    sock: socket.socket, address: tuple, rate: float, duration: float
+) -> int:
+    """Send position packets at a fixed rate.
+
+    Args:
+        sock: The socket to send the packets with.
+        address: The address to send the packets to.
+        rate: The send rate (packets/s).
+        duration: The amount of time (s) to send packets for.
+
+    Returns:
+        The number of packets sent.
+    """
+    frame = Packet(DeviceID.BEND_ELBOW, PacketID.POSITION, struct.pack("<f", 1.0))
+    datagram = frame.encode()
+    count = int(rate * duration)
+    period = 1.0 / rate
+    start = time.perf_counter()
+
+    for i in range(count):
+        # Pace the packets against the start time so that the rate doesn't drift
+        while time.perf_counter() - start < i * period:
+            ...
+
+        sock.sendto(datagram, address)
+
+    return count
+
+
+def bench_throughput(duration: float, max_rate: float) -> dict:
+    """Find the highest rate at which the driver receives packets without drops.
+
+    The send rate is doubled until more than ``MAX_LOSS`` of the packets are lost.
+
+    Args:
+        duration: The amount of time (s) to send packets at each rate.
+        max_rate: The highest rate (packets/s) to try.
+
+    Returns:
+        The received fraction at each rate, and the highest sustained rate.
+    """
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sender.bind(("127.0.0.1", 0))
+
+    received = 0
+    lock = threading.Lock()
+
+    def on_position(packet: Packet) -> None:
+        nonlocal received
+        with lock:
+            received += 1
+
+    bravo = BravoDriver()
+    bravo.attach_callback(PacketID.POSITION, on_position)
+    bravo.connect(*sender.getsockname())
+
+    # The driver's socket is bound when it sends its first packet
+    bravo.send(Packet(DeviceID.BEND_ELBOW, PacketID.MODE, b"\x00"))
+    _, driver_address = sender.recvfrom(256)
+
+    rates = {}
+    sustained = 0.0
+    rate = 1000.0
+
+    while rate <= max_rate:
+        with lock:
+            received = 0
+
+        sent = send_at_rate(sender, driver_address, rate, duration)
+
+        # Give the driver time to drain the socket
+        time.sleep(0.2)
+
+        with lock:
+            ratio = received / sent
+
+        rates[str(int(rate))] = ratio
+
+        if 1.0 - ratio > MAX_LOSS:
+            break
+
+        sustained = rate
+        rate *= 2
+
+    bravo.disconnect()
+    sender.close()
+
+    return {"received_ratio": rates, "max_sustained_pps": sustained}
+
+
+def bench_dispatch(iterations: int) -> dict:
+    """Measure the overhead of dispatching a packet to a callback.
+
+    Args:
+        iterations: The number of packets to dispatch.
+
+    Returns:
+        The time (us) taken to call the callback directly, through the inline
+        dispatcher, and to queue the packet on the thread pool dispatcher.
+    """
+    packet = Packet(DeviceID.BEND_ELBOW, PacketID.POSITION, struct.pack("<f", 1.0))
+
+    def callback(packet: Packet) -> None:
+        ...
+
+    callbacks = [callback]
+    inline = Dispatcher()
+    pool = ThreadPoolDispatcher(queue_size=iterations * 4)
+    pool.start()
+
+    results = {
+        "direct_us": measure(lambda: callback(packet), iterations),
+        "inline_us": measure(lambda: inline.dispatch(callbacks, packet), iterations),
+        "thread_pool_us": measure(lambda: pool.dispatch(callbacks, packet), iterations),
+    }
+
+    pool.stop()
+
+    return results
+
+
+def bench_import(runs: int) -> dict:
+    """Measure the time taken to start an interpreter and import parts of pybravo.
+
+    The interpreter entry is the startup time without pybravo, which the other entries
+    include.
+
+    Args:
+        runs: The number of fresh interpreters to start for each import.
+
+    Returns:
+        A summary of the wall-clock time taken by each import.
+    """
+    results = {}
+
+    for name, statement in IMPORTS.items():
+        samples = []
+
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", statement], check=True)
+            samples.append(time.perf_counter() - start)
+
+        results[name] = percentiles(samples)
+
+    return results
+
+
+def metadata() -> dict:
+    """Describe the environment that the benchmarks were run in.
+
+    Returns:
+        The package version, Python version, platform, and time of the run.
+    """
+    try:
+        pybravo_version = version("pybravo")
+    except PackageNotFoundError:
+        pybravo_version = "unknown"
+
+    return {
+        "pybravo": pybravo_version,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def flatten(results: dict, prefix: str = "") -> dict[str, float]:
+    """Flatten nested benchmark results into dotted metric names.
+
+    Args:
+        results: The results to flatten.
+        prefix: The prefix of the metric names.
+
+    Returns:
+        The numeric metrics in the results.
+    """
+    metrics = {}
+
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+
+        if isinstance(value, dict):
+            metrics.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics[name] = float(value)
+
+    return metrics
+
+
+def compare(results: dict, baseline: dict) -> None:
+    """Print the change in each metric relative to a previous run.
+
+    Args:
+        results: The results of the current run.
+        baseline: The results of the previous run.
+    """
+    current = flatten(results["benchmarks"])
+    previous = flatten(baseline["benchmarks"])
+
+    print(f"{'metric':<48}{'baseline':>14}{'current':>14}{'change':>10}")
+
+    for name, value in current.items():
+        old = previous.get(name)
+
+        if old is None:
+            continue
+
+        change = (value - old) / old * 100 if old else math.nan
+        print(f"{name:<48}{old:>14.2f}{value:>14.2f}{change:>9.1f}%")
+
+
+def main() -> None:
+    """Run the benchmarks and write the results."""
+    parser = argparse.ArgumentParser(description="Benchmark pybravo.")
+    parser.add_argument("--output", help="The file to write the JSON results to.")
+    parser.add_argument("--compare", help="A previous result file to compare against.")
+    parser.add_argument(
+        "--quick", action="store_true", help="Run fewer iterations, e.g., in CI."
+    )
+    args = parser.parse_args()
+
+    scale = 0.1 if args.quick else 1.0
+
+    results = {
+        "metadata": metadata(),
+        "benchmarks": {
+            "codec": bench_codec(int(20000 * scale)),
+            "round_trip": bench_round_trip(int(2000 * scale)),
+            "throughput": bench_throughput(1.0 * scale, 512000.0),
+            "dispatch": bench_dispatch(int(100000 * scale)),
+            "import": bench_import(int(50 * scale)),
+        },
+    }
+
+    report = json.dumps(results, indent=2)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -26,12 +26,12 @@ to design and register callbacks.
 """
 
 import atexit
-import struct
 import sys
 import threading
 import time
 
 from pybravo import BravoDriver, DeviceID, Packet, PacketID
+from pybravo.protocol import decode_payload
 
 
 class JointReader:
@@ -86,13 +86,8 @@ class JointReader:
         Args:
             packet: A packet with a joint position measurement.
         """
-        # The unpacking order will need to change according to the system on which the
-        # data is received (i.e., Windows vs Linux)
-        position: float = struct.unpack("<f", packet.data)[0]
-
-        # The jaws are a linear joint; convert from mm to m
-        if packet.device_id == DeviceID.LINEAR_JAWS:
-            position *= 0.001
+        # The payload codec converts the jaw position from mm to m
+        (position,) = decode_payload(packet)
 
         # Save the joint positions at the same index as their ID
         self.joint_positions[packet.device_id.value - 1] = position
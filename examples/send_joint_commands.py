@@ -40,10 +40,12 @@ if __name__ == "__main__":
     # Specify the desird positions
     desired_positions = [10.0, 0.5, 1.5707, 1.5707, 1.5707, 2.8, 3.14159]
 
-    # Create the packets and send them to the Bravo
-    for i, position in enumerate(desired_positions):
-        packet = Packet(DeviceID(i + 1), PacketID.POSITION, struct.pack("<f", position))
-        bravo.send(packet)
+    # Create the packets and send them to the Bravo in a single datagram
+    packets = [
+        Packet(DeviceID(i + 1), PacketID.POSITION, struct.pack("<f", position))
+        for i, position in enumerate(desired_positions)
+    ]
+    bravo.send_many(packets)
 
     # Shutdown the connection
     bravo.disconnect()
@@ -18,7 +18,72 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-from .driver import BravoDriver
-from .protocol import DeviceID, Packet, PacketID
+"""A Python interface for the Reach Bravo 7 manipulator.
 
-__all__ = ["BravoDriver", "Packet", "PacketID", "DeviceID"]
+The package exports are loaded lazily, so ``import pybravo`` is cheap: the protocol
+is loaded the first time that a packet type is used, and the drivers (along with
+asyncio, the socket transports, and shared memory) are loaded the first time that a
+driver is used.
+
+Examples:
+    >>> from pybravo import BravoDriver, DeviceID, Packet, PacketID
+    >>> bravo = BravoDriver()
+    >>> bravo.connect()
+"""
+
+from __future__ import annotations
+
+import importlib
+
+# Importing typing takes longer than the rest of the package import, so the constant is
+# defined here instead; type checkers treat it the same way as typing.TYPE_CHECKING
+TYPE_CHECKING = False
+
+if TYPE_CHECKING:
+    from typing import Any
+
+    from .driver import AsyncBravoDriver, BravoDriver
+    from .protocol import DeviceID, Packet, PacketID
+
+# The module that defines each of the package exports
+_EXPORTS = {
+    "AsyncBravoDriver": ".driver",
+    "BravoDriver": ".driver",
+    "DeviceID": ".protocol",
+    "Packet": ".protocol",
+    "PacketID": ".protocol",
+}
+
+__all__ = ["AsyncBravoDriver", "BravoDriver", "Packet", "PacketID", "DeviceID"]
+
+
+def __getattr__(name: str) -> Any:
+    """Load a package export the first time that it is used.
+
+    Args:
+        name: The name of the export.
+
+    Returns:
+        The exported object.
+
+    Raises:
+        AttributeError: The package doesn't export the name.
+    """
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+
+    # Cache the export so that later lookups don't go through this function
+    globals()[name] = value
+
+    return value
+
+
+def __dir__() -> list[str]:
+    """List the package attributes, including the exports that aren't loaded yet.
+
+    Returns:
+        The names of the package attributes.
+    """
+    return sorted(set(globals()) | set(__all__))
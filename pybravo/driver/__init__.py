@@ -18,6 +18,128 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-from .driver import BravoDriver
+"""Drivers, transports, and tooling for communicating with the Bravo 7.
 
-__all__ = ["BravoDriver"]
+The exports are loaded lazily, so using one driver doesn't import the modules behind
+the others: ``BravoDriver`` doesn't load asyncio, and neither driver loads the
+shared-memory fan-out until ``TelemetryPublisher`` is used.
+
+Examples:
+    >>> from pybravo.driver import BravoDriver, DriverMetrics
+    >>> bravo = BravoDriver(metrics=DriverMetrics())
+"""
+
+from __future__ import annotations
+
+import importlib
+
+# Importing typing takes longer than the rest of the package import, so the constant is
+# defined here instead; type checkers treat it the same way as typing.TYPE_CHECKING
+TYPE_CHECKING = False
+
+if TYPE_CHECKING:
+    from typing import Any
+
+    from .async_driver import AsyncBravoDriver
+    from .dispatch import BackpressurePolicy, Dispatcher, ThreadPoolDispatcher
+    from .driver import BravoDriver
+    from .fleet import BravoFleet, FleetArm
+    from .heartbeat import HeartbeatManager
+    from .metrics import DriverMetrics, MetricsExporter
+    from .recorder import Record, TelemetryLog, TelemetryRecorder
+    from .routing import CallbackRouter
+    from .scheduler import CommandScheduler
+    from .shared import TelemetryPublisher, TelemetrySubscriber
+    from .state import JointState, JointStateCache
+    from .transport import (
+        SerialTransport,
+        SocketOptions,
+        TcpTransport,
+        Transport,
+        UdpTransport,
+    )
+
+# The submodule that defines each of the package exports
+_EXPORTS = {
+    "AsyncBravoDriver": ".async_driver",
+    "BackpressurePolicy": ".dispatch",
+    "BravoDriver": ".driver",
+    "BravoFleet": ".fleet",
+    "CallbackRouter": ".routing",
+    "CommandScheduler": ".scheduler",
+    "Dispatcher": ".dispatch",
+    "DriverMetrics": ".metrics",
+    "FleetArm": ".fleet",
+    "HeartbeatManager": ".heartbeat",
+    "JointState": ".state",
+    "JointStateCache": ".state",
+    "MetricsExporter": ".metrics",
+    "Record": ".recorder",
+    "TelemetryLog": ".recorder",
+    "TelemetryPublisher": ".shared",
+    "TelemetryRecorder": ".recorder",
+    "TelemetrySubscriber": ".shared",
+    "SerialTransport": ".transport",
+    "SocketOptions": ".transport",
+    "TcpTransport": ".transport",
+    "ThreadPoolDispatcher": ".dispatch",
+    "Transport": ".transport",
+    "UdpTransport": ".transport",
+}
+
+__all__ = [
+    "AsyncBravoDriver",
+    "BackpressurePolicy",
+    "BravoDriver",
+    "BravoFleet",
+    "CallbackRouter",
+    "CommandScheduler",
+    "Dispatcher",
+    "DriverMetrics",
+    "FleetArm",
+    "HeartbeatManager",
+    "JointState",
+    "JointStateCache",
+    "MetricsExporter",
+    "Record",
+    "TelemetryLog",
+    "TelemetryPublisher",
+    "TelemetryRecorder",
+    "TelemetrySubscriber",
+    "SerialTransport",
+    "SocketOptions",
+    "TcpTransport",
+    "ThreadPoolDispatcher",
+    "Transport",
+    "UdpTransport",
+]
+
+
+def __getattr__(name: str) -> Any:
+    """Load a package export the first time that it is used.
+
+    Args:
+        name: The name of the export.
+
+    Returns:
+        The exported object.
+
+    Raises:
+        AttributeError: The package doesn't export the name.
+    """
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+
+    return value
+
+
+def __dir__() -> list[str]:
+    """List the package attributes, including the exports that aren't loaded yet.
+
+    Returns:
+        The names of the package attributes.
+    """
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,339 @@
+# Copyright (c) 2023 Evan Palmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Provides an asyncio interface to the Reach Bravo 7 manipulator.
+
+The ``AsyncBravoDriver`` provides the same interface as the ``BravoDriver``, but runs
+on an asyncio event loop instead of a dedicated polling thread. Callbacks are executed
+on the event loop, and may be either regular functions or coroutine functions.
+
+Examples:
+    >>> bravo = AsyncBravoDriver()
+    >>> await bravo.connect()
+    >>> packet = await bravo.request(DeviceID.BEND_ELBOW, PacketID.POSITION)
+    >>> bravo.disconnect()
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import inspect
+import logging
+import time
+from typing import TYPE_CHECKING, Iterable
+
+from pybravo.driver.mixins import CallbacksMixin
+from pybravo.driver.requests import PendingRequests
+from pybravo.driver.routing import CallbackRouter
+from pybravo.driver.state import JointStateCache
+from pybravo.protocol import DeviceID, Packet, PacketID, PacketStreamDecoder
+from pybravo.protocol.packet import DEFAULT_MTU
+
+if TYPE_CHECKING:
+    from pybravo.driver.metrics import DriverMetrics
+    from pybravo.driver.recorder import TelemetryRecorder
+    from pybravo.kinematics import SafetyModel
+
+
+class _BravoProtocol(asyncio.DatagramProtocol):
+    """Forwards datagrams received from the Bravo 7 to the driver."""
+
+    def __init__(self, driver: AsyncBravoDriver) -> None:
+        """Create a new protocol.
+
+        Args:
+            driver: The driver to forward the received data to.
+        """
+        self._driver = driver
+
+    def datagram_received(self, data: bytes, addr: tuple[str, int]) -> None:
+        """Handle a datagram received from the Bravo 7.
+
+        Args:
+            data: The received data.
+            addr: The address that the data was received from.
+        """
+        self._driver._on_data(data)
+
+    def error_received(self, exc: Exception) -> None:
+        """Handle an error raised by the underlying socket.
+
+        Args:
+            exc: The raised exception.
+        """
+        self._driver._logger.debug(f"The connection received an error: {exc}")
+
+
+class AsyncBravoDriver(CallbacksMixin):
+    """Asyncio interface for sending and receiving serial data from the Bravo 7."""
+
+    def __init__(self, metrics: DriverMetrics | None = None) -> None:
+        """Create a new driver.
+
+        Args:
+            metrics: The metrics to update with the driver's traffic. Defaults to
+                None, which disables metrics.
+        """
+        self.callbacks = CallbackRouter()
+
+        # Set the address to none during configuration to enable changing the address
+        # when the connection happens
+        self.address: tuple[str, int] | None = None
+
+        self._logger = logging.getLogger("AsyncBravoDriver")
+
+        self._transport: asyncio.DatagramTransport | None = None
+        self._decoder = PacketStreamDecoder(on_error=self._on_decode_error)
+
+        # Requests that are waiting for a reply from the Bravo
+        self._requests = PendingRequests()
+
+        # The latest state reported by each joint
+        self.state = JointStateCache()
+
+        # Records each received packet when attached
+        self.recorder: TelemetryRecorder | None = None
+
+        # Checks the outgoing commands before they are sent
+        self.guard: SafetyModel | None = None
+
+        # The tasks running coroutine callbacks. The event loop only keeps weak
+        # references to its tasks, so they are kept here until they finish.
+        self._callback_tasks: set[asyncio.Future] = set()
+
+        self.metrics = metrics
+
+    async def connect(self, ip: str = "192.168.2.3", port: int = 6789) -> None:
+        """Establish a connection between the Bravo 7 and the driver.
+
+        Args:
+            ip: The IP address of the Bravo 7. Defaults to "192.168.2.3".
+            port: The port to connect with the Bravo 7 over. Defaults to 6789.
+        """
+        loop = asyncio.get_running_loop()
+
+        self._transport, _ = await loop.create_datagram_endpoint(
+            lambda: _BravoProtocol(self), remote_addr=(ip, port)
+        )
+        self.address = (ip, port)
+
+        self._logger.info(
+            "Successfully established a connection to the Reach Bravo 7 manipulator."
+        )
+
+    def disconnect(self) -> None:
+        """Disconnect the driver from the Bravo 7.
+
+        Any requests that are still waiting for a reply are cancelled.
+        """
+        self.address = None
+
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+        self._requests.cancel_all()
+        self._decoder.reset()
+
+        self._logger.info(
+            "Successfully shut down the connection to the Reach Bravo 7 manipulator."
+        )
+
+    def send(self, packet: Packet) -> None:
+        """Send a packet to the Bravo 7.
+
+        Args:
+            packet: The serial packet to send.
+
+        Raises:
+            UnsafeCommandError: The guard rejected the command.
+        """
+        if self._transport is None:
+            raise RuntimeError(
+                "Packets can't be sent without first establishing a connection!"
+            )
+
+        if self.guard is not None:
+            self.guard.check([packet], self.state)
+
+        frame = packet.encode()
+        self._transport.sendto(frame)
+
+        if self.metrics is not None:
+            self.metrics.record_tx([packet], [frame])
+
+    def send_many(self, packets: Iterable[Packet], mtu: int = DEFAULT_MTU) -> None:
+        """Send several packets to the Bravo 7 using as few datagrams as possible.
+
+        Args:
+            packets: The serial packets to send.
+            mtu: The maximum size of a single datagram. Defaults to 1472.
+
+        Raises:
+            UnsafeCommandError: The guard rejected one of the commands. No packets are
+                sent in this case.
+        """
+        if self._transport is None:
+            raise RuntimeError(
+                "Packets can't be sent without first establishing a connection!"
+            )
+
+        packets = list(packets)
+
+        if self.guard is not None:
+            self.guard.check(packets, self.state)
+
+        datagrams = Packet.encode_many(packets, mtu)
+
+        for datagram in datagrams:
+            self._transport.sendto(datagram)
+
+        if self.metrics is not None:
+            self.metrics.record_tx(packets, datagrams)
+
+    async def request(
+        self, device_id: DeviceID, packet_id: PacketID, timeout: float = 1.0
+    ) -> Packet:
+        """Request a packet from a device and wait for the reply.
+
+        If a request for the same device and packet type is already in flight, no new
+        packet is sent, and both requests are completed by the same reply.
+
+        Args:
+            device_id: The device to request the packet from. This must be a single
+                device; use a callback to handle replies to ``DeviceID.ALL_JOINTS``.
+            packet_id: The type of packet to request.
+            timeout: The maximum amount of time (s) to wait for the reply. Defaults to
+                1.0.
+
+        Raises:
+            ValueError: A request was made to all joints.
+            asyncio.TimeoutError: The reply was not received before the timeout.
+
+        Returns:
+            The reply from the device.
+        """
+        if device_id == DeviceID.ALL_JOINTS:
+            raise ValueError("Requests must be made to a single device.")
+
+        future, in_flight = self._requests.add(device_id, packet_id, timeout)
+        start = time.monotonic()
+
+        try:
+            if not in_flight:
+                self.send(Packet(device_id, PacketID.REQUEST, bytes([packet_id.value])))
+
+            reply = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+
+            if self.metrics is not None:
+                self.metrics.request_latency.record(time.monotonic() - start)
+
+            return reply
+        finally:
+            self._requests.discard(device_id, packet_id, future)
+
+    def attach_recorder(self, recorder: TelemetryRecorder | None) -> None:
+        """Record each packet received from the Bravo 7.
+
+        Args:
+            recorder: The recorder to write the packets to, or None to stop recording.
+        """
+        self.recorder = recorder
+
+    def attach_guard(self, guard: SafetyModel | None) -> None:
+        """Check each outgoing command against a safety model before sending it.
+
+        Args:
+            guard: The model to check the commands against, or None to stop checking.
+        """
+        self.guard = guard
+
+    def _on_data(self, data: bytes) -> None:
+        """Decode the received data and handle each packet.
+
+        Args:
+            data: The data received from the Bravo 7.
+        """
+        recorder = self.recorder
+        packets = self._decoder.feed(data)
+
+        if self.metrics is not None:
+            self.metrics.record_rx(packets, len(data))
+
+        for packet in packets:
+            if recorder is not None:
+                recorder.record(packet)
+
+            self.state.update(packet)
+            self._requests.resolve(packet)
+            self._dispatch(packet)
+
+    def _dispatch(self, packet: Packet) -> None:
+        """Execute the callbacks registered for a packet.
+
+        Args:
+            packet: The received packet.
+        """
+        for cb in self.callbacks.route(packet):
+            try:
+                result = cb(packet)
+                if inspect.isawaitable(result):
+                    task = asyncio.ensure_future(result)
+                    self._callback_tasks.add(task)
+                    task.add_done_callback(
+                        functools.partial(self._on_callback_done, packet)
+                    )
+            except Exception as e:
+                self._logger.warning(
+                    "An exception occurred while trying to execute a callback"
+                    f" for the packet {packet}: {e}"
+                )
+
+    def _on_callback_done(self, packet: Packet, task: asyncio.Future) -> None:
+        """Release a finished coroutine callback and log its exception.
+
+        Args:
+            packet: The packet that the callback was executed for.
+            task: The task that ran the callback.
+        """
+        self._callback_tasks.discard(task)
+
+        if task.cancelled() or task.exception() is None:
+            return
+
+        self._logger.warning(
+            "An exception occurred while trying to execute a callback"
+            f" for the packet {packet}: {task.exception()}"
+        )
+
+    def _on_decode_error(self, frame: bytes, error: Exception) -> None:
+        """Log a frame that could not be decoded.
+
+        Args:
+            frame: The frame that could not be decoded.
+            error: The exception raised while decoding the frame.
+        """
+        if self.metrics is not None:
+            self.metrics.record_decode_error(error)
+
+        self._logger.debug(
+            f"An error occurred while attempting to decode the data {frame!r}: {error}"
+        )
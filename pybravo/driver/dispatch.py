@@ -0,0 +1,242 @@
+# Copyright (c) 2023 Evan Palmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Provides strategies for executing the callbacks registered with the driver.
+
+By default, callbacks are executed inline on the thread that receives the packets. The
+``ThreadPoolDispatcher`` instead hands packets off to a bounded queue that is drained
+by a pool of worker threads, so that slow callbacks never block the socket reads.
+
+Examples:
+    >>> dispatcher = ThreadPoolDispatcher(
+            workers=2, queue_size=256, policy=BackpressurePolicy.DROP_OLDEST
+        )
+    >>> bravo = BravoDriver(dispatcher=dispatcher)
+    >>> dispatcher.callback_stats[my_callback].snapshot()["p99"]
+    0.00012
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from enum import Enum
+from typing import Callable, Sequence
+
+from pybravo.driver.stats import LatencyStats
+from pybravo.protocol import Packet
+
+
+class BackpressurePolicy(Enum):
+    """The action to take when the dispatch queue is full."""
+
+    DROP_OLDEST = "drop_oldest"
+    DROP_NEWEST = "drop_newest"
+    BLOCK = "block"
+
+
+class Dispatcher:
+    """Executes callbacks inline on the thread that received the packet."""
+
+    def __init__(self) -> None:
+        """Create a new dispatcher."""
+        # Latency statistics for each callback that has been executed
+        self.callback_stats: dict[Callable, LatencyStats] = {}
+
+        # The function to call when a callback raises an exception; this is set by the
+        # driver that owns the dispatcher
+        self.on_error: Callable[[Packet, Exception], None] | None = None
+
+    def start(self) -> None:
+        """Start dispatching callbacks."""
+
+    def stop(self) -> None:
+        """Stop dispatching callbacks."""
+
+    def dispatch(self, callbacks: Sequence[Callable], packet: Packet) -> None:
+        """Execute the callbacks for a packet.
+
+        Args:
+            callbacks: The callbacks to execute.
+            packet: The packet to pass to the callbacks.
+        """
+        self._run(callbacks, packet)
+
+    def _run(self, callbacks: Sequence[Callable], packet: Packet) -> None:
+        """Execute the callbacks and record how long each one takes.
+
+        Args:
+            callbacks: The callbacks to execute.
+            packet: The packet to pass to the callbacks.
+        """
+        for cb in callbacks:
+            start = time.perf_counter()
+
+            try:
+                cb(packet)
+            except Exception as e:
+                if self.on_error is not None:
+                    self.on_error(packet, e)
+
+            stats = self.callback_stats.get(cb)
+
+            if stats is None:
+                stats = self.callback_stats.setdefault(cb, LatencyStats())
+
+            stats.record(time.perf_counter() - start)
+
+
+class ThreadPoolDispatcher(Dispatcher):
+    """Executes callbacks on a pool of worker threads fed by a bounded queue."""
+
+    def __init__(
+        self,
+        workers: int = 1,
+        queue_size: int = 1024,
+        policy: BackpressurePolicy = BackpressurePolicy.DROP_OLDEST,
+    ) -> None:
+        """Create a new thread pool dispatcher.
+
+        Packets are only guaranteed to be handled in the order that they were received
+        when a single worker is used.
+
+        Args:
+            workers: The number of worker threads. Defaults to 1.
+            queue_size: The maximum number of packets waiting to be handled. Defaults
+                to 1024.
+            policy: The action to take when the queue is full. Defaults to
+                ``BackpressurePolicy.DROP_OLDEST``.
+        """
+        super().__init__()
+
+        if workers < 1:
+            raise ValueError("At least one worker thread is required.")
+
+        self.workers = workers
+        self.policy = policy
+
+        # The number of packets that were discarded because the queue was full
+        self.dropped = 0
+
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._threads: list[threading.Thread] = []
+
+        # The workers that called ``stop`` from a callback, which exit once the
+        # callback returns
+        self._retired: set[threading.Thread] = set()
+
+    def start(self) -> None:
+        """Start the worker threads."""
+        if self._threads:
+            return
+
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._work, name=f"BravoDispatcher-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        """Stop the worker threads once the queued packets have been handled.
+
+        When called from a callback running on a worker, that worker exits after the
+        callback returns instead of being joined. If it is the only worker, nothing is
+        left to drain the queue, so the queued packets are discarded.
+        """
+        current = threading.current_thread()
+        others = [thread for thread in self._threads if thread is not current]
+
+        if len(others) < len(self._threads):
+            self._retired.add(current)
+
+            # The calling worker can't wait for space in the queue that only it drains
+            if not others:
+                self._discard_queued()
+
+        # The other workers keep draining the queue, so there will be space for these
+        for _ in others:
+            self._queue.put(None)
+
+        for thread in others:
+            thread.join()
+
+        self._threads.clear()
+
+    def dispatch(self, callbacks: Sequence[Callable], packet: Packet) -> None:
+        """Queue the callbacks for a packet to be executed by a worker thread.
+
+        Args:
+            callbacks: The callbacks to execute.
+            packet: The packet to pass to the callbacks.
+        """
+        item = (callbacks, packet)
+
+        if self.policy == BackpressurePolicy.BLOCK:
+            self._queue.put(item)
+            return
+
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                self.dropped += 1
+
+                if self.policy == BackpressurePolicy.DROP_NEWEST:
+                    return
+
+            # Make space for the new packet by discarding the oldest one
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                ...
+
+    @property
+    def backlog(self) -> int:
+        """Get the number of packets waiting to be handled.
+
+        Returns:
+            The approximate size of the queue.
+        """
+        return self._queue.qsize()
+
+    def _work(self) -> None:
+        """Execute queued callbacks until the dispatcher is stopped."""
+        while True:
+            item = self._queue.get()
+
+            if item is None:
+                return
+
+            self._run(*item)
+
+            if threading.current_thread() in self._retired:
+                self._retired.discard(threading.current_thread())
+                return
+
+    def _discard_queued(self) -> None:
+        """Discard the packets waiting in the queue."""
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                return
@@ -23,6 +23,9 @@
 The ``BravoDriver`` provides an interface for sending and receiving serial data from the
 Reach Bravo 7 manipulator.
 
+The driver communicates with the Bravo over UDP by default. Other links, such as TCP or
+a serial port, can be used by passing a ``Transport`` to ``connect``.
+
 Examples:
     >>> bravo = BravoDriver()
     >>> bravo.connect()
@@ -35,19 +38,74 @@ from __future__ import annotations
 
 import atexit
 import logging
+import select
 import socket
 import threading
-from typing import Callable
+import time
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Callable, Iterable
+
+from pybravo.driver.dispatch import Dispatcher
+from pybravo.driver.mixins import CallbacksMixin, RequestsMixin
+from pybravo.driver.requests import PendingRequests
+from pybravo.driver.routing import CallbackRouter
+from pybravo.driver.state import JointStateCache
+from pybravo.driver.transport import Address, Transport, UdpTransport
+from pybravo.protocol import Packet, PacketStreamDecoder
+from pybravo.protocol.packet import DEFAULT_MTU
+from pybravo.protocol.stream import ReceiveRing, decode_in_place
+
+if TYPE_CHECKING:
+    from pybravo.driver.metrics import DriverMetrics
+    from pybravo.driver.recorder import TelemetryRecorder
+    from pybravo.kinematics import SafetyModel
+
+# The maximum number of bytes to read from the socket at once. The Bravo may batch
+# several packets into a single datagram, so this needs to be larger than one packet.
+RECV_BUFFER_SIZE = 4096
+
+# The maximum amount of time (s) that the polling thread blocks while waiting for data
+POLL_TIMEOUT = 1.0
 
-from pybravo.protocol import Packet, PacketID
+# The amount of time (s) to wait before the second reconnection attempt; the delay is
+# doubled after each failed attempt
+RECONNECT_DELAY = 0.1
+MAX_RECONNECT_DELAY = 5.0
 
 
-class BravoDriver:
+class BravoDriver(CallbacksMixin, RequestsMixin):
     """Low-level interface for sending and receiving serial data from the Bravo 7."""
 
-    def __init__(self) -> None:
-        """Create a new driver."""
-        self.callbacks: dict[PacketID, list[Callable]] = {}
+    def __init__(
+        self,
+        dispatcher: Dispatcher | None = None,
+        zero_copy: bool = False,
+        ring_size: int = 64,
+        metrics: DriverMetrics | None = None,
+    ) -> None:
+        """Create a new driver.
+
+        Args:
+            dispatcher: The strategy used to execute the registered callbacks. Use a
+                ``ThreadPoolDispatcher`` to keep slow callbacks from blocking the
+                polling thread. Defaults to executing the callbacks inline on the
+                polling thread.
+            zero_copy: Receive into a ring of preallocated buffers and decode the
+                packets in place. The data of each received packet is a view into the
+                ring, which is only valid until ``ring_size`` more datagrams have been
+                received; callbacks that keep the data must copy it. Defaults to False.
+            ring_size: The number of buffers in the receive ring when ``zero_copy`` is
+                enabled. This should be larger than the dispatcher queue when using a
+                ``ThreadPoolDispatcher``. Defaults to 64.
+            metrics: The metrics to update with the driver's traffic. Defaults to
+                None, which disables metrics.
+        """
+        self.callbacks = CallbackRouter()
+
+        # Callbacks to execute each time a connection is established
+        self.connect_callbacks: list[Callable[[], None]] = []
+
+        self.dispatcher = dispatcher if dispatcher is not None else Dispatcher()
 
         # Leave this private because we don't want anyone to accidentally disable the
         # polling thread
@@ -55,47 +113,148 @@ class BravoDriver:
 
         # Set the address to none during configuration to enable changing the address
         # when the connection happens
-        self.address: tuple[str, int] | None = None
+        self.address: Address | None = None
+
+        # The link to the Bravo, which is created when the connection happens
+        self.transport: Transport | None = None
 
-        # Configure the logger
-        logging.basicConfig()
         self._logger = logging.getLogger("BravoDriver")
-        self._logger.setLevel(logging.INFO)
 
-        # Create a thread to poll for incoming packets
-        self._poll_t = threading.Thread(target=self._poll)
-        self._poll_t.setDaemon(True)
+        # A single datagram may contain several packets, so we need to split the
+        # received data into frames before decoding
+        self._decoder = PacketStreamDecoder(on_error=self._on_decode_error)
+        self._ring = ReceiveRing(ring_size, RECV_BUFFER_SIZE) if zero_copy else None
 
-        # Shutdown the connection on exit
-        atexit.register(self.disconnect)
+        # Requests that are waiting for a reply from the Bravo
+        self._requests = PendingRequests()
+
+        # The latest state reported by each joint
+        self.state = JointStateCache()
+
+        # Records each received packet when attached
+        self.recorder: TelemetryRecorder | None = None
+
+        # Checks the outgoing commands before they are sent
+        self.guard: SafetyModel | None = None
+
+        self.dispatcher.on_error = self._on_callback_error
+
+        self.metrics = metrics
+
+        if metrics is not None:
+            metrics.callback_stats = self.dispatcher.callback_stats
 
-    def connect(self, ip: str = "192.168.2.3", port: int = 6789) -> None:
+        # Reopen the transport when it fails, waiting longer after each failed attempt
+        # up to the maximum delay (s)
+        self.reconnect = True
+        self.max_reconnect_delay = MAX_RECONNECT_DELAY
+
+        # The thread that polls for incoming packets, which is created each time a
+        # connection is established
+        self._poll_t: threading.Thread | None = None
+
+        # Writing to the wakeup socket interrupts the polling thread, e.g., to shut it
+        # down without waiting for the poll timeout
+        self._wakeup_r: socket.socket | None = None
+        self._wakeup_w: socket.socket | None = None
+
+    def __enter__(self) -> BravoDriver:
+        """Use the driver as a context manager that disconnects on exit.
+
+        Returns:
+            The driver.
+        """
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Disconnect the driver."""
+        self.disconnect()
+
+    def connect(
+        self,
+        ip: str = "192.168.2.3",
+        port: int = 6789,
+        transport: Transport | None = None,
+    ) -> None:
         """Establish a connection between the Bravo 7 and the driver.
 
         Args:
             ip: The IP address of the Bravo 7. Defaults to "192.168.2.4".
             port: The port to connect with the Bravo 7 over. Defaults to 6789.
+            transport: The link to use instead of UDP, e.g., a ``SerialTransport``.
+                The IP address and port are ignored when a transport is provided.
+                Defaults to a ``UdpTransport`` for the IP address and port.
+
+        Raises:
+            RuntimeError: The driver is already connected.
         """
-        self.address = (ip, port)
+        if self._poll_t is not None:
+            raise RuntimeError("The driver is already connected.")
+
+        if transport is None:
+            transport = UdpTransport(ip, port)
+
+        transport.open()
 
-        # Configure a new socket with the Bravo
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.sock.settimeout(1)
+        self.transport = transport
+        self.address = transport.address
+        self._decoder.reset()
+
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+
+        self.dispatcher.start()
 
         self._running = True
+        self._poll_t = threading.Thread(
+            target=self._poll, name="BravoDriver", daemon=True
+        )
         self._poll_t.start()
+
+        # Shutdown the connection on exit
+        atexit.register(self.disconnect)
+
         self._logger.info(
             "Successfully established a connection to the Reach Bravo 7 manipulator."
         )
 
+        self._run_connect_callbacks()
+
     def disconnect(self) -> None:
-        """Disconnect the driver from the Bravo 7."""
+        """Disconnect the driver from the Bravo 7.
+
+        This returns immediately if the driver isn't connected.
+        """
+        if self._poll_t is None:
+            return
+
         # Reset the address for future connections
         self.address = None
 
-        # Stop the thread
+        # Stop the thread; it can't be joined from a callback running on it
         self._running = False
-        self._poll_t.join()
+        self._wakeup()
+
+        if self._poll_t is not threading.current_thread():
+            self._poll_t.join()
+
+        self._poll_t = None
+        self.dispatcher.stop()
+        self._requests.cancel_all()
+
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+
+        for sock in (self._wakeup_r, self._wakeup_w):
+            if sock is not None:
+                sock.close()
+
+        self._wakeup_r = self._wakeup_w = None
+
+        atexit.unregister(self.disconnect)
+
         self._logger.info(
             "Successfully shut down the connection to the Reach Bravo 7 manipulator."
         )
@@ -105,58 +264,311 @@ class BravoDriver:
 
         Args:
             packet: The serial packet to send.
+
+        Raises:
+            UnsafeCommandError: The guard rejected the command.
         """
         if self.address is None:
             raise RuntimeError(
                 "Packets can't be sent without first establishing a connection!"
             )
 
-        self.sock.sendto(packet.encode(), self.address)
+        if self.guard is not None:
+            self.guard.check([packet], self.state)
 
-    def attach_callback(self, packet_id: PacketID, callback: Callable) -> None:
-        """Bind a callback to the given packet type.
+        frame = packet.encode()
+        self.transport.send(frame)  # type: ignore
+
+        if self.metrics is not None:
+            self.metrics.record_tx([packet], [frame])
+
+    def send_many(self, packets: Iterable[Packet], mtu: int = DEFAULT_MTU) -> None:
+        """Send several packets to the Bravo 7 using as few datagrams as possible.
+
+        This is useful for sending a command to each joint during a single control
+        step without incurring the overhead of a separate datagram for each joint.
 
         Args:
-            packet_id: The ID of the packet that, when received, should signal the
-                callback.
-            callback: The callback to execute when a packet with the given ID is
-                received.
+            packets: The serial packets to send.
+            mtu: The maximum size of a single datagram. Defaults to 1472.
+
+        Raises:
+            UnsafeCommandError: The guard rejected one of the commands. No packets are
+                sent in this case.
         """
-        # We want to allow multiple callbacks to be attached to one packet ID
-        if packet_id not in self.callbacks:
-            self.callbacks[packet_id] = []
+        if self.address is None:
+            raise RuntimeError(
+                "Packets can't be sent without first establishing a connection!"
+            )
+
+        packets = list(packets)
 
-        # Don't allow duplicate callbacks to be added to the list. This would result
-        # In the callback being run multiple times when a packet is received.
-        if callback not in self.callbacks[packet_id]:
-            self.callbacks[packet_id].append(callback)
+        if self.guard is not None:
+            self.guard.check(packets, self.state)
+
+        datagrams = Packet.encode_many(packets, mtu)
+
+        self.transport.send_batch(datagrams)  # type: ignore
+
+        if self.metrics is not None:
+            self.metrics.record_tx(packets, datagrams)
+
+    def attach_connect_callback(self, callback: Callable[[], None]) -> None:
+        """Bind a callback to be executed each time a connection is established.
+
+        Args:
+            callback: The callback to execute after connecting to the Bravo 7.
+        """
+        if callback not in self.connect_callbacks:
+            self.connect_callbacks.append(callback)
+
+    def attach_recorder(self, recorder: TelemetryRecorder | None) -> None:
+        """Record each packet received from the Bravo 7.
+
+        Args:
+            recorder: The recorder to write the packets to, or None to stop recording.
+        """
+        self.recorder = recorder
+
+    def attach_guard(self, guard: SafetyModel | None) -> None:
+        """Check each outgoing command against a safety model before sending it.
+
+        Args:
+            guard: The model to check the commands against, or None to stop checking.
+        """
+        self.guard = guard
 
     def _poll(self) -> None:
-        """Poll the socket for new data and call the registered callbacks."""
+        """Poll the transport for new data and call the registered callbacks."""
         while self._running:
+            # Wake up in time to fail any requests that have timed out
+            self._requests.expire()
+
             try:
-                read_data, _ = self.sock.recvfrom(256)
-            except BaseException:
-                ...
-            else:
-                if read_data == b"":
+                readable, _, _ = select.select(
+                    [self.transport, self._wakeup_r], [], [], self._poll_timeout()
+                )
+
+                if self._wakeup_r in readable:
+                    self._drain_wakeup()
+
+                if self.transport not in readable:
                     continue
 
-                try:
-                    packet = Packet.decode(read_data)
-                except Exception as e:
-                    self._logger.debug(
-                        "An error occurred while attempting to decode the"
-                        f" data: {read_data!r}",
-                        e,
-                    )
-                else:
-                    try:
-                        for cb in self.callbacks[packet.packet_id]:
-                            cb(packet)
-                    except Exception as e:
-                        self._logger.warning(
-                            "An exception occurred while trying to execute a callback"
-                            f" for the packet {packet}.",
-                            e,
-                        )
+                received = self._receive()
+            except (OSError, ValueError) as e:
+                if not self._running:
+                    return
+
+                if self.metrics is not None:
+                    self.metrics.record_socket_error()
+
+                self._logger.warning(f"Failed to receive data from the Bravo 7: {e}")
+
+                if not self.reconnect or not self._reconnect():
+                    return
+            else:
+                recorder = self.recorder
+
+                for packets, stamp in received:
+                    for packet in packets:
+                        if recorder is not None:
+                            recorder.record(packet, stamp)
+
+                        self.state.update(packet, stamp)
+                        self._requests.resolve(packet)
+                        self._dispatch(packet)
+
+    def _reconnect(self) -> bool:
+        """Reopen the transport, waiting longer after each failed attempt.
+
+        Returns:
+            Whether or not the transport was reopened before the driver disconnected.
+        """
+        transport: Transport = self.transport  # type: ignore
+        delay = RECONNECT_DELAY
+
+        while self._running:
+            transport.close()
+
+            try:
+                transport.open()
+            except OSError as e:
+                self._logger.warning(
+                    f"Failed to reconnect to the Bravo 7, retrying in {delay:.1f} s:"
+                    f" {e}"
+                )
+
+                if self._wait(delay):
+                    return False
+
+                delay = min(delay * 2, self.max_reconnect_delay)
+                continue
+
+            self._logger.info("Reconnected to the Reach Bravo 7 manipulator.")
+            self._decoder.reset()
+            self._run_connect_callbacks()
+
+            return True
+
+        return False
+
+    def _wait(self, timeout: float) -> bool:
+        """Wait for a wakeup signal.
+
+        Args:
+            timeout: The maximum amount of time (s) to wait.
+
+        Returns:
+            Whether or not the driver is shutting down.
+        """
+        select.select([self._wakeup_r], [], [], timeout)
+        self._drain_wakeup()
+
+        return not self._running
+
+    def _wakeup(self) -> None:
+        """Interrupt the polling thread."""
+        try:
+            self._wakeup_w.send(b"\x00")  # type: ignore
+        except (AttributeError, OSError):
+            # A wakeup is already pending, or the driver isn't connected
+            ...
+
+    def _drain_wakeup(self) -> None:
+        """Discard the pending wakeup signals."""
+        try:
+            while self._wakeup_r.recv(64):  # type: ignore
+                ...
+        except OSError:
+            ...
+
+    def _run_connect_callbacks(self) -> None:
+        """Execute the callbacks registered to run after connecting."""
+        for cb in self.connect_callbacks:
+            try:
+                cb()
+            except Exception as e:
+                self._logger.warning(
+                    "An exception occurred while trying to execute a connect"
+                    f" callback: {e}"
+                )
+
+    def _receive(self) -> list[tuple[list[Packet], float | None]]:
+        """Read the available data from the transport and decode its packets.
+
+        Returns:
+            The packets completed by each chunk of received data, along with the
+            kernel receive timestamp of the chunk, if available.
+        """
+        transport: Transport = self.transport  # type: ignore
+
+        if transport.batched:
+            return self._receive_batch(transport)
+
+        # Frames can only be decoded in place when each read contains whole frames
+        if self._ring is not None and transport.datagram:
+            buffer, view = self._ring.next()
+            size = transport.read_into(buffer)
+            packets = decode_in_place(buffer, view, size, self._on_decode_error)
+        else:
+            read_data = transport.read()
+            size = len(read_data)
+            packets = self._decoder.feed(read_data) if size else []
+
+        if self.metrics is not None:
+            self.metrics.record_rx(packets, size)
+
+        return [(packets, None)]
+
+    def _receive_batch(
+        self, transport: Transport
+    ) -> list[tuple[list[Packet], float | None]]:
+        """Read a batch of datagrams from the transport and decode their packets.
+
+        Args:
+            transport: The transport to read from.
+
+        Returns:
+            The packets decoded from each datagram, along with the kernel receive
+            timestamp of the datagram, if available.
+        """
+        received = []
+
+        for data, stamp in transport.read_batch():
+            packets = self._decoder.feed(data) if data else []
+
+            if self.metrics is not None:
+                self.metrics.record_rx(packets, len(data))
+
+            received.append((packets, stamp))
+
+        return received
+
+    def _poll_timeout(self) -> float:
+        """Get the amount of time to block while waiting for data.
+
+        Returns:
+            The time (s) until the next request deadline, limited to the poll timeout.
+        """
+        deadline = self._requests.next_deadline()
+
+        if deadline is None:
+            return POLL_TIMEOUT
+
+        return min(max(deadline - time.monotonic(), 0.001), POLL_TIMEOUT)
+
+    def _on_request(self, future: Future) -> None:
+        """Record the time taken to receive the reply to a request.
+
+        Args:
+            future: The future of the request.
+        """
+        if self.metrics is None:
+            return
+
+        start = time.monotonic()
+        latency = self.metrics.request_latency
+
+        def on_done(future: Future) -> None:
+            if not future.cancelled() and future.exception() is None:
+                latency.record(time.monotonic() - start)
+
+        future.add_done_callback(on_done)
+
+    def _dispatch(self, packet: Packet) -> None:
+        """Execute the callbacks registered for a packet.
+
+        Args:
+            packet: The received packet.
+        """
+        callbacks = self.callbacks.route(packet)
+
+        if callbacks:
+            self.dispatcher.dispatch(callbacks, packet)
+
+    def _on_callback_error(self, packet: Packet, error: Exception) -> None:
+        """Log an exception raised by a callback.
+
+        Args:
+            packet: The packet that was passed to the callback.
+            error: The exception raised by the callback.
+        """
+        self._logger.warning(
+            "An exception occurred while trying to execute a callback"
+            f" for the packet {packet}: {error}"
+        )
+
+    def _on_decode_error(self, frame: bytes, error: Exception) -> None:
+        """Log a frame that could not be decoded.
+
+        Args:
+            frame: The frame that could not be decoded.
+            error: The exception raised while decoding the frame.
+        """
+        if self.metrics is not None:
+            self.metrics.record_decode_error(error)
+
+        self._logger.debug(
+            f"An error occurred while attempting to decode the data {frame!r}: {error}"
+        )
@@ -0,0 +1,349 @@
+# Copyright (c) 2023 Evan Palmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Communicates with many Bravo 7 manipulators from a single thread.
+
+Each ``BravoDriver`` owns a socket and a polling thread. The ``BravoFleet`` instead
+shares one socket between all of its arms, and waits on it using a single selector loop.
+Received datagrams are routed to the arm that sent them by their source address, and
+each arm has its own callbacks, pending requests, and joint state cache.
+
+Examples:
+    >>> fleet = BravoFleet()
+    >>> port = fleet.add_arm("port", "192.168.2.3")
+    >>> starboard = fleet.add_arm("starboard", "192.168.2.4")
+    >>> fleet.start()
+    >>> port.request(DeviceID.BEND_ELBOW, PacketID.POSITION)
+    Packet(Packet ID: PacketID.POSITION, Device ID: DeviceID.BEND_ELBOW, Data: ...)
+    >>> starboard.state.positions()
+    (0.0021, 3.1415, ...)
+"""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import selectors
+import socket
+import threading
+import time
+from typing import Iterable
+
+from pybravo.driver.dispatch import Dispatcher
+from pybravo.driver.mixins import CallbacksMixin, RequestsMixin
+from pybravo.driver.requests import PendingRequests
+from pybravo.driver.routing import CallbackRouter
+from pybravo.driver.state import JointStateCache
+from pybravo.protocol import Packet, PacketStreamDecoder
+from pybravo.protocol.packet import DEFAULT_MTU
+
+# The maximum number of bytes to read from the socket at once
+RECV_BUFFER_SIZE = 4096
+
+# The maximum amount of time (s) that the selector loop blocks while waiting for data
+POLL_TIMEOUT = 1.0
+
+
+class FleetArm(CallbacksMixin, RequestsMixin):
+    """A single Bravo 7 in a fleet."""
+
+    def __init__(self, fleet: BravoFleet, name: str, address: tuple[str, int]) -> None:
+        """Create a new arm. Arms should be created using ``BravoFleet.add_arm``.
+
+        Args:
+            fleet: The fleet that the arm belongs to.
+            name: The name of the arm.
+            address: The resolved IP address and port of the arm.
+        """
+        self.fleet = fleet
+        self.name = name
+        self.address = address
+
+        self.callbacks = CallbackRouter()
+
+        # The latest state reported by each joint of the arm
+        self.state = JointStateCache()
+
+        self._requests = PendingRequests()
+        self._decoder = PacketStreamDecoder(on_error=self._on_decode_error)
+
+    def __repr__(self) -> str:
+        """Get a string representation of the arm.
+
+        Returns:
+            The name and address of the arm.
+        """
+        return f"FleetArm({self.name!r}, {self.address})"
+
+    def send(self, packet: Packet) -> None:
+        """Send a packet to the arm.
+
+        Args:
+            packet: The serial packet to send.
+        """
+        self.fleet.sock.sendto(packet.encode(), self.address)
+
+    def send_many(self, packets: Iterable[Packet], mtu: int = DEFAULT_MTU) -> None:
+        """Send several packets to the arm using as few datagrams as possible.
+
+        Args:
+            packets: The serial packets to send.
+            mtu: The maximum size of a single datagram. Defaults to 1472.
+        """
+        for datagram in Packet.encode_many(packets, mtu):
+            self.fleet.sock.sendto(datagram, self.address)
+
+    def _wakeup(self) -> None:
+        """Wake the fleet's selector loop so that it can expire requests on time."""
+        self.fleet._wakeup()
+
+    def _handle(self, data: bytes) -> None:
+        """Decode a datagram received from the arm and handle its packets.
+
+        Args:
+            data: The received datagram.
+        """
+        for packet in self._decoder.feed(data):
+            self.state.update(packet)
+            self._requests.resolve(packet)
+
+            callbacks = self.callbacks.route(packet)
+
+            if callbacks:
+                self.fleet.dispatcher.dispatch(callbacks, packet)
+
+    def _on_decode_error(self, frame: bytes, error: Exception) -> None:
+        """Log a frame that could not be decoded.
+
+        Args:
+            frame: The frame that could not be decoded.
+            error: The exception raised while decoding the frame.
+        """
+        self.fleet._logger.debug(
+            f"An error occurred while attempting to decode the data {frame!r} from"
+            f" {self.name}: {error}"
+        )
+
+
+class BravoFleet:
+    """Multiplexes many Bravo 7 manipulators over a single socket and thread."""
+
+    def __init__(
+        self, dispatcher: Dispatcher | None = None, bind: tuple[str, int] = ("", 0)
+    ) -> None:
+        """Create a new fleet.
+
+        Args:
+            dispatcher: The strategy used to execute the callbacks of every arm.
+                Defaults to executing the callbacks inline on the selector thread.
+            bind: The local address to receive packets on. Defaults to an unused port
+                on all interfaces.
+        """
+        self.arms: dict[str, FleetArm] = {}
+        self.dispatcher = dispatcher if dispatcher is not None else Dispatcher()
+        self.dispatcher.on_error = self._on_callback_error
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(bind)
+        self.sock.setblocking(False)
+
+        # Arms are looked up by the source address of each datagram
+        self._routes: dict[tuple[str, int], FleetArm] = {}
+
+        # Writing to the wakeup socket interrupts the selector, e.g., to stop the loop
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self.sock, selectors.EVENT_READ)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ)
+
+        self._running = False
+        self._loop_t: threading.Thread | None = None
+
+        self._logger = logging.getLogger("BravoFleet")
+
+        atexit.register(self.stop)
+
+    def add_arm(self, name: str, ip: str, port: int = 6789) -> FleetArm:
+        """Add an arm to the fleet.
+
+        Args:
+            name: A unique name for the arm.
+            ip: The IP address or hostname of the arm.
+            port: The port of the arm. Defaults to 6789.
+
+        Raises:
+            ValueError: An arm with the same name or address already exists.
+
+        Returns:
+            The new arm.
+        """
+        address = (socket.gethostbyname(ip), port)
+
+        if name in self.arms or address in self._routes:
+            raise ValueError(f"An arm named {name} or at {address} already exists.")
+
+        arm = FleetArm(self, name, address)
+        self.arms[name] = arm
+        self._routes[address] = arm
+
+        return arm
+
+    def remove_arm(self, name: str) -> None:
+        """Remove an arm from the fleet.
+
+        Args:
+            name: The name of the arm to remove.
+        """
+        arm = self.arms.pop(name, None)
+
+        if arm is not None:
+            self._routes.pop(arm.address, None)
+            arm._requests.cancel_all()
+
+    def __getitem__(self, name: str) -> FleetArm:
+        """Get an arm by name.
+
+        Args:
+            name: The name of the arm.
+
+        Returns:
+            The arm.
+        """
+        return self.arms[name]
+
+    def start(self) -> None:
+        """Start the selector loop."""
+        if self._loop_t is not None:
+            return
+
+        self.dispatcher.start()
+        self._running = True
+        self._loop_t = threading.Thread(
+            target=self._loop, name="BravoFleet", daemon=True
+        )
+        self._loop_t.start()
+
+    def stop(self) -> None:
+        """Stop the selector loop and fail any pending requests."""
+        if self._loop_t is None:
+            return
+
+        # Stop the thread; it can't be joined from a callback running on it
+        self._running = False
+        self._wakeup()
+
+        if self._loop_t is not threading.current_thread():
+            self._loop_t.join()
+
+        self._loop_t = None
+        self.dispatcher.stop()
+
+        for arm in self.arms.values():
+            arm._requests.cancel_all()
+
+    def close(self) -> None:
+        """Stop the selector loop and release the sockets."""
+        self.stop()
+        self._selector.close()
+        self.sock.close()
+        self._wakeup_r.close()
+        self._wakeup_w.close()
+        atexit.unregister(self.stop)
+
+    def _wakeup(self) -> None:
+        """Interrupt the selector loop."""
+        try:
+            self._wakeup_w.send(b"\x00")
+        except (BlockingIOError, OSError):
+            # A wakeup is already pending, or the fleet has been closed
+            ...
+
+    def _loop(self) -> None:
+        """Wait for datagrams from any arm and route them until stopped."""
+        while self._running:
+            # Every registered socket is drained after waking up, so the events
+            # themselves aren't needed
+            self._selector.select(self._timeout())
+            self._drain_wakeup()
+            self._receive()
+
+            now = time.monotonic()
+
+            for arm in list(self.arms.values()):
+                arm._requests.expire(now)
+
+    def _timeout(self) -> float:
+        """Get the amount of time to block while waiting for data.
+
+        Returns:
+            The time (s) until the next request deadline, limited to the poll timeout.
+        """
+        deadlines = [
+            deadline
+            for arm in list(self.arms.values())
+            if (deadline := arm._requests.next_deadline()) is not None
+        ]
+
+        if not deadlines:
+            return POLL_TIMEOUT
+
+        return min(max(min(deadlines) - time.monotonic(), 0.0), POLL_TIMEOUT)
+
+    def _drain_wakeup(self) -> None:
+        """Discard the pending wakeup signals."""
+        try:
+            while self._wakeup_r.recv(64):
+                ...
+        except (BlockingIOError, OSError):
+            ...
+
+    def _receive(self) -> None:
+        """Read and route every datagram waiting on the socket."""
+        while self._running:
+            try:
+                data, address = self.sock.recvfrom(RECV_BUFFER_SIZE)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                self._logger.warning(f"Failed to receive data from the fleet: {e}")
+                return
+
+            arm = self._routes.get(address)
+
+            if arm is None:
+                self._logger.debug(f"Ignoring data from an unknown arm at {address}.")
+                continue
+
+            arm._handle(data)
+
+    def _on_callback_error(self, packet: Packet, error: Exception) -> None:
+        """Log an exception raised by a callback.
+
+        Args:
+            packet: The packet that was passed to the callback.
+            error: The exception raised by the callback.
+        """
+        self._logger.warning(
+            "An exception occurred while trying to execute a callback"
+            f" for the packet {packet}: {error}"
+        )
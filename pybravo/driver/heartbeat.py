@@ -0,0 +1,270 @@
+# Copyright (c) 2023 Evan Palmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Configures the Bravo 7 to stream packets at a fixed rate.
+
+Instead of requesting each packet from the client, the ``HeartbeatManager`` configures
+the heartbeat streams of the Bravo using the ``HEARTBEAT_SET`` and
+``HEARTBEAT_FREQUENCY`` packets. The configuration is sent again each time the driver
+connects. If a subscribed packet stops arriving, the manager falls back to requesting
+it from the client at the same rate.
+
+Examples:
+    >>> bravo = BravoDriver()
+    >>> heartbeat = HeartbeatManager(bravo)
+    >>> heartbeat.subscribe([PacketID.POSITION, PacketID.VELOCITY], frequency=100)
+    >>> bravo.connect()
+    >>> heartbeat.start()
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Iterable
+
+from pybravo.driver.driver import BravoDriver
+from pybravo.protocol import DeviceID, Packet, PacketID
+
+# The maximum number of packet types in a heartbeat set or a request
+MAX_HEARTBEAT_PACKETS = 10
+
+# The maximum heartbeat frequency (Hz) that can be encoded
+MAX_HEARTBEAT_FREQUENCY = 255
+
+# The devices that stream a heartbeat configured for ``DeviceID.ALL_JOINTS``
+JOINT_DEVICE_IDS = tuple(
+    range(DeviceID.LINEAR_JAWS.value, DeviceID.ROTATE_BASE.value + 1)
+)
+
+
+class HeartbeatManager:
+    """Manages the packets that the Bravo 7 streams to the driver."""
+
+    def __init__(
+        self,
+        driver: BravoDriver,
+        device_id: DeviceID = DeviceID.ALL_JOINTS,
+        fallback_timeout: float = 1.0,
+    ) -> None:
+        """Create a new heartbeat manager.
+
+        Args:
+            driver: The driver used to communicate with the Bravo.
+            device_id: The device to configure the heartbeat of. Defaults to
+                ``DeviceID.ALL_JOINTS``.
+            fallback_timeout: The amount of time (s) without receiving a subscribed
+                packet before falling back to requesting it from the client. Defaults
+                to 1.0.
+        """
+        self.driver = driver
+        self.device_id = device_id
+        self.fallback_timeout = fallback_timeout
+
+        self.frequency = 0
+        self.packet_ids: list[PacketID] = []
+
+        # The packets that are currently being requested from the client because their
+        # heartbeat stopped arriving
+        self.polled: set[PacketID] = set()
+
+        # The last time that each packet was received from each device
+        self._last_received: dict[tuple[int, PacketID], float] = {}
+        self._configured_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._monitor_t: threading.Thread | None = None
+
+        self._logger = logging.getLogger("HeartbeatManager")
+
+        driver.attach_connect_callback(self.reconcile)
+
+    def subscribe(self, packet_ids: Iterable[PacketID], frequency: int) -> None:
+        """Stream the provided packets from the Bravo at a fixed rate.
+
+        This replaces any existing subscription.
+
+        Args:
+            packet_ids: The packets to stream.
+            frequency: The rate (Hz) at which to stream the packets.
+
+        Raises:
+            ValueError: Too many packets were provided, or the frequency is invalid.
+        """
+        packet_ids = list(dict.fromkeys(packet_ids))
+
+        if len(packet_ids) > MAX_HEARTBEAT_PACKETS:
+            raise ValueError(
+                f"At most {MAX_HEARTBEAT_PACKETS} packets can be streamed at once."
+            )
+
+        if not 0 <= frequency <= MAX_HEARTBEAT_FREQUENCY:
+            raise ValueError(
+                f"The frequency must be between 0 and {MAX_HEARTBEAT_FREQUENCY} Hz."
+            )
+
+        for packet_id in packet_ids:
+            self.driver.attach_callback(packet_id, self._on_packet)
+
+        with self._lock:
+            removed = [p for p in self.packet_ids if p not in packet_ids]
+            self.packet_ids = packet_ids
+            self.frequency = frequency
+
+            for packet_id in removed:
+                self.polled.discard(packet_id)
+
+            self._last_received = {
+                key: t for key, t in self._last_received.items() if key[1] in packet_ids
+            }
+
+        # Stop tracking the packets that are no longer subscribed
+        for packet_id in removed:
+            self.driver.detach_callback(packet_id, self._on_packet)
+
+        if self.driver.address is not None:
+            self.reconcile()
+
+    def unsubscribe(self) -> None:
+        """Stop streaming packets from the Bravo."""
+        self.subscribe([], 0)
+
+    def reconcile(self) -> None:
+        """Send the current heartbeat configuration to the Bravo.
+
+        This is called automatically each time the driver connects, and clears any
+        fallback to client-side polling.
+        """
+        with self._lock:
+            packet_ids = list(self.packet_ids)
+            frequency = self.frequency if packet_ids else 0
+            self.polled.clear()
+            self._configured_at = time.monotonic()
+
+        # Unused entries in the heartbeat set are cleared with zeros
+        heartbeat_set = bytes(p.value for p in packet_ids).ljust(
+            MAX_HEARTBEAT_PACKETS, b"\x00"
+        )
+
+        self.driver.send_many(
+            [
+                Packet(self.device_id, PacketID.HEARTBEAT_SET, heartbeat_set),
+                Packet(
+                    self.device_id, PacketID.HEARTBEAT_FREQUENCY, bytes([frequency])
+                ),
+            ]
+        )
+
+    def start(self) -> None:
+        """Start monitoring the subscribed packets, and poll them if they go stale."""
+        if self._monitor_t is not None:
+            return
+
+        self._stop.clear()
+        self._monitor_t = threading.Thread(target=self._monitor, daemon=True)
+        self._monitor_t.start()
+
+    def stop(self) -> None:
+        """Stop monitoring the subscribed packets."""
+        if self._monitor_t is None:
+            return
+
+        self._stop.set()
+        self._monitor_t.join()
+        self._monitor_t = None
+
+    def _on_packet(self, packet: Packet) -> None:
+        """Record when a subscribed packet was received.
+
+        A packet that is being polled stops being polled when it is received again. If
+        any device is still not streaming it, polling resumes once it goes stale.
+
+        Args:
+            packet: The received packet.
+        """
+        packet_id: PacketID = packet.packet_id  # type: ignore
+
+        with self._lock:
+            self._last_received[(packet.raw_device_id, packet_id)] = time.monotonic()
+            self.polled.discard(packet_id)
+
+    def _stale(self, now: float) -> list[PacketID]:
+        """Get the subscribed packets that are no longer being received.
+
+        Args:
+            now: The current monotonic time (s).
+
+        Returns:
+            The packets that haven't been received from every device within the
+            fallback timeout.
+        """
+        if self.device_id == DeviceID.ALL_JOINTS:
+            device_ids: tuple[int, ...] = JOINT_DEVICE_IDS
+        else:
+            device_ids = (self.device_id.value,)
+
+        stale = []
+
+        for packet_id in self.packet_ids:
+            if packet_id in self.polled:
+                continue
+
+            for device_id in device_ids:
+                last = max(
+                    self._last_received.get((device_id, packet_id), 0.0),
+                    self._configured_at,
+                )
+
+                if now - last > self.fallback_timeout:
+                    stale.append(packet_id)
+                    break
+
+        return stale
+
+    def _monitor(self) -> None:
+        """Check the subscribed packets and request any stale packets."""
+        while True:
+            with self._lock:
+                frequency = self.frequency
+                stale = self._stale(time.monotonic()) if frequency > 0 else []
+
+                if stale:
+                    self._logger.warning(
+                        f"The heartbeat stopped for {stale}; falling back to polling."
+                    )
+                    self.polled.update(stale)
+
+                polled = sorted(self.polled, key=lambda p: p.value)
+
+            if polled and self.driver.address is not None:
+                request = Packet(
+                    self.device_id, PacketID.REQUEST, bytes(p.value for p in polled)
+                )
+
+                try:
+                    self.driver.send(request)
+                except (OSError, RuntimeError) as e:
+                    self._logger.debug(f"Failed to request the stale packets: {e}")
+
+            period = 1.0 / frequency if frequency > 0 else self.fallback_timeout
+
+            if self._stop.wait(period):
+                return
@@ -0,0 +1,286 @@
+# Copyright (c) 2023 Evan Palmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Collects metrics about the traffic between the driver and the Bravo 7.
+
+Metrics are disabled by default. When a ``DriverMetrics`` instance is passed to the
+driver, it counts the packets and bytes sent and received for each device and packet
+type, the frames that failed to decode, packets with unknown IDs, socket errors, the
+request/reply latency, and the execution time of each callback. The driver only checks
+whether ``driver.metrics`` is None on the hot path, so disabled metrics cost nothing.
+
+The ``MetricsExporter`` periodically passes a snapshot of the metrics to a sink, which
+logs the snapshot as JSON by default.
+
+Examples:
+    >>> metrics = DriverMetrics()
+    >>> bravo = BravoDriver(metrics=metrics)
+    >>> bravo.connect()
+    >>> metrics.snapshot()["errors"]
+    {'crc': 0, 'length': 0, 'framing': 0, 'unknown_id': 0, 'socket': 0}
+    >>> MetricsExporter(metrics, interval=10.0).start()
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+from typing import Callable
+
+from pybravo.driver.stats import LatencyStats
+from pybravo.protocol import CrcError, DeviceID, LengthError, Packet, PacketID
+
+_KNOWN_DEVICE_IDS = frozenset(d.value for d in DeviceID)
+_KNOWN_PACKET_IDS = frozenset(p.value for p in PacketID)
+
+_DEVICE_NAMES = {d.value: d.name for d in DeviceID}
+_PACKET_NAMES = {p.value: p.name for p in PacketID}
+
+
+class _TrafficCounters:
+    """Counts the packets and bytes of one direction of traffic."""
+
+    def __init__(self) -> None:
+        """Create a new set of counters."""
+        # The number of packets and data bytes for each (device ID, packet ID) pair
+        self.packets: dict[tuple[int, int], int] = {}
+        self.bytes: dict[tuple[int, int], int] = {}
+
+        # The number of datagrams and bytes on the wire
+        self.datagrams = 0
+        self.wire_bytes = 0
+
+    def add(self, packet: Packet) -> None:
+        """Count a packet.
+
+        Args:
+            packet: The packet to count.
+        """
+        key = (packet.raw_device_id, packet.raw_packet_id)
+        self.packets[key] = self.packets.get(key, 0) + 1
+        self.bytes[key] = self.bytes.get(key, 0) + len(packet.data)
+
+    def snapshot(self) -> dict:
+        """Summarize the counters.
+
+        Returns:
+            The totals, along with the packet and byte counts grouped by packet type
+            and by device.
+        """
+        packets = dict(self.packets)
+        data_bytes = dict(self.bytes)
+
+        by_packet: dict[str, dict[str, int]] = {}
+        by_device: dict[str, dict[str, int]] = {}
+
+        for (device_id, packet_id), count in packets.items():
+            size = data_bytes.get((device_id, packet_id), 0)
+
+            for groups, name in (
+                (by_packet, _PACKET_NAMES.get(packet_id, f"0x{packet_id:02X}")),
+                (by_device, _DEVICE_NAMES.get(device_id, f"0x{device_id:02X}")),
+            ):
+                group = groups.setdefault(name, {"packets": 0, "bytes": 0})
+                group["packets"] += count
+                group["bytes"] += size
+
+        return {
+            "packets": sum(packets.values()),
+            "bytes": sum(data_bytes.values()),
+            "datagrams": self.datagrams,
+            "wire_bytes": self.wire_bytes,
+            "by_packet": by_packet,
+            "by_device": by_device,
+        }
+
+
+class DriverMetrics:
+    """Counters and latency histograms describing the driver's traffic."""
+
+    def __init__(self) -> None:
+        """Create a new, empty set of metrics."""
+        self.rx = _TrafficCounters()
+        self.tx = _TrafficCounters()
+
+        # Frames that failed the CRC check, had an invalid length, or were otherwise
+        # malformed
+        self.crc_errors = 0
+        self.length_errors = 0
+        self.framing_errors = 0
+
+        # Received packets with a device or packet ID that isn't known to the driver
+        self.unknown_ids = 0
+
+        # Errors raised by the socket while receiving data
+        self.socket_errors = 0
+
+        # The time between sending a request and receiving its reply
+        self.request_latency = LatencyStats()
+
+        # The execution time of each callback; this is shared with the dispatcher by the
+        # driver that owns the metrics
+        self.callback_stats: dict[Callable, LatencyStats] = {}
+
+        # Packets may be sent from any thread, so the transmit counters are locked. The
+        # receive counters are only updated by the receive path.
+        self._tx_lock = threading.Lock()
+
+    def record_rx(self, packets: list[Packet], size: int) -> None:
+        """Count a received datagram and the packets decoded from it.
+
+        Args:
+            packets: The packets decoded from the datagram.
+            size: The size of the datagram (bytes).
+        """
+        rx = self.rx
+        rx.datagrams += 1
+        rx.wire_bytes += size
+
+        for packet in packets:
+            rx.add(packet)
+
+            if (
+                packet.raw_device_id not in _KNOWN_DEVICE_IDS
+                or packet.raw_packet_id not in _KNOWN_PACKET_IDS
+            ):
+                self.unknown_ids += 1
+
+    def record_tx(self, packets: list[Packet], datagrams: list[bytes]) -> None:
+        """Count the packets sent and the datagrams that they were sent in.
+
+        Args:
+            packets: The sent packets.
+            datagrams: The datagrams that the packets were sent in.
+        """
+        with self._tx_lock:
+            tx = self.tx
+            tx.datagrams += len(datagrams)
+            tx.wire_bytes += sum(len(d) for d in datagrams)
+
+            for packet in packets:
+                tx.add(packet)
+
+    def record_decode_error(self, error: Exception) -> None:
+        """Count a frame that failed to decode.
+
+        Args:
+            error: The exception raised while decoding the frame.
+        """
+        if isinstance(error, CrcError):
+            self.crc_errors += 1
+        elif isinstance(error, LengthError):
+            self.length_errors += 1
+        else:
+            self.framing_errors += 1
+
+    def record_socket_error(self) -> None:
+        """Count an error raised by the socket."""
+        self.socket_errors += 1
+
+    def snapshot(self) -> dict:
+        """Get a JSON-serializable summary of the metrics.
+
+        Returns:
+            The receive and transmit counters, the error counters, the request latency,
+            and the execution time of each callback.
+        """
+        with self._tx_lock:
+            tx = self.tx.snapshot()
+
+        return {
+            "rx": self.rx.snapshot(),
+            "tx": tx,
+            "errors": {
+                "crc": self.crc_errors,
+                "length": self.length_errors,
+                "framing": self.framing_errors,
+                "unknown_id": self.unknown_ids,
+                "socket": self.socket_errors,
+            },
+            "request_latency": self.request_latency.snapshot(),
+            "callbacks": {
+                getattr(cb, "__qualname__", repr(cb)): stats.snapshot()
+                for cb, stats in list(self.callback_stats.items())
+            },
+        }
+
+
+class MetricsExporter:
+    """Periodically exports snapshots of the driver metrics."""
+
+    def __init__(
+        self,
+        metrics: DriverMetrics,
+        sink: Callable[[dict], None] | None = None,
+        interval: float = 10.0,
+    ) -> None:
+        """Create a new exporter.
+
+        Args:
+            metrics: The metrics to export.
+            sink: The function to call with each snapshot. Defaults to logging the
+                snapshot as JSON.
+            interval: The time (s) between exports. Defaults to 10.0.
+        """
+        self.metrics = metrics
+        self.sink = sink if sink is not None else self._log
+        self.interval = interval
+
+        self._stop = threading.Event()
+        self._export_t: threading.Thread | None = None
+
+        self._logger = logging.getLogger("BravoMetrics")
+
+    def start(self) -> None:
+        """Start exporting the metrics."""
+        if self._export_t is not None:
+            return
+
+        self._stop.clear()
+        self._export_t = threading.Thread(
+            target=self._export, name="MetricsExporter", daemon=True
+        )
+        self._export_t.start()
+
+    def stop(self) -> None:
+        """Stop exporting the metrics."""
+        if self._export_t is None:
+            return
+
+        self._stop.set()
+        self._export_t.join()
+        self._export_t = None
+
+    def _export(self) -> None:
+        """Export the metrics until the exporter is stopped."""
+        while not self._stop.wait(self.interval):
+            try:
+                self.sink(self.metrics.snapshot())
+            except Exception as e:
+                self._logger.warning(f"Failed to export the driver metrics: {e}")
+
+    def _log(self, snapshot: dict) -> None:
+        """Log a snapshot of the metrics as JSON.
+
+        Args:
+            snapshot: The snapshot to log.
+        """
+        self._logger.info(json.dumps(snapshot))
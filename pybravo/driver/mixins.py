@@ -0,0 +1,180 @@
+# Copyright (c) 2023 Evan Palmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""The callback and request API shared by the drivers.
+
+``BravoDriver``, ``AsyncBravoDriver``, and each ``FleetArm`` expose the same methods for
+registering callbacks, and the blocking drivers also share the same request/reply
+correlation. The mixins implement those methods once on top of the attributes that
+each driver already owns: a ``CallbackRouter`` and, for requests, a ``PendingRequests``
+table, a ``send`` method, and a ``_wakeup`` method that interrupts the thread that
+expires the requests.
+
+Examples:
+    >>> class Arm(CallbacksMixin, RequestsMixin):
+    ...     def send(self, packet: Packet) -> None: ...
+    ...     def _wakeup(self) -> None: ...
+"""
+
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Callable
+
+from pybravo.driver.requests import PendingRequests
+from pybravo.driver.routing import CallbackRouter
+from pybravo.protocol import DeviceID, Packet, PacketID
+
+
+class CallbacksMixin:
+    """Registers the callbacks executed when packets are received."""
+
+    callbacks: CallbackRouter
+
+    def attach_callback(
+        self,
+        packet_id: PacketID | None,
+        callback: Callable,
+        device_id: DeviceID | None = None,
+    ) -> None:
+        """Bind a callback to the given packet type.
+
+        Args:
+            packet_id: The ID of the packet that, when received, should signal the
+                callback, or None to receive every packet.
+            callback: The callback to execute when a matching packet is received.
+            device_id: The ID of the device whose packets should signal the callback,
+                or None to receive the packets from every device. Defaults to None.
+        """
+        self.callbacks.attach(callback, packet_id, device_id)
+
+    def detach_callback(
+        self,
+        packet_id: PacketID | None,
+        callback: Callable,
+        device_id: DeviceID | None = None,
+    ) -> bool:
+        """Unbind a callback from the given packet type.
+
+        Args:
+            packet_id: The packet ID that the callback was attached with.
+            callback: The callback to remove.
+            device_id: The device ID that the callback was attached with. Defaults to
+                None.
+
+        Returns:
+            Whether or not the callback was attached.
+        """
+        return self.callbacks.detach(callback, packet_id, device_id)
+
+
+class RequestsMixin(ABC):
+    """Sends requests and blocks on the matching replies."""
+
+    _requests: PendingRequests
+
+    @abstractmethod
+    def send(self, packet: Packet) -> None:
+        """Send a packet to the Bravo 7.
+
+        Args:
+            packet: The serial packet to send.
+        """
+
+    def request(
+        self, device_id: DeviceID, packet_id: PacketID, timeout: float = 1.0
+    ) -> Packet:
+        """Request a packet from a device and block until the reply is received.
+
+        Args:
+            device_id: The device to request the packet from. This must be a single
+                device; use a callback to handle replies to ``DeviceID.ALL_JOINTS``.
+            packet_id: The type of packet to request.
+            timeout: The maximum amount of time (s) to wait for the reply. Defaults to
+                1.0.
+
+        Raises:
+            TimeoutError: The reply was not received before the timeout.
+
+        Returns:
+            The reply from the device.
+        """
+        future = self.request_future(device_id, packet_id, timeout)
+
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            self._requests.discard(device_id, packet_id, future)
+            raise TimeoutError("The request timed out.") from None
+
+    def request_future(
+        self, device_id: DeviceID, packet_id: PacketID, timeout: float = 1.0
+    ) -> Future:
+        """Request a packet from a device without waiting for the reply.
+
+        This makes it possible to pipeline several requests. If a request for the same
+        device and packet type is already in flight, no new packet is sent, and both
+        requests are completed by the same reply.
+
+        Args:
+            device_id: The device to request the packet from. This must be a single
+                device; use a callback to handle replies to ``DeviceID.ALL_JOINTS``.
+            packet_id: The type of packet to request.
+            timeout: The maximum amount of time (s) to wait for the reply. If the reply
+                isn't received in time, the future fails with a ``TimeoutError``.
+                Defaults to 1.0.
+
+        Raises:
+            ValueError: A request was made to all joints.
+
+        Returns:
+            A future that is completed with the reply from the device.
+        """
+        if device_id == DeviceID.ALL_JOINTS:
+            raise ValueError("Requests must be made to a single device.")
+
+        future, in_flight = self._requests.add(device_id, packet_id, timeout)
+        self._on_request(future)
+
+        if not in_flight:
+            try:
+                self.send(Packet(device_id, PacketID.REQUEST, bytes([packet_id.value])))
+            except BaseException:
+                self._requests.discard(device_id, packet_id, future)
+                raise
+
+            # Wake the thread that receives the replies so that it can expire the
+            # request on time
+            self._wakeup()
+
+        return future
+
+    def _on_request(self, future: Future) -> None:  # noqa: B027
+        """Observe a new request, e.g., to measure its latency.
+
+        Args:
+            future: The future of the request.
+        """
+
+    @abstractmethod
+    def _wakeup(self) -> None:
+        """Interrupt the thread that receives the replies."""
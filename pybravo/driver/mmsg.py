@@ -0,0 +1,365 @@
+# Copyright (c) 2023 Evan Palmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Provides batched datagram I/O using the Linux ``recvmmsg`` and ``sendmmsg`` calls.
+
+Python's socket API reads or writes one datagram per system call. When the Bravo sends
+a burst of telemetry, or when a command is split across several datagrams, the cost of
+each system call dominates. ``recvmmsg`` and ``sendmmsg`` transfer many datagrams with a
+single call into buffers that are allocated once, which raises the burst capacity of the
+driver. The calls are made through ``ctypes``, so no compiled extension is required;
+``AVAILABLE`` is False on platforms that don't provide them, in which case the transport
+falls back to reading one datagram at a time.
+
+The module also parses the ``SO_TIMESTAMPNS`` control messages that carry the time at
+which the kernel received each datagram.
+
+Examples:
+    >>> batch = ReceiveBatch(16, 4096, timestamps=True)
+    >>> for data, timestamp_ns in batch.receive(sock.fileno()):
+    ...     print(len(data), timestamp_ns)
+    >>> send_batch(sock.fileno(), datagrams, encode_address("192.168.2.3", 6789))
+"""
+
+from __future__ import annotations
+
+import ctypes
+import errno
+import os
+import socket
+import struct
+import sys
+from typing import Callable, Iterable
+
+# The socket option and control message type used for nanosecond receive timestamps.
+# Python doesn't expose the constant, so fall back to its value on Linux.
+SO_TIMESTAMPNS: int | None = getattr(
+    socket, "SO_TIMESTAMPNS", 35 if sys.platform.startswith("linux") else None
+)
+
+# The layout of a control message header, and of the timestamp that it carries
+_CMSG_HEADER = struct.Struct("@Nii")
+_TIMESPEC = struct.Struct("@ll")
+_ALIGNMENT = ctypes.sizeof(ctypes.c_size_t)
+
+# The flag used to read from a socket without blocking, or 0 if it is unavailable
+MSG_DONTWAIT = getattr(socket, "MSG_DONTWAIT", 0)
+
+
+class _IoVec(ctypes.Structure):
+    """A ``struct iovec`` describing a single buffer."""
+
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    """A ``struct msghdr`` describing a single datagram."""
+
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_IoVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    """A ``struct mmsghdr`` describing a datagram and its transferred size."""
+
+    _fields_ = [("msg_hdr", _MsgHdr), ("msg_len", ctypes.c_uint)]
+
+
+def _load() -> tuple[Callable | None, Callable | None]:
+    """Load ``recvmmsg`` and ``sendmmsg`` from the C library.
+
+    Returns:
+        The ``recvmmsg`` and ``sendmmsg`` functions, or None if they aren't available.
+    """
+    if not sys.platform.startswith("linux"):
+        return None, None
+
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        recvmmsg = libc.recvmmsg
+        sendmmsg = libc.sendmmsg
+    except (OSError, AttributeError):
+        return None, None
+
+    # The message vectors are passed as addresses so that a batch can be resumed from
+    # an offset after a partial transfer
+    recvmmsg.argtypes = [
+        ctypes.c_int,
+        ctypes.c_void_p,
+        ctypes.c_uint,
+        ctypes.c_int,
+        ctypes.c_void_p,
+    ]
+    recvmmsg.restype = ctypes.c_int
+    sendmmsg.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int]
+    sendmmsg.restype = ctypes.c_int
+
+    return recvmmsg, sendmmsg
+
+
+_recvmmsg, _sendmmsg = _load()
+
+# Whether or not batched system calls are supported on this platform
+AVAILABLE = _recvmmsg is not None and _sendmmsg is not None
+
+
+def _align(size: int) -> int:
+    """Round a size up to the alignment of control message headers.
+
+    Args:
+        size: The size to align.
+
+    Returns:
+        The aligned size.
+    """
+    return (size + _ALIGNMENT - 1) & ~(_ALIGNMENT - 1)
+
+
+def control_space() -> int:
+    """Get the size of the control buffer needed to receive a timestamp.
+
+    Returns:
+        The size of the control buffer (bytes).
+    """
+    return _align(_CMSG_HEADER.size) + _align(_TIMESPEC.size)
+
+
+def ancillary_timestamp(ancdata: Iterable[tuple[int, int, bytes]]) -> int | None:
+    """Get the receive timestamp from the ancillary data returned by ``recvmsg``.
+
+    Args:
+        ancdata: The ancillary data returned by ``socket.recvmsg``.
+
+    Returns:
+        The time (ns since the epoch) at which the kernel received the datagram, or
+        None if the ancillary data doesn't include a timestamp.
+    """
+    for level, kind, data in ancdata:
+        if level == socket.SOL_SOCKET and kind == SO_TIMESTAMPNS:
+            seconds, nanoseconds = _TIMESPEC.unpack_from(data)
+            return seconds * 1_000_000_000 + nanoseconds
+
+    return None
+
+
+def _control_timestamp(control: bytes, length: int) -> int | None:
+    """Get the receive timestamp from a raw control buffer.
+
+    Args:
+        control: The control buffer filled in by the kernel.
+        length: The number of bytes of the buffer that were filled in.
+
+    Returns:
+        The time (ns since the epoch) at which the kernel received the datagram, or
+        None if the control buffer doesn't include a timestamp.
+    """
+    offset = 0
+
+    while offset + _CMSG_HEADER.size <= length:
+        size, level, kind = _CMSG_HEADER.unpack_from(control, offset)
+
+        if size < _CMSG_HEADER.size:
+            break
+
+        if level == socket.SOL_SOCKET and kind == SO_TIMESTAMPNS:
+            seconds, nanoseconds = _TIMESPEC.unpack_from(
+                control, offset + _align(_CMSG_HEADER.size)
+            )
+            return seconds * 1_000_000_000 + nanoseconds
+
+        offset += _align(size)
+
+    return None
+
+
+def _raise_errno() -> None:
+    """Raise the error set by the last failed system call.
+
+    Raises:
+        OSError: The error set by the system call.
+    """
+    code = ctypes.get_errno()
+    raise OSError(code, os.strerror(code))
+
+
+def encode_address(ip: str, port: int) -> bytes:
+    """Encode an IPv4 address as a ``struct sockaddr_in``.
+
+    Args:
+        ip: The IP address or host name.
+        port: The port.
+
+    Returns:
+        The encoded address.
+    """
+    return (
+        struct.pack("=H", socket.AF_INET)
+        + struct.pack("!H", port)
+        + socket.inet_aton(socket.gethostbyname(ip))
+        + bytes(8)
+    )
+
+
+class ReceiveBatch:
+    """A set of preallocated buffers that are filled by a single ``recvmmsg`` call."""
+
+    def __init__(self, size: int, buffer_size: int, timestamps: bool = False) -> None:
+        """Create a new receive batch.
+
+        Args:
+            size: The maximum number of datagrams to receive at once.
+            buffer_size: The maximum size of each datagram (bytes).
+            timestamps: Whether or not to receive the kernel timestamp of each
+                datagram. The socket must have ``SO_TIMESTAMPNS`` enabled. Defaults to
+                False.
+
+        Raises:
+            OSError: Batched system calls aren't supported on this platform.
+        """
+        if not AVAILABLE:
+            raise OSError("recvmmsg is not supported on this platform.")
+
+        self.size = size
+        self._control_size = control_space() if timestamps else 0
+
+        self._buffers = [ctypes.create_string_buffer(buffer_size) for _ in range(size)]
+        self._controls = [
+            ctypes.create_string_buffer(self._control_size)
+            for _ in range(size if timestamps else 0)
+        ]
+        self._iovecs = (_IoVec * size)()
+        self._headers = (_MMsgHdr * size)()
+
+        for i in range(size):
+            self._iovecs[i].iov_base = ctypes.addressof(self._buffers[i])
+            self._iovecs[i].iov_len = buffer_size
+
+            header = self._headers[i].msg_hdr
+            header.msg_iov = ctypes.pointer(self._iovecs[i])
+            header.msg_iovlen = 1
+
+            if timestamps:
+                header.msg_control = ctypes.addressof(self._controls[i])
+
+    def receive(self, fd: int) -> list[tuple[bytes, int | None]]:
+        """Receive the datagrams that are waiting on a socket without blocking.
+
+        Args:
+            fd: The file descriptor of the socket.
+
+        Raises:
+            OSError: The socket reported an error.
+
+        Returns:
+            The received datagrams, along with the time (ns since the epoch) at which
+            the kernel received each one, or None if timestamps are disabled.
+        """
+        headers = self._headers
+
+        # The kernel overwrites the control length with the number of bytes used
+        if self._control_size:
+            for i in range(self.size):
+                headers[i].msg_hdr.msg_controllen = self._control_size
+
+        count = _recvmmsg(  # type: ignore
+            fd, ctypes.addressof(headers), self.size, MSG_DONTWAIT, None
+        )
+
+        if count < 0:
+            if ctypes.get_errno() in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return []
+
+            _raise_errno()
+
+        received = []
+
+        for i in range(count):
+            header = headers[i]
+            data = ctypes.string_at(self._buffers[i], header.msg_len)
+
+            if self._control_size:
+                timestamp = _control_timestamp(
+                    self._controls[i].raw, header.msg_hdr.msg_controllen
+                )
+            else:
+                timestamp = None
+
+            received.append((data, timestamp))
+
+        return received
+
+
+def send_batch(fd: int, datagrams: list[bytes], address: bytes) -> None:
+    """Send several datagrams using as few ``sendmmsg`` calls as possible.
+
+    Args:
+        fd: The file descriptor of the socket.
+        datagrams: The datagrams to send.
+        address: The destination address, encoded using ``encode_address``.
+
+    Raises:
+        OSError: Batched system calls aren't supported on this platform, or the socket
+            reported an error.
+    """
+    if not AVAILABLE:
+        raise OSError("sendmmsg is not supported on this platform.")
+
+    count = len(datagrams)
+    name = ctypes.create_string_buffer(address, len(address))
+    buffers = [ctypes.create_string_buffer(d, len(d)) for d in datagrams]
+    iovecs = (_IoVec * count)()
+    headers = (_MMsgHdr * count)()
+
+    for i, buffer in enumerate(buffers):
+        iovecs[i].iov_base = ctypes.addressof(buffer)
+        iovecs[i].iov_len = len(datagrams[i])
+
+        header = headers[i].msg_hdr
+        header.msg_name = ctypes.addressof(name)
+        header.msg_namelen = len(address)
+        header.msg_iov = ctypes.pointer(iovecs[i])
+        header.msg_iovlen = 1
+
+    sent = 0
+
+    # The kernel may send fewer datagrams than requested, so resume from the first
+    # datagram that wasn't sent
+    while sent < count:
+        result = _sendmmsg(  # type: ignore
+            fd,
+            ctypes.addressof(headers) + sent * ctypes.sizeof(_MMsgHdr),
+            count - sent,
+            0,
+        )
+
+        if result < 0:
+            if ctypes.get_errno() == errno.EINTR:
+                continue
+
+            _raise_errno()
+
+        sent += result
@@ -0,0 +1,551 @@
+# Copyright (c) 2023 Evan Palmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Records the packets received from the Bravo 7 to a binary log.
+
+The ``TelemetryRecorder`` is attached to a driver and records each received packet
+with its monotonic receive time. When the transport collects kernel receive timestamps
+(``SocketOptions(timestamps=True)``), the kernel's timestamp of the datagram is used;
+otherwise the packet is timestamped when the driver reads it. The receive path only
+hands the packet off to a queue; the packets are encoded and written to disk by a
+background thread.
+
+The driver doesn't keep the received frames once they have been decoded, so each
+record holds the frame re-encoded from the decoded packet. The frame encoding is
+deterministic and only frames with a valid CRC are decoded, so the recorded frame has
+the same bytes as the frame on the wire.
+
+Each log starts with a header, followed by one record per packet. A record consists of
+the timestamp (ns), the device ID, the packet ID, and the length of the frame, followed
+by the encoded frame itself. When the recorder is stopped, an index of the record
+offsets is appended to the log so that readers can seek by time without scanning the
+whole file. Logs that weren't closed cleanly are still readable; the index is rebuilt
+by scanning the records.
+
+The ``TelemetryLog`` memory-maps a recorded log so that it can be iterated, filtered,
+exported to NumPy arrays, or replayed through a set of callbacks.
+
+Examples:
+    >>> bravo = BravoDriver()
+    >>> recorder = TelemetryRecorder("dive.bravo")
+    >>> bravo.attach_recorder(recorder)
+    >>> recorder.start()
+    >>> bravo.connect()
+    >>> ...
+    >>> recorder.stop()
+    >>> with TelemetryLog("dive.bravo") as log:
+    ...     log.to_arrays(PacketID.POSITION)["values"].shape
+    (70000, 1)
+"""
+
+from __future__ import annotations
+
+import bisect
+import logging
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, NamedTuple, Union
+
+from pybravo.protocol import DeviceID, Packet, PacketID
+from pybravo.protocol.payload import _import_numpy, decode_batch
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# The header contains the wall-clock time (ns) and the monotonic time (ns) at which the
+# recording started, so that record timestamps can be converted to wall-clock time
+_HEADER = struct.Struct("<8sqq")
+_HEADER_MAGIC = b"BRAVOLOG"
+
+_RECORD = struct.Struct("<qBBH")
+_INDEX_ENTRY = struct.Struct("<qQ")
+
+# The trailer contains the offset of the index and the number of records
+_TRAILER = struct.Struct("<QQ8s")
+_TRAILER_MAGIC = b"BRAVOIDX"
+
+# The number of records between consecutive index entries
+INDEX_INTERVAL = 256
+
+_FRAME_DELIMITER = 0x00
+
+Ids = Iterable[Union[DeviceID, PacketID, int]]
+
+
+class Record(NamedTuple):
+    """A packet recorded in a telemetry log."""
+
+    timestamp_ns: int
+    device_id: int
+    packet_id: int
+    frame: bytes
+
+    def packet(self) -> Packet:
+        """Decode the recorded frame.
+
+        Returns:
+            The recorded packet.
+        """
+        return Packet.decode(self.frame)
+
+
+class TelemetryRecorder:
+    """Records packets to a binary log using a background writer thread."""
+
+    def __init__(self, path: str | os.PathLike, flush_interval: float = 0.5) -> None:
+        """Create a new recorder.
+
+        Args:
+            path: The path of the log to write. An existing log is overwritten.
+            flush_interval: The maximum amount of time (s) that the recorder waits
+                while idle before flushing the written records to disk. Defaults to 0.5.
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+
+        # The number of records that have been written
+        self.count = 0
+
+        # Packets are only queued while the recorder is running, so that a recorder
+        # that is attached but stopped doesn't accumulate them
+        self._recording = False
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._writer_t: threading.Thread | None = None
+
+        self._logger = logging.getLogger("TelemetryRecorder")
+
+    def __enter__(self) -> TelemetryRecorder:
+        """Start recording.
+
+        Returns:
+            The recorder.
+        """
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Stop recording."""
+        self.stop()
+
+    def start(self) -> None:
+        """Open the log and start the writer thread."""
+        if self._writer_t is not None:
+            return
+
+        file = open(self.path, "wb", buffering=1 << 16)
+        file.write(_HEADER.pack(_HEADER_MAGIC, time.time_ns(), time.monotonic_ns()))
+
+        self.count = 0
+        self._queue = queue.SimpleQueue()
+        self._recording = True
+        self._writer_t = threading.Thread(
+            target=self._write, args=(file,), name="TelemetryRecorder", daemon=True
+        )
+        self._writer_t.start()
+
+    def stop(self) -> None:
+        """Write the queued records and the index, and close the log."""
+        if self._writer_t is None:
+            return
+
+        self._recording = False
+        self._queue.put(None)
+        self._writer_t.join()
+        self._writer_t = None
+
+    def record(self, packet: Packet, stamp: float | None = None) -> None:
+        """Queue a packet to be written to the log.
+
+        This is called from the driver's receive path, so it only timestamps the packet.
+        Packets received using the zero-copy receive path are copied, because their data
+        is only valid until the receive buffer is reused. Packets received while the
+        recorder isn't running are ignored.
+
+        Args:
+            packet: The received packet.
+            stamp: The monotonic time (s) at which the packet was received, e.g., the
+                kernel receive timestamp. Defaults to the current time.
+        """
+        if not self._recording:
+            return
+
+        if isinstance(packet.data, memoryview):
+            packet = Packet(
+                packet.raw_device_id, packet.raw_packet_id, bytes(packet.data)
+            )
+
+        stamp_ns = time.monotonic_ns() if stamp is None else round(stamp * 1e9)
+        self._queue.put((stamp_ns, packet))
+
+    def _write(self, file) -> None:
+        """Write queued records until the recorder is stopped.
+
+        Args:
+            file: The opened log.
+        """
+        index: list[tuple[int, int]] = []
+        offset = _HEADER.size
+
+        with file:
+            while True:
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    file.flush()
+                    continue
+
+                if item is None:
+                    break
+
+                stamp, packet = item
+
+                try:
+                    frame = packet.encode()
+                except Exception as e:
+                    self._logger.warning(f"Failed to record the packet {packet}: {e}")
+                    continue
+
+                if self.count % INDEX_INTERVAL == 0:
+                    index.append((stamp, offset))
+
+                file.write(
+                    _RECORD.pack(
+                        stamp, packet.raw_device_id, packet.raw_packet_id, len(frame)
+                    )
+                )
+                file.write(frame)
+
+                offset += _RECORD.size + len(frame)
+                self.count += 1
+
+            for entry in index:
+                file.write(_INDEX_ENTRY.pack(*entry))
+
+            file.write(_TRAILER.pack(offset, self.count, _TRAILER_MAGIC))
+
+
+class TelemetryLog:
+    """A memory-mapped reader for logs written by a ``TelemetryRecorder``."""
+
+    def __init__(self, path: str | os.PathLike) -> None:
+        """Open a telemetry log.
+
+        Args:
+            path: The path of the log to read.
+
+        Raises:
+            ValueError: The file is not a telemetry log.
+        """
+        with open(path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+
+            if size < _HEADER.size:
+                raise ValueError(f"{path} is not a telemetry log.")
+
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.wall_time_ns, self.monotonic_ns = _HEADER.unpack_from(self._map)
+
+        if magic != _HEADER_MAGIC:
+            self._map.close()
+            raise ValueError(f"{path} is not a telemetry log.")
+
+        self._index_stamps: list[int] = []
+        self._index_offsets: list[int] = []
+
+        if not self._load_index(size):
+            self._scan(size)
+
+    def __enter__(self) -> TelemetryLog:
+        """Use the log as a context manager.
+
+        Returns:
+            The log.
+        """
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Close the log."""
+        self.close()
+
+    def __len__(self) -> int:
+        """Get the number of records in the log.
+
+        Returns:
+            The number of records.
+        """
+        return self._count
+
+    def __iter__(self) -> Iterator[Record]:
+        """Iterate over every record in the log.
+
+        Returns:
+            An iterator over the records.
+        """
+        return self.records()
+
+    def close(self) -> None:
+        """Close the memory map."""
+        self._map.close()
+
+    def to_wall_time(self, timestamp_ns: int) -> int:
+        """Convert the timestamp of a record to wall-clock time.
+
+        Args:
+            timestamp_ns: The monotonic timestamp (ns) of the record.
+
+        Returns:
+            The wall-clock time (ns since the epoch) at which the record was received.
+        """
+        return self.wall_time_ns + timestamp_ns - self.monotonic_ns
+
+    def records(
+        self,
+        start_ns: int | None = None,
+        end_ns: int | None = None,
+        device_ids: Ids | None = None,
+        packet_ids: Ids | None = None,
+    ) -> Iterator[Record]:
+        """Iterate over the records in the log.
+
+        Args:
+            start_ns: Skip the records received before this monotonic time (ns).
+                Defaults to the start of the log.
+            end_ns: Stop at the first record received after this monotonic time (ns).
+                Defaults to the end of the log.
+            device_ids: Only include records from these devices. Defaults to all
+                devices.
+            packet_ids: Only include records with these packet IDs. Defaults to all
+                packet types.
+
+        Yields:
+            The matching records, in the order that they were received.
+        """
+        devices = _id_set(device_ids)
+        packets = _id_set(packet_ids)
+        offset = self._seek(start_ns) if start_ns is not None else _HEADER.size
+
+        while offset < self._end:
+            stamp, device, packet, length = _RECORD.unpack_from(self._map, offset)
+            frame_start = offset + _RECORD.size
+            offset = frame_start + length
+
+            if end_ns is not None and stamp > end_ns:
+                return
+
+            if start_ns is not None and stamp < start_ns:
+                continue
+
+            if devices is not None and device not in devices:
+                continue
+
+            if packets is not None and packet not in packets:
+                continue
+
+            yield Record(stamp, device, packet, self._map[frame_start:offset])
+
+    def to_arrays(
+        self,
+        packet_id: PacketID | None = None,
+        device_ids: Ids | None = None,
+        start_ns: int | None = None,
+        end_ns: int | None = None,
+    ) -> dict[str, np.ndarray]:
+        """Export the records in the log as columnar arrays.
+
+        Args:
+            packet_id: Only export records of this type, and include their decoded
+                values. Defaults to exporting the headers of all records.
+            device_ids: Only export records from these devices. Defaults to all
+                devices.
+            start_ns: The monotonic time (ns) of the first record to export. Defaults
+                to the start of the log.
+            end_ns: The monotonic time (ns) of the last record to export. Defaults to
+                the end of the log.
+
+        Returns:
+            The ``timestamp_ns``, ``device_id``, and ``packet_id`` of each record. If a
+            packet ID was provided, the ``values`` of each record are also included,
+            with one row per record.
+        """
+        np = _import_numpy()
+
+        records = list(
+            self.records(
+                start_ns,
+                end_ns,
+                device_ids,
+                [packet_id] if packet_id is not None else None,
+            )
+        )
+
+        arrays = {
+            "timestamp_ns": np.fromiter(
+                (r.timestamp_ns for r in records), np.int64, len(records)
+            ),
+            "device_id": np.fromiter(
+                (r.device_id for r in records), np.uint8, len(records)
+            ),
+            "packet_id": np.fromiter(
+                (r.packet_id for r in records), np.uint8, len(records)
+            ),
+        }
+
+        if packet_id is not None:
+            arrays["values"] = decode_batch([r.packet() for r in records], packet_id)
+
+        return arrays
+
+    def replay(
+        self,
+        callback: Callable[[Packet], None],
+        speed: float = 1.0,
+        records: Iterable[Record] | None = None,
+    ) -> int:
+        """Replay the recorded packets through a callback.
+
+        Args:
+            callback: The function to call with each decoded packet.
+            speed: The playback speed relative to the recorded timing. Use ``0`` or
+                ``math.inf`` to replay the packets as quickly as possible. Defaults to
+                1.0.
+            records: The records to replay, e.g., a filtered ``records()`` iterator.
+                Defaults to every record in the log.
+
+        Returns:
+            The number of packets that were replayed.
+        """
+        realtime = 0 < speed < float("inf")
+        first_stamp: int | None = None
+        started = time.monotonic()
+        count = 0
+
+        for record in records if records is not None else self.records():
+            if realtime:
+                if first_stamp is None:
+                    first_stamp = record.timestamp_ns
+
+                delay = (record.timestamp_ns - first_stamp) / 1e9 / speed
+                remaining = started + delay - time.monotonic()
+
+                if remaining > 0:
+                    time.sleep(remaining)
+
+            callback(record.packet())
+            count += 1
+
+        return count
+
+    def _load_index(self, size: int) -> bool:
+        """Load the index written when the log was closed.
+
+        Args:
+            size: The size of the log (bytes).
+
+        Returns:
+            Whether or not the log has a valid index.
+        """
+        if size < _HEADER.size + _TRAILER.size:
+            return False
+
+        index_offset, count, magic = _TRAILER.unpack_from(
+            self._map, size - _TRAILER.size
+        )
+        index_end = size - _TRAILER.size
+
+        if (
+            magic != _TRAILER_MAGIC
+            or not _HEADER.size <= index_offset <= index_end
+            or (index_end - index_offset) % _INDEX_ENTRY.size != 0
+        ):
+            return False
+
+        for offset in range(index_offset, index_end, _INDEX_ENTRY.size):
+            stamp, record_offset = _INDEX_ENTRY.unpack_from(self._map, offset)
+            self._index_stamps.append(stamp)
+            self._index_offsets.append(record_offset)
+
+        self._end = index_offset
+        self._count = count
+
+        return True
+
+    def _scan(self, size: int) -> None:
+        """Rebuild the index of a log that wasn't closed cleanly.
+
+        Any partially-written record at the end of the log is ignored.
+
+        Args:
+            size: The size of the log (bytes).
+        """
+        offset = _HEADER.size
+        count = 0
+
+        while offset + _RECORD.size <= size:
+            stamp, _, _, length = _RECORD.unpack_from(self._map, offset)
+            end = offset + _RECORD.size + length
+
+            if length == 0 or end > size or self._map[end - 1] != _FRAME_DELIMITER:
+                break
+
+            if count % INDEX_INTERVAL == 0:
+                self._index_stamps.append(stamp)
+                self._index_offsets.append(offset)
+
+            offset = end
+            count += 1
+
+        self._end = offset
+        self._count = count
+
+    def _seek(self, timestamp_ns: int) -> int:
+        """Find the offset of a record at or before the first record at a given time.
+
+        Args:
+            timestamp_ns: The monotonic time (ns) to seek to.
+
+        Returns:
+            The offset from which to start reading records.
+        """
+        i = bisect.bisect_left(self._index_stamps, timestamp_ns) - 1
+
+        if i < 0:
+            return _HEADER.size
+
+        return self._index_offsets[i]
+
+
+def _id_set(ids: Ids | None) -> set[int] | None:
+    """Convert a collection of device or packet IDs to a set of integers.
+
+    Args:
+        ids: The IDs to convert.
+
+    Returns:
+        The integer IDs, or None if no IDs were provided.
+    """
+    if ids is None:
+        return None
+
+    return {i if isinstance(i, int) else i.value for i in ids}
@@ -0,0 +1,214 @@
+# Copyright (c) 2023 Evan Palmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Tracks requests that are waiting for a reply from the Bravo 7.
+
+The Reach serial protocol doesn't include a sequence number, so a reply can only be
+matched to a request by the device and packet type that it contains. All requests for
+the same device and packet type that are in flight at the same time are completed by
+the same reply.
+
+Examples:
+    >>> requests = PendingRequests()
+    >>> future, in_flight = requests.add(DeviceID.BEND_ELBOW, PacketID.POSITION, 1.0)
+    >>> requests.resolve(reply)
+    True
+    >>> future.result()
+    Packet(Packet ID: PacketID.POSITION, Device ID: DeviceID.BEND_ELBOW, Data: ...)
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+from typing import Tuple
+
+from pybravo.protocol import DeviceID, Packet, PacketID
+
+RequestKey = Tuple[DeviceID, PacketID]
+
+
+class PendingRequests:
+    """A thread-safe table of requests that are waiting for a reply."""
+
+    def __init__(self) -> None:
+        """Create a new request table."""
+        self._lock = threading.Lock()
+        self._pending: dict[RequestKey, list[tuple[float, Future]]] = {}
+
+    def __len__(self) -> int:
+        """Get the number of requests that are waiting for a reply.
+
+        Returns:
+            The number of pending requests.
+        """
+        with self._lock:
+            return sum(len(entries) for entries in self._pending.values())
+
+    def add(
+        self, device_id: DeviceID, packet_id: PacketID, timeout: float
+    ) -> tuple[Future, bool]:
+        """Add a new request to the table.
+
+        Args:
+            device_id: The device that the request was sent to.
+            packet_id: The type of packet that was requested.
+            timeout: The maximum amount of time (s) to wait for the reply.
+
+        Returns:
+            A future that is completed with the reply, and whether a request for the
+            same device and packet type was already in flight. If a request is already
+            in flight, the new request doesn't need to be sent.
+        """
+        future: Future = Future()
+        deadline = time.monotonic() + timeout
+
+        with self._lock:
+            entries = self._pending.setdefault((device_id, packet_id), [])
+            in_flight = len(entries) > 0
+            entries.append((deadline, future))
+
+        return future, in_flight
+
+    def discard(self, device_id: DeviceID, packet_id: PacketID, future: Future) -> None:
+        """Remove a request from the table without completing it.
+
+        Args:
+            device_id: The device that the request was sent to.
+            packet_id: The type of packet that was requested.
+            future: The future returned when the request was added.
+        """
+        key = (device_id, packet_id)
+
+        with self._lock:
+            entries = self._pending.get(key)
+
+            if entries is None:
+                return
+
+            entries[:] = [entry for entry in entries if entry[1] is not future]
+
+            if not entries:
+                del self._pending[key]
+
+    def resolve(self, packet: Packet) -> bool:
+        """Complete all requests that the packet is a reply to.
+
+        Args:
+            packet: The received packet.
+
+        Returns:
+            Whether or not the packet completed any requests.
+        """
+        # Avoid taking the lock in the common case that nothing is pending
+        if not self._pending:
+            return False
+
+        with self._lock:
+            entries = self._pending.pop((packet.device_id, packet.packet_id), None)
+
+        if entries is None:
+            return False
+
+        for _, future in entries:
+            _complete(future, result=packet)
+
+        return True
+
+    def expire(self, now: float | None = None) -> int:
+        """Fail all requests whose deadline has passed with a ``TimeoutError``.
+
+        Args:
+            now: The current monotonic time (s). Defaults to the current time.
+
+        Returns:
+            The number of requests that expired.
+        """
+        if not self._pending:
+            return 0
+
+        if now is None:
+            now = time.monotonic()
+
+        expired = []
+
+        with self._lock:
+            for key in list(self._pending):
+                entries = self._pending[key]
+                expired.extend(
+                    future for deadline, future in entries if deadline <= now
+                )
+                entries[:] = [entry for entry in entries if entry[0] > now]
+
+                if not entries:
+                    del self._pending[key]
+
+        for future in expired:
+            _complete(future, error=TimeoutError("The request timed out."))
+
+        return len(expired)
+
+    def next_deadline(self) -> float | None:
+        """Get the earliest deadline of all pending requests.
+
+        Returns:
+            The earliest monotonic deadline (s), or None if nothing is pending.
+        """
+        if not self._pending:
+            return None
+
+        with self._lock:
+            return min(
+                (
+                    deadline
+                    for entries in self._pending.values()
+                    for deadline, _ in entries
+                ),
+                default=None,
+            )
+
+    def cancel_all(self) -> None:
+        """Cancel all pending requests."""
+        with self._lock:
+            entries = [entry for entries in self._pending.values() for entry in entries]
+            self._pending.clear()
+
+        for _, future in entries:
+            future.cancel()
+
+
+def _complete(
+    future: Future, result: Packet | None = None, error: Exception | None = None
+) -> None:
+    """Complete a future that may have already been cancelled by its owner.
+
+    Args:
+        future: The future to complete.
+        result: The result to complete the future with. Defaults to None.
+        error: The exception to complete the future with. Defaults to None.
+    """
+    try:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        ...
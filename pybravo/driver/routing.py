@@ -0,0 +1,229 @@
+# Copyright (c) 2023 Evan Palmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Routes received packets to the callbacks subscribed to them.
+
+Callbacks subscribe to a packet type, a device, or both, where None acts as a wildcard.
+Each time a subscription changes, the subscriptions are compiled into an immutable
+dispatch table that maps every (packet ID, device ID) pair with subscribers to the
+callbacks to execute, in the order that they were attached. Routing a received packet
+therefore takes a single dictionary lookup, and the table can be read by the receive
+path without taking a lock.
+
+Examples:
+    >>> router = CallbackRouter()
+    >>> router.attach(on_elbow_position, PacketID.POSITION, DeviceID.BEND_ELBOW)
+    >>> router.attach(on_any_packet)
+    >>> router.route(packet)
+    (<function on_elbow_position>, <function on_any_packet>)
+"""
+
+from __future__ import annotations
+
+import threading
+from enum import Enum
+from itertools import chain
+from typing import Callable, Dict, Tuple, Union
+
+from pybravo.protocol import DeviceID, Packet, PacketID
+
+# Packet and device IDs are single bytes
+NUM_IDS = 256
+
+_Routes = Tuple[Dict[Tuple[int, int], Tuple[Callable, ...]], Tuple[Callable, ...]]
+_Subscriber = Tuple[int, Callable]
+
+
+def _raw_id(value: Union[PacketID, DeviceID, int, None]) -> int | None:
+    """Get the integer value of an ID.
+
+    Args:
+        value: The enum or integer ID, or None for a wildcard.
+
+    Returns:
+        The integer ID, or None for a wildcard.
+    """
+    return value.value if isinstance(value, Enum) else value
+
+
+def _merge(*groups: list[_Subscriber]) -> tuple[Callable, ...]:
+    """Merge groups of subscribers into the order that they were attached.
+
+    Args:
+        groups: The groups of subscribers to merge.
+
+    Returns:
+        The callbacks, without duplicates, in the order that they were attached.
+    """
+    return tuple(dict.fromkeys(cb for _, cb in sorted(chain(*groups))))
+
+
+class CallbackRouter:
+    """Routes packets to callbacks using a table compiled from the subscriptions."""
+
+    def __init__(self) -> None:
+        """Create a new router without any subscriptions."""
+        # The subscribers to each (packet ID, device ID) pair, where None is a wildcard.
+        # Each subscriber is stored with a sequence number that records its order.
+        self._subscriptions: dict[tuple[int | None, int | None], list[_Subscriber]] = {}
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+        # The dispatch table, and the callbacks for packets that aren't in the table.
+        # These are replaced together each time the subscriptions change.
+        self._routes: _Routes = ({}, ())
+
+    def __len__(self) -> int:
+        """Get the number of subscriptions.
+
+        Returns:
+            The number of subscriptions.
+        """
+        return sum(len(s) for s in self._subscriptions.values())
+
+    def attach(
+        self,
+        callback: Callable,
+        packet_id: PacketID | int | None = None,
+        device_id: DeviceID | int | None = None,
+    ) -> None:
+        """Subscribe a callback to a packet type and device.
+
+        Attaching a callback that is already subscribed to the same packet type and
+        device has no effect.
+
+        Args:
+            callback: The callback to execute with each matching packet.
+            packet_id: The packet type to subscribe to, or None for every packet type.
+                Defaults to None.
+            device_id: The device to subscribe to, or None for every device. Defaults to
+                None.
+        """
+        key = (_raw_id(packet_id), _raw_id(device_id))
+
+        with self._lock:
+            subscribers = self._subscriptions.setdefault(key, [])
+
+            if any(cb == callback for _, cb in subscribers):
+                return
+
+            subscribers.append((self._sequence, callback))
+            self._sequence += 1
+            self._rebuild()
+
+    def detach(
+        self,
+        callback: Callable,
+        packet_id: PacketID | int | None = None,
+        device_id: DeviceID | int | None = None,
+    ) -> bool:
+        """Unsubscribe a callback from a packet type and device.
+
+        The packet type and device must match the ones that the callback was attached
+        with.
+
+        Args:
+            callback: The callback to unsubscribe.
+            packet_id: The packet type that the callback is subscribed to, or None for
+                every packet type. Defaults to None.
+            device_id: The device that the callback is subscribed to, or None for every
+                device. Defaults to None.
+
+        Returns:
+            Whether or not the callback was subscribed.
+        """
+        key = (_raw_id(packet_id), _raw_id(device_id))
+
+        with self._lock:
+            subscribers = self._subscriptions.get(key, [])
+            remaining = [s for s in subscribers if s[1] != callback]
+
+            if len(remaining) == len(subscribers):
+                return False
+
+            if remaining:
+                self._subscriptions[key] = remaining
+            else:
+                del self._subscriptions[key]
+
+            self._rebuild()
+
+        return True
+
+    def route(self, packet: Packet) -> tuple[Callable, ...]:
+        """Get the callbacks subscribed to a packet.
+
+        Args:
+            packet: The received packet.
+
+        Returns:
+            The callbacks to execute, in the order that they were attached.
+        """
+        table, default = self._routes
+        return table.get((packet.raw_packet_id, packet.raw_device_id), default)
+
+    def _rebuild(self) -> None:
+        """Compile the subscriptions into a new dispatch table."""
+        exact: dict[tuple[int, int], list[_Subscriber]] = {}
+        by_packet: dict[int, list[_Subscriber]] = {}
+        by_device: dict[int, list[_Subscriber]] = {}
+        everything: list[_Subscriber] = []
+
+        for (packet_id, device_id), subscribers in self._subscriptions.items():
+            if packet_id is not None and device_id is not None:
+                exact[(packet_id, device_id)] = subscribers
+            elif packet_id is not None:
+                by_packet[packet_id] = subscribers
+            elif device_id is not None:
+                by_device[device_id] = subscribers
+            else:
+                everything = subscribers
+
+        table: dict[tuple[int, int], tuple[Callable, ...]] = {}
+
+        # Wildcard subscriptions apply to every value of the other ID, so expand them
+        # across the full range of IDs. Pairs that only match the packet or device
+        # subscriptions share the same tuple of callbacks.
+        for packet_id, subscribers in by_packet.items():
+            shared = _merge(subscribers, everything)
+
+            for device_id in range(NUM_IDS):
+                table[(packet_id, device_id)] = shared
+
+        for device_id, subscribers in by_device.items():
+            shared = _merge(subscribers, everything)
+
+            for packet_id in range(NUM_IDS):
+                key = (packet_id, device_id)
+                table[key] = (
+                    _merge(subscribers, by_packet[packet_id], everything)
+                    if packet_id in by_packet
+                    else shared
+                )
+
+        for (packet_id, device_id), subscribers in exact.items():
+            table[(packet_id, device_id)] = _merge(
+                subscribers,
+                by_packet.get(packet_id, []),
+                by_device.get(device_id, []),
+                everything,
+            )
+
+        self._routes = (table, _merge(everything))
@@ -0,0 +1,724 @@
+# Copyright (c) 2023 Evan Palmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Shares the driver's telemetry with other processes using shared memory.
+
+Only one process can own the connection to the Bravo, but several processes often need
+its state. The ``TelemetryPublisher`` runs alongside a driver and writes the received
+packets and the latest joint state into a ``multiprocessing.shared_memory`` segment.
+``TelemetrySubscriber`` clients in other processes attach to the segment by name and
+read the state and packet stream without a socket and without decoding any frames.
+
+The segment contains three regions:
+
+- The joint state, laid out like the ``JointStateCache`` and published using a
+  sequence counter (a seqlock), so readers always observe a consistent snapshot.
+- A ring of the most recent packets. Each slot has its own sequence counter, which
+  lets a reader that falls a full ring behind detect the packets that it missed.
+- A fixed number of command lanes, each a single-producer ring owned by one
+  subscriber. The publisher drains the lanes and sends the commands using the driver.
+  A subscriber claims a lane by exclusively creating a small marker segment. The
+  marker is removed when the subscriber is closed; a subscriber that exits without
+  closing leaves its lane claimed until the marker is unlinked.
+
+Examples:
+    >>> publisher = TelemetryPublisher(bravo, name="bravo")
+    >>> publisher.start()
+
+    In another process:
+
+    >>> with TelemetrySubscriber("bravo") as subscriber:
+    ...     subscriber.positions()
+    ...     packets = subscriber.read()
+    ...     subscriber.send(encode_payload(DeviceID.BEND_ELBOW, PacketID.VELOCITY, 0.1))
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import queue
+import struct
+import threading
+import time
+import weakref
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import TYPE_CHECKING, Iterable
+
+from pybravo.driver.state import (
+    _FIELD_INDEX,
+    _NUM_FIELDS,
+    NUM_JOINTS,
+    STATE_FIELDS,
+    JointState,
+)
+from pybravo.protocol import DeviceID, Packet, PacketID
+from pybravo.protocol.payload import PAYLOAD_CODECS
+
+if TYPE_CHECKING:
+    from pybravo.driver import BravoDriver
+
+MAGIC = b"BRAVOSHM"
+VERSION = 1
+
+# The maximum size of the data of a single packet
+SLOT_DATA_SIZE = 256
+
+# The number of subscribers that can send commands, and the number of commands that
+# each one can queue
+MAX_LANES = 8
+LANE_CAPACITY = 256
+
+# Commands that have waited longer than this (s) are discarded instead of being sent,
+# e.g., when they were queued by a subscriber that has since exited
+COMMAND_TIMEOUT = 0.1
+
+# The time (s) between checks for new commands
+POLL_INTERVAL = 0.001
+
+# The layout of the segment. All integers are little-endian, and each region starts on
+# an 8-byte boundary.
+_HEADER = struct.Struct("<8sIIII")
+_COUNTER = struct.Struct("<Q")
+_RING_SLOT = struct.Struct("<QqBBH")
+_LANE_SLOT = struct.Struct("<qBBH")
+
+_NUM_VALUES = NUM_JOINTS * _NUM_FIELDS
+_STATE_OFFSET = 64
+_STATE_SIZE = _COUNTER.size + 2 * _NUM_VALUES * 8
+_RING_OFFSET = _STATE_OFFSET + _STATE_SIZE
+
+
+def _align(size: int) -> int:
+    """Round a size up to a multiple of 8 bytes.
+
+    Args:
+        size: The size to align.
+
+    Returns:
+        The aligned size.
+    """
+    return (size + 7) & ~7
+
+
+class _Layout:
+    """The offsets of the regions of a segment with a given ring capacity."""
+
+    def __init__(self, capacity: int) -> None:
+        """Compute the layout of a segment.
+
+        Args:
+            capacity: The number of packets stored in the ring.
+        """
+        self.capacity = capacity
+        self.ring_stride = _align(_RING_SLOT.size + SLOT_DATA_SIZE)
+        self.lane_stride = _align(_LANE_SLOT.size + SLOT_DATA_SIZE)
+
+        # Each lane has a head, which is written by the publisher, and a tail, which is
+        # written by the subscriber that owns the lane
+        self.slots_offset = _RING_OFFSET + _COUNTER.size
+        self.lanes_offset = self.slots_offset + capacity * self.ring_stride
+        self.lane_size = 2 * _COUNTER.size + LANE_CAPACITY * self.lane_stride
+        self.size = self.lanes_offset + MAX_LANES * self.lane_size
+
+    def lane(self, index: int) -> int:
+        """Get the offset of a command lane.
+
+        Args:
+            index: The index of the lane.
+
+        Returns:
+            The offset of the head of the lane.
+        """
+        return self.lanes_offset + index * self.lane_size
+
+    def lane_slot(self, index: int, position: int) -> int:
+        """Get the offset of a slot in a command lane.
+
+        Args:
+            index: The index of the lane.
+            position: The position of the command in the lane.
+
+        Returns:
+            The offset of the slot.
+        """
+        return (
+            self.lane(index)
+            + 2 * _COUNTER.size
+            + (position % LANE_CAPACITY) * self.lane_stride
+        )
+
+
+# The names of the segments created by publishers in this process
+_published: set[str] = set()
+
+
+def _attach(name: str) -> SharedMemory:
+    """Attach to an existing segment without taking ownership of it.
+
+    Before Python 3.13, attaching to a segment registers it with the resource tracker,
+    which would unlink it when the attaching process exits. The registration is only
+    kept if the segment was created by a publisher in the same process.
+
+    Args:
+        name: The name of the segment.
+
+    Returns:
+        The attached segment.
+    """
+    try:
+        return SharedMemory(name, track=False)  # type: ignore
+    except TypeError:
+        segment = SharedMemory(name)
+
+        if name in _published:
+            return segment
+
+        try:
+            resource_tracker.unregister(segment._name, "shared_memory")  # type: ignore
+        except AttributeError:
+            # Segments aren't tracked on Windows
+            ...
+
+        return segment
+
+
+class TelemetryPublisher:
+    """Publishes the packets received by a driver to other processes."""
+
+    def __init__(
+        self, driver: BravoDriver, name: str = "pybravo", capacity: int = 4096
+    ) -> None:
+        """Create a new publisher.
+
+        Args:
+            driver: The driver whose packets should be published, and which sends the
+                commands queued by the subscribers.
+            name: The name of the shared memory segment. Defaults to "pybravo".
+            capacity: The number of packets stored in the ring. Defaults to 4096.
+        """
+        self.driver = driver
+        self.name = name
+        self.poll_interval = POLL_INTERVAL
+
+        # The number of commands discarded because they were stale or failed to send
+        self.dropped_commands = 0
+
+        self._layout = _Layout(capacity)
+        self._segment: SharedMemory | None = None
+        self._count = 0
+        self._sequence = 0
+        self._heads = [0] * MAX_LANES
+
+        # Callbacks may be executed by several dispatcher threads, but the ring only
+        # supports a single writer
+        self._lock = threading.Lock()
+
+        self._stop = threading.Event()
+        self._command_t: threading.Thread | None = None
+
+        self._logger = logging.getLogger("TelemetryPublisher")
+
+    def __enter__(self) -> TelemetryPublisher:
+        """Start publishing.
+
+        Returns:
+            The publisher.
+        """
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Stop publishing."""
+        self.stop()
+
+    def start(self) -> None:
+        """Create the shared memory segment and start publishing the driver's packets.
+
+        Raises:
+            FileExistsError: A segment with the same name already exists.
+        """
+        if self._segment is not None:
+            return
+
+        layout = self._layout
+        segment = SharedMemory(self.name, create=True, size=layout.size)
+        _published.add(self.name)
+        buffer = segment.buf
+
+        buffer[: layout.size] = bytes(layout.size)
+        _HEADER.pack_into(
+            buffer, 0, MAGIC, VERSION, layout.capacity, SLOT_DATA_SIZE, MAX_LANES
+        )
+
+        # Joint state that hasn't been received is NaN, like in the local cache
+        struct.pack_into(
+            f"<{_NUM_VALUES}d",
+            buffer,
+            _STATE_OFFSET + _COUNTER.size,
+            *([math.nan] * _NUM_VALUES),
+        )
+
+        self._segment = segment
+        self._count = 0
+        self._sequence = 0
+        self._heads = [0] * MAX_LANES
+
+        self.driver.attach_callback(None, self.publish)
+
+        self._stop.clear()
+        self._command_t = threading.Thread(
+            target=self._forward_commands, name="TelemetryPublisher", daemon=True
+        )
+        self._command_t.start()
+
+    def stop(self) -> None:
+        """Stop publishing and remove the shared memory segment."""
+        if self._segment is None:
+            return
+
+        self.driver.detach_callback(None, self.publish)
+
+        self._stop.set()
+        self._command_t.join()  # type: ignore
+        self._command_t = None
+
+        with self._lock:
+            segment = self._segment
+            self._segment = None
+
+        segment.close()
+        segment.unlink()
+        _published.discard(self.name)
+
+    def publish(self, packet: Packet) -> None:
+        """Write a packet to the ring, and update the joint state that it carries.
+
+        This is attached to the driver as a callback for every packet.
+
+        Args:
+            packet: The received packet.
+        """
+        data = packet.data
+
+        if len(data) > SLOT_DATA_SIZE:
+            return
+
+        with self._lock:
+            segment = self._segment
+
+            if segment is not None:
+                self._write(segment.buf, packet, data)
+                self._update_state(packet)
+
+    def _write(self, buffer: memoryview, packet: Packet, data: bytes) -> None:
+        """Write a packet to the next slot of the ring.
+
+        Args:
+            buffer: The shared memory buffer.
+            packet: The packet to write.
+            data: The data of the packet.
+        """
+        layout = self._layout
+        size = len(data)
+        count = self._count
+        offset = layout.slots_offset + (count % layout.capacity) * layout.ring_stride
+        body = offset + _RING_SLOT.size
+
+        # The slot's sequence is odd while it is being written
+        _RING_SLOT.pack_into(
+            buffer,
+            offset,
+            2 * count + 1,
+            time.monotonic_ns(),
+            packet.raw_device_id,
+            packet.raw_packet_id,
+            size,
+        )
+        buffer[body : body + size] = data
+        _COUNTER.pack_into(buffer, offset, 2 * count + 2)
+
+        self._count = count + 1
+        _COUNTER.pack_into(buffer, _RING_OFFSET, self._count)
+
+    def _update_state(self, packet: Packet) -> None:
+        """Update the shared joint state with a packet.
+
+        Args:
+            packet: The received packet.
+        """
+        field = _FIELD_INDEX.get(packet.raw_packet_id)
+        joint = packet.raw_device_id - 1
+
+        if field is None or not 0 <= joint < NUM_JOINTS:
+            return
+
+        try:
+            (value,) = PAYLOAD_CODECS[STATE_FIELDS[field]].decode(packet)
+        except Exception:
+            return
+
+        buffer = self._segment.buf  # type: ignore
+        index = joint * _NUM_FIELDS + field
+        values = _STATE_OFFSET + _COUNTER.size
+        stamps = values + _NUM_VALUES * 8
+
+        self._sequence += 1
+        _COUNTER.pack_into(buffer, _STATE_OFFSET, self._sequence)
+        struct.pack_into("<d", buffer, values + index * 8, value)
+        struct.pack_into("<d", buffer, stamps + index * 8, time.monotonic())
+        self._sequence += 1
+        _COUNTER.pack_into(buffer, _STATE_OFFSET, self._sequence)
+
+    def _forward_commands(self) -> None:
+        """Send the commands queued by the subscribers until the publisher stops."""
+        while not self._stop.wait(self.poll_interval):
+            packets = self._drain()
+
+            if not packets:
+                continue
+
+            try:
+                self.driver.send_many(packets)
+            except Exception as e:
+                self.dropped_commands += len(packets)
+                self._logger.warning(f"Failed to send the subscriber commands: {e}")
+
+    def _drain(self) -> list[Packet]:
+        """Take the queued commands from every lane.
+
+        Returns:
+            The commands that are recent enough to send.
+        """
+        buffer = self._segment.buf  # type: ignore
+        layout = self._layout
+        deadline = time.monotonic_ns() - int(COMMAND_TIMEOUT * 1e9)
+        packets = []
+
+        for lane in range(MAX_LANES):
+            offset = layout.lane(lane)
+            head = self._heads[lane]
+            (tail,) = _COUNTER.unpack_from(buffer, offset + _COUNTER.size)
+
+            while head < tail:
+                slot = layout.lane_slot(lane, head)
+                stamp, device_id, packet_id, size = _LANE_SLOT.unpack_from(buffer, slot)
+                head += 1
+
+                if stamp < deadline:
+                    self.dropped_commands += 1
+                    continue
+
+                body = slot + _LANE_SLOT.size
+                packets.append(
+                    Packet(device_id, packet_id, bytes(buffer[body : body + size]))
+                )
+
+            if head != self._heads[lane]:
+                self._heads[lane] = head
+                _COUNTER.pack_into(buffer, offset, head)
+
+        return packets
+
+
+class TelemetrySubscriber:
+    """Reads the telemetry published by a ``TelemetryPublisher`` in another process."""
+
+    def __init__(self, name: str = "pybravo", zero_copy: bool = False) -> None:
+        """Attach to a publisher.
+
+        Args:
+            name: The name of the publisher's shared memory segment. Defaults to
+                "pybravo".
+            zero_copy: Return packets whose data is a view of the shared ring instead
+                of a copy. The view is only valid until the publisher has written
+                another full ring of packets, and is released when the subscriber is
+                closed. Defaults to False.
+
+        Raises:
+            FileNotFoundError: The publisher isn't running.
+            ValueError: The segment wasn't created by a compatible publisher.
+        """
+        self.name = name
+        self.zero_copy = zero_copy
+
+        # The number of packets that were overwritten before they could be read
+        self.dropped = 0
+
+        self._segment = _attach(name)
+        buffer = self._segment.buf
+
+        magic, version, capacity, slot_size, lanes = _HEADER.unpack_from(buffer, 0)
+
+        if magic != MAGIC or version != VERSION:
+            self._segment.close()
+            raise ValueError(f"The segment {name} wasn't created by a publisher.")
+
+        if slot_size != SLOT_DATA_SIZE or lanes != MAX_LANES:
+            self._segment.close()
+            raise ValueError(f"The segment {name} has an incompatible layout.")
+
+        self._layout = _Layout(capacity)
+
+        # Start reading from the newest packet
+        (self._cursor,) = _COUNTER.unpack_from(buffer, _RING_OFFSET)
+
+        # The command lane, which is claimed when the first command is sent
+        self._lane: int | None = None
+        self._marker: SharedMemory | None = None
+
+        # The views given out in zero-copy mode, which must be released before the
+        # segment can be closed
+        self._views: list[weakref.ref[memoryview]] = []
+
+    def __enter__(self) -> TelemetrySubscriber:
+        """Use the subscriber as a context manager.
+
+        Returns:
+            The subscriber.
+        """
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Detach from the publisher."""
+        self.close()
+
+    def close(self) -> None:
+        """Release the command lane and detach from the publisher.
+
+        The data of the packets read in zero-copy mode can't be used after the
+        subscriber is closed.
+        """
+        if self._marker is not None:
+            self._marker.close()
+            self._marker.unlink()
+            self._marker = None
+
+        self._lane = None
+
+        # The segment can't be closed while any of its views are still alive
+        for ref in self._views:
+            view = ref()
+
+            if view is not None:
+                view.release()
+
+        self._views.clear()
+        self._segment.close()
+
+    def read(self, max_packets: int | None = None) -> list[Packet]:
+        """Read the packets published since the previous read.
+
+        Args:
+            max_packets: The maximum number of packets to read. Defaults to reading all
+                of the available packets.
+
+        Returns:
+            The packets, in the order that they were received.
+        """
+        buffer = self._segment.buf
+        layout = self._layout
+        (count,) = _COUNTER.unpack_from(buffer, _RING_OFFSET)
+
+        # Skip the packets that have already been overwritten
+        if count - self._cursor > layout.capacity:
+            self.dropped += count - self._cursor - layout.capacity
+            self._cursor = count - layout.capacity
+
+        if max_packets is not None:
+            count = min(count, self._cursor + max_packets)
+
+        packets = []
+
+        for position in range(self._cursor, count):
+            offset = (
+                layout.slots_offset + (position % layout.capacity) * layout.ring_stride
+            )
+            _, _, device_id, packet_id, size = _RING_SLOT.unpack_from(buffer, offset)
+            body = offset + _RING_SLOT.size
+            data = buffer[body : body + size]
+
+            if self.zero_copy:
+                self._views.append(weakref.ref(data))
+            else:
+                data = bytes(data)
+
+            # The slot was overwritten while it was being read
+            if _COUNTER.unpack_from(buffer, offset)[0] != 2 * position + 2:
+                self.dropped += 1
+                continue
+
+            packets.append(Packet(device_id, packet_id, data))
+
+        self._cursor = count
+
+        # Forget the views that have already been garbage collected
+        if len(self._views) > layout.capacity:
+            self._views = [ref for ref in self._views if ref() is not None]
+
+        return packets
+
+    def get(self, device_id: DeviceID) -> JointState:
+        """Get a consistent snapshot of the latest state of a joint.
+
+        Args:
+            device_id: The joint to get the state of.
+
+        Raises:
+            ValueError: The device isn't a joint.
+
+        Returns:
+            The latest state of the joint.
+        """
+        joint = device_id.value - 1
+
+        if not 0 <= joint < NUM_JOINTS:
+            raise ValueError(f"{device_id} is not a joint.")
+
+        values, stamps = self._snapshot()
+        start = joint * _NUM_FIELDS
+
+        return JointState(
+            *values[start : start + _NUM_FIELDS],
+            max(stamps[start : start + _NUM_FIELDS]),
+        )
+
+    def positions(self) -> tuple[float, ...]:
+        """Get a consistent snapshot of the latest position of every joint.
+
+        Returns:
+            The position of each joint, ordered by device ID.
+        """
+        return self._snapshot()[0][_FIELD_INDEX[PacketID.POSITION.value] :: _NUM_FIELDS]
+
+    def velocities(self) -> tuple[float, ...]:
+        """Get a consistent snapshot of the latest velocity of every joint.
+
+        Returns:
+            The velocity of each joint, ordered by device ID.
+        """
+        return self._snapshot()[0][_FIELD_INDEX[PacketID.VELOCITY.value] :: _NUM_FIELDS]
+
+    def send(self, packet: Packet) -> None:
+        """Queue a packet to be sent to the Bravo by the publisher.
+
+        Args:
+            packet: The packet to send.
+        """
+        self.send_many([packet])
+
+    def send_many(self, packets: Iterable[Packet]) -> None:
+        """Queue several packets to be sent to the Bravo by the publisher.
+
+        Args:
+            packets: The packets to send.
+
+        Raises:
+            queue.Full: The command lane doesn't have room for the packets.
+            RuntimeError: Every command lane is in use by another subscriber.
+            ValueError: A packet is too large.
+        """
+        packets = list(packets)
+        lane = self._claim_lane()
+        buffer = self._segment.buf
+        layout = self._layout
+        offset = layout.lane(lane)
+
+        (head,) = _COUNTER.unpack_from(buffer, offset)
+        (tail,) = _COUNTER.unpack_from(buffer, offset + _COUNTER.size)
+
+        if tail - head + len(packets) > LANE_CAPACITY:
+            raise queue.Full("The command lane doesn't have room for the packets.")
+
+        stamp = time.monotonic_ns()
+
+        for packet in packets:
+            data = packet.data
+
+            if len(data) > SLOT_DATA_SIZE:
+                raise ValueError(f"The packet data exceeds {SLOT_DATA_SIZE} bytes.")
+
+            slot = layout.lane_slot(lane, tail)
+            _LANE_SLOT.pack_into(
+                buffer,
+                slot,
+                stamp,
+                packet.raw_device_id,
+                packet.raw_packet_id,
+                len(data),
+            )
+            body = slot + _LANE_SLOT.size
+            buffer[body : body + len(data)] = data
+            tail += 1
+
+        # Publish the commands by advancing the tail once they have been written
+        _COUNTER.pack_into(buffer, offset + _COUNTER.size, tail)
+
+    def _claim_lane(self) -> int:
+        """Claim a command lane for this subscriber.
+
+        Raises:
+            RuntimeError: Every command lane is in use by another subscriber.
+
+        Returns:
+            The index of the claimed lane.
+        """
+        if self._lane is not None:
+            return self._lane
+
+        for lane in range(MAX_LANES):
+            try:
+                self._marker = SharedMemory(
+                    f"{self.name}-lane{lane}", create=True, size=1
+                )
+            except FileExistsError:
+                continue
+
+            self._lane = lane
+            return lane
+
+        raise RuntimeError("Every command lane is in use by another subscriber.")
+
+    def _snapshot(self) -> tuple[tuple[float, ...], tuple[float, ...]]:
+        """Read a consistent snapshot of the joint state.
+
+        Returns:
+            The value and time stamp of every field of every joint.
+        """
+        buffer = self._segment.buf
+        values = _STATE_OFFSET + _COUNTER.size
+        stamps = values + _NUM_VALUES * 8
+        fmt = f"<{_NUM_VALUES}d"
+
+        while True:
+            (sequence,) = _COUNTER.unpack_from(buffer, _STATE_OFFSET)
+            snapshot = (
+                struct.unpack_from(fmt, buffer, values),
+                struct.unpack_from(fmt, buffer, stamps),
+            )
+
+            if sequence % 2 == 0 and _COUNTER.unpack_from(buffer, _STATE_OFFSET)[0] == (
+                sequence
+            ):
+                return snapshot
+
+            # Let the publisher finish the update that is in progress
+            time.sleep(0)
@@ -0,0 +1,226 @@
+# Copyright (c) 2023 Evan Palmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Provides a cache of the latest state reported by each joint.
+
+The ``JointStateCache`` is updated by the driver's receive path, and stores the latest
+position, velocity, current, and temperature of each joint in fixed, array-backed
+storage. Updates are published using a sequence counter (a seqlock), so readers on
+other threads always observe a consistent snapshot without taking a lock.
+
+Examples:
+    >>> bravo = BravoDriver()
+    >>> bravo.connect()
+    >>> bravo.state.get(DeviceID.BEND_ELBOW).position
+    1.5707
+    >>> bravo.state.age(DeviceID.BEND_ELBOW, PacketID.POSITION)
+    0.0021
+"""
+
+from __future__ import annotations
+
+import math
+import time
+from array import array
+from typing import NamedTuple
+
+from pybravo.protocol import DeviceID, Packet, PacketID
+from pybravo.protocol.payload import PAYLOAD_CODECS
+
+# The number of joints on the Bravo 7; the joints have the device IDs 1 to 7
+NUM_JOINTS = 7
+
+# The packet types stored in the cache, in the order that they are stored per joint
+STATE_FIELDS = (
+    PacketID.POSITION,
+    PacketID.VELOCITY,
+    PacketID.CURRENT,
+    PacketID.TEMPERATURE,
+)
+
+_FIELD_INDEX = {field.value: i for i, field in enumerate(STATE_FIELDS)}
+_NUM_FIELDS = len(STATE_FIELDS)
+
+
+class JointState(NamedTuple):
+    """A snapshot of the latest state of a joint, in SI units."""
+
+    position: float
+    velocity: float
+    current: float
+    temperature: float
+
+    # The monotonic time (s) of the latest update to any of the fields
+    stamp: float
+
+
+class JointStateCache:
+    """A lock-free cache of the latest state of each joint.
+
+    The cache supports a single writer, which is the driver's receive path, and any
+    number of concurrent readers. Fields that haven't been received yet are NaN.
+    """
+
+    def __init__(self) -> None:
+        """Create a new, empty cache."""
+        size = NUM_JOINTS * _NUM_FIELDS
+        self._values = array("d", [math.nan] * size)
+        self._stamps = array("d", [0.0] * size)
+
+        # The sequence counter is odd while an update is in progress
+        self._sequence = 0
+
+    @property
+    def sequence(self) -> int:
+        """Get the number of updates that have been applied to the cache.
+
+        Returns:
+            The update count.
+        """
+        return self._sequence // 2
+
+    def update(self, packet: Packet, stamp: float | None = None) -> bool:
+        """Update the cache with a packet received from the Bravo.
+
+        Args:
+            packet: The received packet.
+            stamp: The monotonic time (s) at which the packet was received, e.g., the
+                kernel receive timestamp. Defaults to the current time.
+
+        Returns:
+            Whether or not the packet contained joint state.
+        """
+        field = _FIELD_INDEX.get(packet.raw_packet_id)
+        joint = packet.raw_device_id - 1
+
+        if field is None or not 0 <= joint < NUM_JOINTS:
+            return False
+
+        try:
+            (value,) = PAYLOAD_CODECS[STATE_FIELDS[field]].decode(packet)
+        except Exception:
+            return False
+
+        index = joint * _NUM_FIELDS + field
+        if stamp is None:
+            stamp = time.monotonic()
+
+        self._sequence += 1
+        self._values[index] = value
+        self._stamps[index] = stamp
+        self._sequence += 1
+
+        return True
+
+    def get(self, device_id: DeviceID) -> JointState:
+        """Get a consistent snapshot of the latest state of a joint.
+
+        Args:
+            device_id: The joint to get the state of.
+
+        Returns:
+            The latest state of the joint.
+        """
+        start = self._index(device_id)
+        end = start + _NUM_FIELDS
+
+        while True:
+            sequence = self._sequence
+            values = self._values[start:end]
+            stamp = max(self._stamps[start:end])
+
+            if sequence % 2 == 0 and sequence == self._sequence:
+                return JointState(*values, stamp)
+
+            # Let the writer finish the update that is in progress
+            time.sleep(0)
+
+    def positions(self) -> tuple[float, ...]:
+        """Get a consistent snapshot of the latest position of every joint.
+
+        Returns:
+            The position of each joint, ordered by device ID.
+        """
+        return self._column(PacketID.POSITION)
+
+    def velocities(self) -> tuple[float, ...]:
+        """Get a consistent snapshot of the latest velocity of every joint.
+
+        Returns:
+            The velocity of each joint, ordered by device ID.
+        """
+        return self._column(PacketID.VELOCITY)
+
+    def age(self, device_id: DeviceID, field: PacketID = PacketID.POSITION) -> float:
+        """Get the time since a field of a joint was last updated.
+
+        Args:
+            device_id: The joint to check.
+            field: The field to check. Defaults to ``PacketID.POSITION``.
+
+        Returns:
+            The age of the field (s), or infinity if it has never been received.
+        """
+        stamp = self._stamps[self._index(device_id) + _FIELD_INDEX[field.value]]
+
+        if stamp == 0.0:
+            return math.inf
+
+        return time.monotonic() - stamp
+
+    def _column(self, field: PacketID) -> tuple[float, ...]:
+        """Get a consistent snapshot of one field for every joint.
+
+        Args:
+            field: The field to read.
+
+        Returns:
+            The field of each joint, ordered by device ID.
+        """
+        offset = _FIELD_INDEX[field.value]
+
+        while True:
+            sequence = self._sequence
+            values = tuple(self._values[offset::_NUM_FIELDS])
+
+            if sequence % 2 == 0 and sequence == self._sequence:
+                return values
+
+            time.sleep(0)
+
+    @staticmethod
+    def _index(device_id: DeviceID) -> int:
+        """Get the index of the first field of a joint.
+
+        Args:
+            device_id: The joint.
+
+        Raises:
+            ValueError: The device is not a joint.
+
+        Returns:
+            The index of the joint's first field in the storage arrays.
+        """
+        joint = device_id.value - 1
+
+        if not 0 <= joint < NUM_JOINTS:
+            raise ValueError(f"{device_id} is not a joint.")
+
+        return joint * _NUM_FIELDS
@@ -0,0 +1,124 @@
+# Copyright (c) 2023 Evan Palmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Provides a lightweight latency histogram for instrumenting the driver.
+
+Samples are accumulated into power-of-two microsecond buckets, so recording a sample
+is constant time and the memory used doesn't grow with the number of samples.
+
+Examples:
+    >>> stats = LatencyStats()
+    >>> stats.record(0.0005)
+    >>> stats.snapshot()["count"]
+    1
+"""
+
+from __future__ import annotations
+
+import threading
+
+# The number of histogram buckets. The last bucket holds all samples longer than ~1 h.
+NUM_BUCKETS = 32
+
+
+class LatencyStats:
+    """A thread-safe histogram of latency samples."""
+
+    def __init__(self) -> None:
+        """Create a new, empty histogram."""
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Discard all recorded samples."""
+        with self._lock:
+            self.count = 0
+            self.total = 0.0
+            self.min = float("inf")
+            self.max = 0.0
+            self.buckets = [0] * NUM_BUCKETS
+
+    def record(self, seconds: float) -> None:
+        """Record a latency sample.
+
+        Args:
+            seconds: The latency (s).
+        """
+        # Bucket i holds samples shorter than 2**i microseconds
+        index = (
+            min(int(seconds * 1e6).bit_length(), NUM_BUCKETS - 1) if seconds > 0 else 0
+        )
+
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.buckets[index] += 1
+
+            if seconds < self.min:
+                self.min = seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, q: float) -> float:
+        """Estimate a percentile of the recorded samples.
+
+        The estimate is the upper bound of the bucket that contains the percentile, so
+        it may overestimate the true value by up to a factor of two.
+
+        Args:
+            q: The percentile to estimate, in the range [0, 100].
+
+        Returns:
+            The estimated percentile (s), or 0.0 if no samples have been recorded.
+        """
+        with self._lock:
+            if self.count == 0:
+                return 0.0
+
+            target = q / 100.0 * self.count
+            seen = 0
+
+            for i, n in enumerate(self.buckets):
+                seen += n
+                if seen >= target and n > 0:
+                    return min(2**i * 1e-6, self.max)
+
+            return self.max
+
+    def snapshot(self) -> dict:
+        """Get a summary of the recorded samples.
+
+        Returns:
+            The number of samples, and the mean, minimum, maximum, and 50th, 90th, and
+            99th percentile latencies (s), along with the histogram bucket counts.
+        """
+        p50, p90, p99 = (self.percentile(q) for q in (50, 90, 99))
+
+        with self._lock:
+            return {
+                "count": self.count,
+                "mean": self.total / self.count if self.count else 0.0,
+                "min": self.min if self.count else 0.0,
+                "max": self.max,
+                "p50": p50,
+                "p90": p90,
+                "p99": p99,
+                "buckets": list(self.buckets),
+            }
@@ -0,0 +1,663 @@
+# Copyright (c) 2023 Evan Palmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Provides the links that the driver uses to communicate with the Bravo 7.
+
+The Reach serial protocol is carried over UDP by the Bravo 7, but the same framing is
+also used over TCP and serial links. Each ``Transport`` exposes a file descriptor that
+the driver waits on using ``select``, and reads as much data as is available at once.
+Datagram transports return whole frames from each read, while stream transports return
+arbitrary chunks of the byte stream, which are split into frames by the driver's
+incremental stream decoder.
+
+The UDP socket can be tuned using ``SocketOptions``: the kernel buffer sizes can be
+increased to absorb bursts of telemetry, outgoing datagrams can be marked with a DSCP
+code point and socket priority, and the kernel can timestamp each received datagram.
+When ``batch_size`` is larger than one, the transport drains up to that many datagrams
+per system call using ``recvmmsg`` and sends multi-datagram commands using ``sendmmsg``
+on Linux, and reads the waiting datagrams one at a time elsewhere.
+
+The serial transport configures the port using ``termios`` directly, so it doesn't
+require any additional dependencies, but it is only available on POSIX systems.
+
+Examples:
+    >>> bravo = BravoDriver()
+    >>> options = SocketOptions(recv_buffer_size=1 << 20, batch_size=32)
+    >>> bravo.connect(transport=UdpTransport("192.168.2.3", 6789, options))
+    >>> bravo.connect(transport=SerialTransport("/dev/ttyUSB0", baudrate=115200))
+    >>> bravo.connect(transport=TcpTransport("192.168.2.3", 6789))
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import select
+import socket
+import time
+from abc import ABC, abstractmethod
+from typing import NamedTuple, Union
+
+from pybravo.driver import mmsg
+
+try:
+    import termios
+except ImportError:
+    # The serial transport is only available on POSIX systems
+    termios = None  # type: ignore
+
+# The maximum number of bytes to read from the link at once. The Bravo may batch several
+# packets into a single datagram, so this needs to be larger than one packet.
+READ_SIZE = 4096
+
+# The largest DSCP code point, which occupies the upper six bits of the TOS byte
+MAX_DSCP = 63
+
+Address = Union[tuple, str]
+
+
+class Datagram(NamedTuple):
+    """A chunk of data read from a transport."""
+
+    data: bytes
+
+    # The monotonic time (s) at which the kernel received the data, or None if the
+    # transport doesn't record receive timestamps
+    stamp: float | None
+
+
+class SocketOptions(NamedTuple):
+    """Options used to tune the UDP socket."""
+
+    # The sizes (bytes) of the kernel receive and send buffers. The kernel may limit the
+    # sizes, e.g., to ``net.core.rmem_max`` on Linux.
+    recv_buffer_size: int | None = None
+    send_buffer_size: int | None = None
+
+    # The DSCP code point (0-63) used to mark outgoing datagrams, e.g., 46 for
+    # expedited forwarding
+    dscp: int | None = None
+
+    # The priority of outgoing datagrams within the host (``SO_PRIORITY``, Linux only)
+    priority: int | None = None
+
+    # Whether or not to record the time at which the kernel received each datagram
+    timestamps: bool = False
+
+    # The maximum number of datagrams to read at once
+    batch_size: int = 1
+
+
+class Transport(ABC):
+    """A bidirectional link to the Bravo 7."""
+
+    # Whether each read returns a whole number of frames
+    datagram = False
+
+    # Whether reads should be made using ``read_batch``
+    batched = False
+
+    @property
+    @abstractmethod
+    def address(self) -> Address:
+        """Get the address of the Bravo on the link.
+
+        Returns:
+            The address of the Bravo.
+        """
+
+    @abstractmethod
+    def open(self) -> None:
+        """Open the link."""
+
+    @abstractmethod
+    def close(self) -> None:
+        """Close the link."""
+
+    @abstractmethod
+    def fileno(self) -> int:
+        """Get the file descriptor to wait on for incoming data.
+
+        Returns:
+            The file descriptor of the link.
+        """
+
+    @abstractmethod
+    def send(self, data: bytes) -> None:
+        """Write data to the link.
+
+        Args:
+            data: The encoded frames to send.
+        """
+
+    @abstractmethod
+    def read(self) -> bytes:
+        """Read the data that is available on the link.
+
+        This should only be called once the link is readable.
+
+        Raises:
+            ConnectionError: The link was closed by the other end.
+
+        Returns:
+            The received data.
+        """
+
+    def read_into(self, buffer: bytearray) -> int:
+        """Read the data that is available on the link into a buffer.
+
+        Args:
+            buffer: The buffer to read into.
+
+        Returns:
+            The number of bytes read.
+        """
+        data = self.read()
+        buffer[: len(data)] = data
+        return len(data)
+
+    def read_batch(self) -> list[Datagram]:
+        """Read all of the data that is available on the link.
+
+        Returns:
+            The received chunks of data, along with their receive timestamps.
+        """
+        return [Datagram(self.read(), None)]
+
+    def send_batch(self, datagrams: list[bytes]) -> None:
+        """Write several chunks of data to the link.
+
+        Args:
+            datagrams: The encoded frames to send, grouped into datagrams.
+        """
+        for datagram in datagrams:
+            self.send(datagram)
+
+
+class UdpTransport(Transport):
+    """Communicates with the Bravo 7 using UDP datagrams."""
+
+    datagram = True
+
+    def __init__(
+        self,
+        ip: str = "192.168.2.3",
+        port: int = 6789,
+        options: SocketOptions | None = None,
+    ) -> None:
+        """Create a new UDP transport.
+
+        Args:
+            ip: The IP address of the Bravo 7. Defaults to "192.168.2.3".
+            port: The port of the Bravo 7. Defaults to 6789.
+            options: The options used to tune the socket. Defaults to the operating
+                system's defaults.
+
+        Raises:
+            ValueError: The batch size or DSCP code point is invalid.
+        """
+        self._address = (ip, port)
+        self.options = options if options is not None else SocketOptions()
+        self.sock: socket.socket | None = None
+
+        if self.options.batch_size < 1:
+            raise ValueError("The batch size must be at least 1.")
+
+        if self.options.dscp is not None and not 0 <= self.options.dscp <= MAX_DSCP:
+            raise ValueError(f"The DSCP code point must be between 0 and {MAX_DSCP}.")
+
+        # The preallocated buffers and encoded address used for batched system calls
+        self._batch: mmsg.ReceiveBatch | None = None
+        self._name: bytes | None = None
+
+        self._logger = logging.getLogger("UdpTransport")
+
+    @property
+    def batched(self) -> bool:  # type: ignore
+        """Whether reads should be made using ``read_batch``.
+
+        Returns:
+            Whether batching or receive timestamps are enabled.
+        """
+        return self.options.batch_size > 1 or self.options.timestamps
+
+    @property
+    def address(self) -> Address:
+        """Get the IP address and port of the Bravo 7.
+
+        Returns:
+            The address of the Bravo.
+        """
+        return self._address
+
+    def open(self) -> None:
+        """Create and configure the socket.
+
+        Raises:
+            OSError: An option isn't supported on this platform.
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+        try:
+            self._configure(sock)
+
+            if self.options.batch_size > 1 and mmsg.AVAILABLE:
+                self._batch = mmsg.ReceiveBatch(
+                    self.options.batch_size, READ_SIZE, self.options.timestamps
+                )
+                self._name = mmsg.encode_address(*self._address)
+        except BaseException:
+            sock.close()
+            raise
+
+        self.sock = sock
+
+    def close(self) -> None:
+        """Close the socket."""
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+        self._batch = None
+        self._name = None
+
+    def fileno(self) -> int:
+        """Get the file descriptor of the socket.
+
+        Returns:
+            The file descriptor of the socket.
+        """
+        return self.sock.fileno()  # type: ignore
+
+    def send(self, data: bytes) -> None:
+        """Send a datagram to the Bravo 7.
+
+        Args:
+            data: The encoded frames to send.
+
+        Raises:
+            ConnectionError: The transport is closed.
+        """
+        if self.sock is None:
+            raise ConnectionError("The transport is closed.")
+
+        self.sock.sendto(data, self._address)
+
+    def read(self) -> bytes:
+        """Read the next datagram.
+
+        Returns:
+            The received datagram.
+        """
+        data, _ = self.sock.recvfrom(READ_SIZE)  # type: ignore
+        return data
+
+    def read_into(self, buffer: bytearray) -> int:
+        """Read the next datagram into a buffer without copying it.
+
+        Args:
+            buffer: The buffer to read into.
+
+        Returns:
+            The size of the datagram.
+        """
+        size, _ = self.sock.recvfrom_into(buffer)  # type: ignore
+        return size
+
+    def read_batch(self) -> list[Datagram]:
+        """Read the waiting datagrams, up to the batch size.
+
+        Returns:
+            The received datagrams, along with their receive timestamps.
+        """
+        if self._batch is not None:
+            received = self._batch.receive(self.sock.fileno())  # type: ignore
+        else:
+            received = self._receive_each()
+
+        if not self.options.timestamps:
+            return [Datagram(data, None) for data, _ in received]
+
+        # Convert the kernel timestamps from the system clock to the monotonic clock
+        # used by the rest of the driver
+        now = time.monotonic()
+        now_ns = time.time_ns()
+
+        return [
+            Datagram(data, None if ns is None else now - (now_ns - ns) * 1e-9)
+            for data, ns in received
+        ]
+
+    def send_batch(self, datagrams: list[bytes]) -> None:
+        """Send several datagrams to the Bravo 7, using one system call if possible.
+
+        Args:
+            datagrams: The encoded frames to send, grouped into datagrams.
+
+        Raises:
+            ConnectionError: The transport is closed.
+        """
+        if self.sock is None:
+            raise ConnectionError("The transport is closed.")
+
+        if self._name is not None and len(datagrams) > 1:
+            mmsg.send_batch(self.sock.fileno(), datagrams, self._name)
+        else:
+            for datagram in datagrams:
+                self.sock.sendto(datagram, self._address)
+
+    def _receive_each(self) -> list[tuple[bytes, int | None]]:
+        """Read the waiting datagrams one at a time, up to the batch size.
+
+        This is used when batched system calls aren't available. The first read may
+        block, so this should only be called once the socket is readable.
+
+        Returns:
+            The received datagrams, along with the time (ns since the epoch) at which
+            the kernel received each one, or None if timestamps are disabled.
+        """
+        sock: socket.socket = self.sock  # type: ignore
+        received: list[tuple[bytes, int | None]] = []
+        flags = 0
+
+        while len(received) < self.options.batch_size:
+            try:
+                if self.options.timestamps:
+                    data, ancdata, _, _ = sock.recvmsg(
+                        READ_SIZE, mmsg.control_space(), flags
+                    )
+                    received.append((data, mmsg.ancillary_timestamp(ancdata)))
+                else:
+                    received.append((sock.recv(READ_SIZE, flags), None))
+            except BlockingIOError:
+                break
+
+            # Without non-blocking reads, only the first datagram is known to be waiting
+            if not mmsg.MSG_DONTWAIT:
+                break
+
+            flags = mmsg.MSG_DONTWAIT
+
+        return received
+
+    def _configure(self, sock: socket.socket) -> None:
+        """Apply the socket options.
+
+        Args:
+            sock: The socket to configure.
+
+        Raises:
+            OSError: An option isn't supported on this platform.
+        """
+        options = self.options
+
+        if options.recv_buffer_size is not None:
+            self._set_buffer_size(sock, socket.SO_RCVBUF, options.recv_buffer_size)
+
+        if options.send_buffer_size is not None:
+            self._set_buffer_size(sock, socket.SO_SNDBUF, options.send_buffer_size)
+
+        if options.dscp is not None:
+            # The lower two bits of the TOS byte are used for congestion notification
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_TOS, options.dscp << 2)
+
+        if options.priority is not None:
+            if not hasattr(socket, "SO_PRIORITY"):
+                raise OSError("Socket priorities are only supported on Linux.")
+
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_PRIORITY, options.priority)
+
+        if options.timestamps:
+            if mmsg.SO_TIMESTAMPNS is None:
+                raise OSError("Receive timestamps are only supported on Linux.")
+
+            sock.setsockopt(socket.SOL_SOCKET, mmsg.SO_TIMESTAMPNS, 1)
+
+    def _set_buffer_size(self, sock: socket.socket, option: int, size: int) -> None:
+        """Set the size of a kernel buffer, warning if the kernel limits it.
+
+        Args:
+            sock: The socket to configure.
+            option: The buffer option, i.e., ``SO_RCVBUF`` or ``SO_SNDBUF``.
+            size: The requested buffer size (bytes).
+        """
+        sock.setsockopt(socket.SOL_SOCKET, option, size)
+
+        # Linux reports double the requested size to account for its bookkeeping
+        actual = sock.getsockopt(socket.SOL_SOCKET, option)
+
+        if actual < size:
+            self._logger.warning(
+                f"The kernel limited the socket buffer to {actual} bytes instead of"
+                f" {size} bytes. Consider raising the system's maximum buffer size."
+            )
+
+
+class TcpTransport(Transport):
+    """Communicates with the Bravo 7 over a TCP stream, e.g., via a serial server."""
+
+    def __init__(
+        self, ip: str = "192.168.2.3", port: int = 6789, timeout: float = 5.0
+    ) -> None:
+        """Create a new TCP transport.
+
+        Args:
+            ip: The IP address of the server. Defaults to "192.168.2.3".
+            port: The port of the server. Defaults to 6789.
+            timeout: The maximum amount of time (s) to wait for the connection.
+                Defaults to 5.0.
+        """
+        self._address = (ip, port)
+        self.timeout = timeout
+        self.sock: socket.socket | None = None
+
+    @property
+    def address(self) -> Address:
+        """Get the IP address and port of the server.
+
+        Returns:
+            The address of the server.
+        """
+        return self._address
+
+    def open(self) -> None:
+        """Connect to the server."""
+        sock = socket.create_connection(self._address, self.timeout)
+
+        try:
+            sock.settimeout(None)
+
+            # Commands are small and latency-sensitive, so don't wait to coalesce them
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except BaseException:
+            sock.close()
+            raise
+
+        self.sock = sock
+
+    def close(self) -> None:
+        """Close the connection."""
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def fileno(self) -> int:
+        """Get the file descriptor of the socket.
+
+        Returns:
+            The file descriptor of the socket.
+        """
+        return self.sock.fileno()  # type: ignore
+
+    def send(self, data: bytes) -> None:
+        """Write data to the stream.
+
+        Args:
+            data: The encoded frames to send.
+
+        Raises:
+            ConnectionError: The transport is closed.
+        """
+        if self.sock is None:
+            raise ConnectionError("The transport is closed.")
+
+        self.sock.sendall(data)
+
+    def read(self) -> bytes:
+        """Read the data that is available on the stream.
+
+        Raises:
+            ConnectionError: The server closed the connection.
+
+        Returns:
+            The received data.
+        """
+        data = self.sock.recv(READ_SIZE)  # type: ignore
+
+        if not data:
+            raise ConnectionError("The connection was closed by the server.")
+
+        return data
+
+
+class SerialTransport(Transport):
+    """Communicates with the Bravo 7 over a serial port."""
+
+    def __init__(
+        self, port: str, baudrate: int = 115200, read_size: int = READ_SIZE
+    ) -> None:
+        """Create a new serial transport.
+
+        Args:
+            port: The path of the serial port, e.g., "/dev/ttyUSB0".
+            baudrate: The baud rate of the serial port. Defaults to 115200.
+            read_size: The maximum number of bytes to read at once. Defaults to 4096.
+        """
+        self.port = port
+        self.baudrate = baudrate
+        self.read_size = read_size
+        self._fd: int | None = None
+
+    @property
+    def address(self) -> Address:
+        """Get the path of the serial port.
+
+        Returns:
+            The path of the serial port.
+        """
+        return self.port
+
+    def open(self) -> None:
+        """Open the serial port and configure it as a raw 8N1 link.
+
+        Raises:
+            OSError: Serial ports aren't supported on this platform.
+            ValueError: The baud rate is not supported.
+        """
+        if termios is None:
+            raise OSError("Serial ports are only supported on POSIX systems.")
+
+        speed = getattr(termios, f"B{self.baudrate}", None)
+
+        if speed is None:
+            raise ValueError(f"The baud rate {self.baudrate} is not supported.")
+
+        # Don't wait for the carrier detect line while opening the port
+        fd = os.open(self.port, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+
+        try:
+            iflag, oflag, cflag, lflag, _, _, cc = termios.tcgetattr(fd)
+
+            iflag = 0
+            oflag = 0
+            lflag = 0
+            cflag = (cflag & ~(termios.CSIZE | termios.PARENB | termios.CSTOPB)) | (
+                termios.CS8 | termios.CREAD | termios.CLOCAL
+            )
+
+            # Reads are only made once the port is readable, so they never need to wait
+            cc[termios.VMIN] = 0
+            cc[termios.VTIME] = 0
+
+            termios.tcsetattr(
+                fd, termios.TCSANOW, [iflag, oflag, cflag, lflag, speed, speed, cc]
+            )
+            termios.tcflush(fd, termios.TCIOFLUSH)
+        except BaseException:
+            os.close(fd)
+            raise
+
+        self._fd = fd
+
+    def close(self) -> None:
+        """Close the serial port."""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def fileno(self) -> int:
+        """Get the file descriptor of the serial port.
+
+        Returns:
+            The file descriptor of the serial port.
+        """
+        return self._fd  # type: ignore
+
+    def send(self, data: bytes) -> None:
+        """Write data to the serial port, waiting for space in the output buffer.
+
+        Args:
+            data: The encoded frames to send.
+
+        Raises:
+            ConnectionError: The transport is closed.
+        """
+        if self._fd is None:
+            raise ConnectionError("The transport is closed.")
+
+        view = memoryview(data)
+
+        while view:
+            try:
+                written = os.write(self._fd, view)
+            except BlockingIOError:
+                select.select([], [self._fd], [])
+                continue
+
+            view = view[written:]
+
+    def read(self) -> bytes:
+        """Read as much data as is available on the serial port.
+
+        Raises:
+            ConnectionError: The serial port was disconnected.
+
+        Returns:
+            The received data.
+        """
+        try:
+            data = os.read(self._fd, self.read_size)  # type: ignore
+        except BlockingIOError:
+            return b""
+
+        if not data:
+            raise ConnectionError(f"The serial port {self.port} was disconnected.")
+
+        return data
@@ -0,0 +1,435 @@
+# Copyright (c) 2023 Evan Palmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Computes the forward kinematics and Jacobian of the Bravo 7 joint chain.
+
+The Bravo 7 is a chain of six revolute joints, from the base rotation (device 7) to the
+end effector rotation (device 2), followed by the linear jaws (device 1), which don't
+move the end effector frame. Joint positions are given as arrays with one column per
+device, ordered by device ID, which is the order used by ``JointStateCache.positions``.
+The position of the jaws is accepted, but ignored.
+
+``BravoKinematics`` evaluates the chain in two ways. ``forward``, ``pose`` and
+``jacobian`` are vectorized over an N x 7 array of joint positions, which is suited to
+analyzing logs and streams of telemetry. The incremental path (``update``,
+``end_transform`` and ``end_jacobian``) caches the transform of each link and the
+products of the links before it, so updating a single joint only recomputes the links
+after it. The incremental path can be fed directly from ``POSITION`` packets using
+``on_position``.
+
+The end effector pose reported by the Bravo (``KM_END_POS``) can be decoded into
+homogeneous transforms using ``decode_end_transforms`` to validate the arm-side
+kinematics against the model. The default Denavit-Hartenberg parameters are the
+nominal dimensions of the Bravo 7, and should be replaced with calibrated values where
+accuracy matters.
+
+NumPy is required by this module.
+
+Examples:
+    >>> kinematics = BravoKinematics()
+    >>> kinematics.pose(np.zeros((100, 7))).shape
+    (100, 6)
+    >>> kinematics.jacobian(np.zeros((100, 7))).shape
+    (100, 6, 7)
+    >>> bravo.attach_callback(PacketID.POSITION, kinematics.on_position)
+    >>> kinematics.end_transform()
+"""
+
+from __future__ import annotations
+
+import math
+from typing import NamedTuple, Sequence
+
+try:
+    import numpy as np
+except ImportError as e:
+    raise ImportError(
+        "NumPy is required for the kinematics. Install it with"
+        " `python3 -m pip install pybravo[numpy]`."
+    ) from e
+
+from pybravo.protocol import DeviceID, Packet, PacketID
+from pybravo.protocol.payload import PAYLOAD_CODECS, decode_batch
+
+# The number of devices whose positions are given for each sample, i.e., devices 1 to 7
+NUM_JOINTS = 7
+
+
+class DHParameters(NamedTuple):
+    """The standard Denavit-Hartenberg parameters of a revolute joint."""
+
+    device_id: DeviceID
+
+    # The link length (m) and twist (rad)
+    a: float
+    alpha: float
+
+    # The link offset (m) and the offset (rad) added to the joint position
+    d: float
+    theta: float
+
+
+# The nominal parameters of the Bravo 7 joint chain, ordered from the base
+BRAVO_7_DH = (
+    DHParameters(DeviceID.ROTATE_BASE, 0.046, math.pi / 2, 0.1205, math.pi),
+    DHParameters(DeviceID.BEND_SHOULDER, 0.2928, math.pi, 0.0, -1.3174),
+    DHParameters(DeviceID.BEND_ELBOW, 0.0403, math.pi / 2, 0.0, -1.3174),
+    DHParameters(DeviceID.ROTATE_ELBOW, 0.0, -math.pi / 2, 0.2967, 0.0),
+    DHParameters(DeviceID.BEND_FOREARM, 0.0403, math.pi / 2, 0.0, 0.0),
+    DHParameters(DeviceID.ROTATE_END_EFFECTOR, 0.0, -math.pi / 2, 0.3286, -math.pi / 2),
+)
+
+
+def _link_coefficients(params: DHParameters) -> np.ndarray:
+    """Compute the constant terms of the transform of a link.
+
+    The transform of a link is affine in the cosine and sine of the joint angle, so it
+    can be computed for many joint positions as ``C[0] + cos(theta) * C[1] +
+    sin(theta) * C[2]``.
+
+    Args:
+        params: The DH parameters of the link.
+
+    Returns:
+        The constant, cosine, and sine coefficients, with shape (3, 4, 4).
+    """
+    cos_alpha = math.cos(params.alpha)
+    sin_alpha = math.sin(params.alpha)
+
+    coefficients = np.zeros((3, 4, 4))
+    coefficients[0, 2] = (0.0, sin_alpha, cos_alpha, params.d)
+    coefficients[0, 3, 3] = 1.0
+    coefficients[1, 0] = (1.0, 0.0, 0.0, params.a)
+    coefficients[1, 1] = (0.0, cos_alpha, -sin_alpha, 0.0)
+    coefficients[2, 0] = (0.0, -cos_alpha, sin_alpha, 0.0)
+    coefficients[2, 1] = (1.0, 0.0, 0.0, params.a)
+
+    return coefficients
+
+
+def pose_to_transform(poses: np.ndarray) -> np.ndarray:
+    """Convert poses to homogeneous transforms.
+
+    Args:
+        poses: The poses (x, y, z, rz, ry, rx), where the rotation is given by the ZYX
+            Euler angles, with shape (..., 6).
+
+    Returns:
+        The homogeneous transforms, with shape (..., 4, 4).
+    """
+    poses = np.asarray(poses, dtype=np.float64)
+    cz, cy, cx = np.cos(poses[..., 3]), np.cos(poses[..., 4]), np.cos(poses[..., 5])
+    sz, sy, sx = np.sin(poses[..., 3]), np.sin(poses[..., 4]), np.sin(poses[..., 5])
+
+    transforms = np.zeros(poses.shape[:-1] + (4, 4))
+    transforms[..., 0, 0] = cz * cy
+    transforms[..., 0, 1] = cz * sy * sx - sz * cx
+    transforms[..., 0, 2] = cz * sy * cx + sz * sx
+    transforms[..., 1, 0] = sz * cy
+    transforms[..., 1, 1] = sz * sy * sx + cz * cx
+    transforms[..., 1, 2] = sz * sy * cx - cz * sx
+    transforms[..., 2, 0] = -sy
+    transforms[..., 2, 1] = cy * sx
+    transforms[..., 2, 2] = cy * cx
+    transforms[..., :3, 3] = poses[..., :3]
+    transforms[..., 3, 3] = 1.0
+
+    return transforms
+
+
+def transform_to_pose(transforms: np.ndarray) -> np.ndarray:
+    """Convert homogeneous transforms to poses.
+
+    Args:
+        transforms: The homogeneous transforms, with shape (..., 4, 4).
+
+    Returns:
+        The poses (x, y, z, rz, ry, rx), where the rotation is given by the ZYX Euler
+        angles, with shape (..., 6).
+    """
+    transforms = np.asarray(transforms, dtype=np.float64)
+    rotation = transforms[..., :3, :3]
+
+    poses = np.empty(transforms.shape[:-2] + (6,))
+    poses[..., :3] = transforms[..., :3, 3]
+    poses[..., 3] = np.arctan2(rotation[..., 1, 0], rotation[..., 0, 0])
+    poses[..., 4] = np.arctan2(
+        -rotation[..., 2, 0], np.hypot(rotation[..., 0, 0], rotation[..., 1, 0])
+    )
+    poses[..., 5] = np.arctan2(rotation[..., 2, 1], rotation[..., 2, 2])
+
+    return poses
+
+
+def decode_end_transforms(packets: Sequence[Packet]) -> np.ndarray:
+    """Decode ``KM_END_POS`` packets into homogeneous transforms.
+
+    Args:
+        packets: The end effector pose packets reported by the Bravo.
+
+    Returns:
+        The end effector transforms in meters, with shape (N, 4, 4).
+    """
+    return pose_to_transform(decode_batch(packets, PacketID.KM_END_POS))
+
+
+class BravoKinematics:
+    """The forward kinematics and Jacobian of the Bravo 7 joint chain."""
+
+    def __init__(
+        self,
+        dh: Sequence[DHParameters] = BRAVO_7_DH,
+        base: np.ndarray | None = None,
+        tool: np.ndarray | None = None,
+    ) -> None:
+        """Create a new kinematic model.
+
+        Args:
+            dh: The DH parameters of each joint, ordered from the base. Defaults to the
+                nominal parameters of the Bravo 7.
+            base: The transform from the world frame to the base of the arm. Defaults
+                to the identity.
+            tool: The transform from the last joint to the tool frame. Defaults to the
+                identity.
+        """
+        self.dh = tuple(dh)
+        self.base = np.eye(4) if base is None else np.asarray(base, dtype=np.float64)
+        self.tool = np.eye(4) if tool is None else np.asarray(tool, dtype=np.float64)
+
+        # The column of the joint position array used by each joint in the chain
+        self._columns = [p.device_id.value - 1 for p in self.dh]
+        self._chain_index = {p.device_id.value: i for i, p in enumerate(self.dh)}
+
+        # The precomputed terms of each link transform
+        self._coefficients = np.stack([_link_coefficients(p) for p in self.dh])
+        self._offsets = np.array([p.theta for p in self.dh])
+
+        # The incremental state: the position and transform of each link, and the
+        # product of the base and the links up to and including each link. Products
+        # from the first stale link onwards are recomputed when they're needed.
+        self._positions = [0.0] * len(self.dh)
+        self._links = [self._link(i, 0.0) for i in range(len(self.dh))]
+        self._products = [np.eye(4) for _ in self.dh]
+        self._stale = 0
+
+    def forward(self, positions: np.ndarray) -> np.ndarray:
+        """Compute the tool transforms for many sets of joint positions.
+
+        Args:
+            positions: The joint positions, with shape (N, 7) or (7,).
+
+        Returns:
+            The tool transforms in the world frame, with shape (N, 4, 4) or (4, 4).
+        """
+        positions = np.asarray(positions, dtype=np.float64)
+        frames = self._frames(np.atleast_2d(positions))
+        transforms = frames[-1] @ self.tool
+
+        return transforms if positions.ndim > 1 else transforms[0]
+
+    def pose(self, positions: np.ndarray) -> np.ndarray:
+        """Compute the tool poses for many sets of joint positions.
+
+        Args:
+            positions: The joint positions, with shape (N, 7) or (7,).
+
+        Returns:
+            The tool poses (x, y, z, rz, ry, rx), with shape (N, 6) or (6,).
+        """
+        return transform_to_pose(self.forward(positions))
+
+    def jacobian(self, positions: np.ndarray) -> np.ndarray:
+        """Compute the geometric Jacobians for many sets of joint positions.
+
+        The Jacobian maps the joint velocities to the linear and angular velocity of
+        the tool frame in the world frame, (vx, vy, vz, wx, wy, wz). The column of the
+        linear jaws is always zero.
+
+        Args:
+            positions: The joint positions, with shape (N, 7) or (7,).
+
+        Returns:
+            The Jacobians, with shape (N, 6, 7) or (6, 7).
+        """
+        positions = np.asarray(positions, dtype=np.float64)
+        frames = self._frames(np.atleast_2d(positions))
+        end = (frames[-1] @ self.tool)[:, :3, 3]
+
+        jacobian = np.zeros((len(end), 6, NUM_JOINTS))
+
+        # Each joint rotates about the z axis of the frame before it
+        # There is one frame per link, so the lengths always match
+        for column, frame in zip(self._columns, frames[:-1]):  # noqa: B905
+            axis = frame[:, :3, 2]
+            jacobian[:, :3, column] = np.cross(axis, end - frame[:, :3, 3])
+            jacobian[:, 3:, column] = axis
+
+        return jacobian if positions.ndim > 1 else jacobian[0]
+
+    def origins(self, positions: np.ndarray) -> np.ndarray:
+        """Compute the origin of each frame along the arm for many joint positions.
+
+        Consecutive origins are connected by the links of the arm, so the segments
+        between them approximate the geometry of the arm.
+
+        Args:
+            positions: The joint positions, with shape (N, 7) or (7,).
+
+        Returns:
+            The origins of the base frame, each link frame, and the tool frame in the
+            world frame, with shape (N, 8, 3) or (8, 3).
+        """
+        positions = np.asarray(positions, dtype=np.float64)
+        frames = self._frames(np.atleast_2d(positions))
+        frames.append(frames[-1] @ self.tool)
+
+        origins = np.stack([frame[:, :3, 3] for frame in frames], axis=1)
+
+        return origins if positions.ndim > 1 else origins[0]
+
+    def update(self, device_id: DeviceID | int, position: float) -> None:
+        """Update the position of a single joint in the incremental model.
+
+        Args:
+            device_id: The device ID of the joint.
+            position: The position of the joint (rad).
+        """
+        index = self._chain_index.get(getattr(device_id, "value", device_id))
+
+        # The jaws and other devices don't move the tool frame
+        if index is None or self._positions[index] == position:
+            return
+
+        self._positions[index] = position
+        self._links[index] = self._link(index, position)
+        self._stale = min(self._stale, index)
+
+    def on_position(self, packet: Packet) -> None:
+        """Update the incremental model using a ``POSITION`` packet.
+
+        This can be attached to the driver as a callback.
+
+        Args:
+            packet: The received position packet.
+        """
+        if packet.raw_device_id in self._chain_index:
+            (position,) = PAYLOAD_CODECS[PacketID.POSITION].decode(packet)
+            self.update(packet.raw_device_id, position)
+
+    def end_transform(self) -> np.ndarray:
+        """Get the tool transform for the latest joint positions.
+
+        Returns:
+            The tool transform in the world frame, with shape (4, 4).
+        """
+        return self._refresh()[-1] @ self.tool
+
+    def end_pose(self) -> np.ndarray:
+        """Get the tool pose for the latest joint positions.
+
+        Returns:
+            The tool pose (x, y, z, rz, ry, rx), with shape (6,).
+        """
+        return transform_to_pose(self.end_transform())
+
+    def end_jacobian(self) -> np.ndarray:
+        """Get the geometric Jacobian for the latest joint positions.
+
+        Returns:
+            The Jacobian, with shape (6, 7).
+        """
+        products = self._refresh()
+        end = (products[-1] @ self.tool)[:3, 3]
+        jacobian = np.zeros((6, NUM_JOINTS))
+
+        frames = [self.base, *products[:-1]]
+
+        for column, frame in zip(self._columns, frames):  # noqa: B905
+            axis = frame[:3, 2]
+            jacobian[:3, column] = np.cross(axis, end - frame[:3, 3])
+            jacobian[3:, column] = axis
+
+        return jacobian
+
+    def _frames(self, positions: np.ndarray) -> list[np.ndarray]:
+        """Compute the frame of the base and of each link for many joint positions.
+
+        Args:
+            positions: The joint positions, with shape (N, 7).
+
+        Raises:
+            ValueError: The joint positions have the wrong shape.
+
+        Returns:
+            The transform of the base, followed by the transform of each link, each
+            with shape (N, 4, 4).
+        """
+        if positions.shape[1] != NUM_JOINTS:
+            raise ValueError(
+                f"Expected {NUM_JOINTS} joint positions, got {positions.shape[1]}."
+            )
+
+        theta = positions[:, self._columns] + self._offsets
+        coefficients = self._coefficients
+        links = (
+            coefficients[:, 0]
+            + np.cos(theta)[..., np.newaxis, np.newaxis] * coefficients[:, 1]
+            + np.sin(theta)[..., np.newaxis, np.newaxis] * coefficients[:, 2]
+        )
+
+        frame = np.broadcast_to(self.base, (len(positions), 4, 4))
+        frames = [frame]
+
+        for i in range(len(self.dh)):
+            frame = frame @ links[:, i]
+            frames.append(frame)
+
+        return frames
+
+    def _link(self, index: int, position: float) -> np.ndarray:
+        """Compute the transform of a single link.
+
+        Args:
+            index: The index of the link in the chain.
+            position: The position of the joint (rad).
+
+        Returns:
+            The link transform, with shape (4, 4).
+        """
+        theta = position + self.dh[index].theta
+        constant, cosine, sine = self._coefficients[index]
+
+        return constant + math.cos(theta) * cosine + math.sin(theta) * sine
+
+    def _refresh(self) -> list[np.ndarray]:
+        """Recompute the stale link products of the incremental model.
+
+        Returns:
+            The product of the base and the links up to and including each link.
+        """
+        products = self._products
+
+        for i in range(self._stale, len(self.dh)):
+            previous = products[i - 1] if i > 0 else self.base
+            products[i] = previous @ self._links[i]
+
+        self._stale = len(self.dh)
+
+        return products
@@ -0,0 +1,418 @@
+# Copyright (c) 2023 Evan Palmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Models the obstacles and joint limits of the Bravo 7 to check commands locally.
+
+The Bravo stops the arm from entering up to four box and four cylinder obstacles, and
+from exceeding the position and velocity limits of each joint. The ``SafetyModel``
+holds the same obstacles and limits in Python, encodes them into the packets that
+configure the arm, and uploads them using a single batched send.
+
+The model also checks ``POSITION`` and ``VELOCITY`` commands before they are sent, so
+that invalid commands are rejected locally instead of after a round trip to the arm.
+The limits are stored in arrays indexed by device ID, and the obstacle geometry is
+precomputed into arrays each time it changes, so a batch of commands is checked using a
+few vectorized operations. Position commands are checked for collisions by sampling
+points along the links of the arm at the commanded positions, using the latest state
+reported by the joints that aren't commanded.
+
+Examples:
+    >>> model = SafetyModel()
+    >>> model.set_limits(PacketID.POSITION_LIMITS, DeviceID.BEND_ELBOW, 0.5, 3.0)
+    >>> model.add_box(Box(0.2, -0.5, -0.1, 0.6, 0.5, 0.0))
+    >>> model.upload(bravo)
+    >>> bravo.attach_guard(model)
+    >>> bravo.send(encode_payload(DeviceID.BEND_ELBOW, PacketID.POSITION, 3.5))
+    UnsafeCommandError: The POSITION command 3.5 for DeviceID.BEND_ELBOW is outside of
+    [0.5, 3].
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, NamedTuple, Sequence
+
+import numpy as np
+
+from pybravo.kinematics.kinematics import NUM_JOINTS, BravoKinematics
+from pybravo.protocol import DeviceID, Packet, PacketID
+from pybravo.protocol.payload import decode_batch, encode_payload
+
+if TYPE_CHECKING:
+    from pybravo.driver import BravoDriver
+    from pybravo.driver.state import JointStateCache
+
+# The packet IDs of the obstacle slots supported by the Bravo
+BOX_SLOTS = (
+    PacketID.KM_BOX_OBSTACLE_02,
+    PacketID.KM_BOX_OBSTACLE_03,
+    PacketID.KM_BOX_OBSTACLE_04,
+    PacketID.KM_BOX_OBSTACLE_05,
+)
+CYLINDER_SLOTS = (
+    PacketID.KM_CYLINDER_OBSTACLE_02,
+    PacketID.KM_CYLINDER_OBSTACLE_03,
+    PacketID.KM_CYLINDER_OBSTACLE_04,
+    PacketID.KM_CYLINDER_OBSTACLE_05,
+)
+
+# The number of points sampled along each link when checking for collisions
+SAMPLES_PER_LINK = 8
+
+# The command checked against each type of limit
+_LIMITED_COMMANDS = {
+    PacketID.POSITION_LIMITS: PacketID.POSITION,
+    PacketID.VELOCITY_LIMITS: PacketID.VELOCITY,
+}
+
+# Packet and device IDs are single bytes
+_NUM_IDS = 256
+
+
+class UnsafeCommandError(ValueError):
+    """A command violates the limits or obstacles of the safety model."""
+
+
+class Box(NamedTuple):
+    """An axis-aligned box obstacle, given by two opposite corners (m)."""
+
+    x1: float
+    y1: float
+    z1: float
+    x2: float
+    y2: float
+    z2: float
+
+
+class Cylinder(NamedTuple):
+    """A cylinder obstacle, given by the centers of its ends (m) and its radius (m)."""
+
+    x1: float
+    y1: float
+    z1: float
+    x2: float
+    y2: float
+    z2: float
+    radius: float
+
+
+class Limits(NamedTuple):
+    """The lower and upper limits of a joint, in SI units."""
+
+    lower: float
+    upper: float
+
+
+class SafetyModel:
+    """The obstacles and joint limits of the Bravo 7, and checks against them."""
+
+    def __init__(self, kinematics: BravoKinematics | None = None) -> None:
+        """Create a new model without any obstacles or limits.
+
+        Args:
+            kinematics: The kinematic model used to check position commands for
+                collisions. Defaults to the nominal Bravo 7 model.
+        """
+        self.kinematics = kinematics if kinematics is not None else BravoKinematics()
+
+        # The device that the obstacle packets are sent to
+        self.device_id = DeviceID.ALL_JOINTS
+
+        self.boxes: list[Box] = []
+        self.cylinders: list[Cylinder] = []
+        self.limits: dict[PacketID, dict[DeviceID, Limits]] = {
+            packet_id: {} for packet_id in _LIMITED_COMMANDS
+        }
+
+        # The lower and upper limit of each command, indexed by device ID
+        self._bounds = {
+            command.value: (np.full(_NUM_IDS, -np.inf), np.full(_NUM_IDS, np.inf))
+            for command in _LIMITED_COMMANDS.values()
+        }
+
+        # The precomputed obstacle geometry
+        self._box_lower = np.empty((0, 3))
+        self._box_upper = np.empty((0, 3))
+        self._cylinder_start = np.empty((0, 3))
+        self._cylinder_axis = np.empty((0, 3))
+        self._cylinder_length_sq = np.empty(0)
+        self._cylinder_radius_sq = np.empty(0)
+
+        # The position along each link at which the link is sampled
+        self._samples = np.linspace(0.0, 1.0, SAMPLES_PER_LINK)[:, np.newaxis]
+
+    def set_limits(
+        self, packet_id: PacketID, device_id: DeviceID, lower: float, upper: float
+    ) -> None:
+        """Set the position or velocity limits of a joint.
+
+        Args:
+            packet_id: The type of limit, i.e., ``POSITION_LIMITS`` or
+                ``VELOCITY_LIMITS``.
+            device_id: The joint to limit.
+            lower: The lower limit, in SI units.
+            upper: The upper limit, in SI units.
+
+        Raises:
+            ValueError: The limit type isn't supported, or the limits are empty.
+        """
+        if packet_id not in _LIMITED_COMMANDS:
+            raise ValueError(f"The limit type {packet_id} is not supported.")
+
+        if lower > upper:
+            raise ValueError("The lower limit must not exceed the upper limit.")
+
+        self.limits[packet_id][device_id] = Limits(lower, upper)
+
+        lowers, uppers = self._bounds[_LIMITED_COMMANDS[packet_id].value]
+        lowers[device_id.value] = lower
+        uppers[device_id.value] = upper
+
+    def add_box(self, box: Box) -> None:
+        """Add a box obstacle.
+
+        Args:
+            box: The obstacle to add.
+
+        Raises:
+            ValueError: All of the box obstacle slots are in use.
+        """
+        if len(self.boxes) == len(BOX_SLOTS):
+            raise ValueError(f"The Bravo supports at most {len(BOX_SLOTS)} boxes.")
+
+        self.boxes.append(box)
+        self._compile()
+
+    def add_cylinder(self, cylinder: Cylinder) -> None:
+        """Add a cylinder obstacle.
+
+        Args:
+            cylinder: The obstacle to add.
+
+        Raises:
+            ValueError: All of the cylinder obstacle slots are in use.
+        """
+        if len(self.cylinders) == len(CYLINDER_SLOTS):
+            raise ValueError(
+                f"The Bravo supports at most {len(CYLINDER_SLOTS)} cylinders."
+            )
+
+        self.cylinders.append(cylinder)
+        self._compile()
+
+    def clear_obstacles(self) -> None:
+        """Remove all of the obstacles."""
+        self.boxes.clear()
+        self.cylinders.clear()
+        self._compile()
+
+    def packets(self) -> list[Packet]:
+        """Encode the obstacles and limits into the packets that configure the arm.
+
+        Returns:
+            The packets that configure the obstacles and limits of the arm.
+        """
+        # The number of obstacles is limited to the number of slots when they're added
+        packets = [
+            encode_payload(self.device_id, slot, *box)
+            for slot, box in zip(BOX_SLOTS, self.boxes)  # noqa: B905
+        ]
+        packets += [
+            encode_payload(self.device_id, slot, *cylinder)
+            for slot, cylinder in zip(CYLINDER_SLOTS, self.cylinders)  # noqa: B905
+        ]
+
+        # The limits are sent with the upper limit first
+        for packet_id, limits in self.limits.items():
+            packets += [
+                encode_payload(device_id, packet_id, limit.upper, limit.lower)
+                for device_id, limit in limits.items()
+            ]
+
+        return packets
+
+    def upload(self, driver: BravoDriver) -> None:
+        """Send the obstacles and limits to the arm in as few datagrams as possible.
+
+        Args:
+            driver: The driver connected to the arm.
+        """
+        driver.send_many(self.packets())
+
+    def check(
+        self, packets: Sequence[Packet], state: JointStateCache | None = None
+    ) -> None:
+        """Check that the commands in a batch of packets are safe to send.
+
+        Packets other than ``POSITION`` and ``VELOCITY`` commands are ignored.
+
+        Args:
+            packets: The packets to check.
+            state: The latest state of the joints, which is used to check position
+                commands for collisions. Defaults to None, which skips the collision
+                check.
+
+        Raises:
+            UnsafeCommandError: A command is outside of the joint limits, or would move
+                the arm into an obstacle.
+        """
+        commands: dict[int, list[Packet]] = {command: [] for command in self._bounds}
+
+        for packet in packets:
+            selected = commands.get(packet.raw_packet_id)
+
+            if selected is not None:
+                selected.append(packet)
+
+        for command, selected in commands.items():
+            if selected:
+                devices, values = self._check_limits(command, selected)
+
+                if command == PacketID.POSITION.value and state is not None:
+                    self._check_collisions(devices, values, state)
+
+    def _check_limits(
+        self, command: int, packets: list[Packet]
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Check a batch of commands against the joint limits.
+
+        Args:
+            command: The packet ID of the commands.
+            packets: The commands to check.
+
+        Commands sent to ``DeviceID.ALL_JOINTS`` are checked as a command to each
+        joint.
+
+        Raises:
+            UnsafeCommandError: A command is outside of the joint limits.
+
+        Returns:
+            The device ID and value of each command to a single joint.
+        """
+        values = decode_batch(packets, PacketID(command))[:, 0]
+        devices = np.fromiter(
+            (p.raw_device_id for p in packets), dtype=np.intp, count=len(packets)
+        )
+
+        # The index of the packet that each checked command came from
+        sources = np.arange(len(packets))
+        broadcast = devices == DeviceID.ALL_JOINTS.value
+
+        if broadcast.any():
+            counts = np.where(broadcast, NUM_JOINTS, 1)
+            sources = np.repeat(sources, counts)
+            values = values[sources]
+            devices = np.repeat(devices, counts)
+            devices[broadcast[sources]] = np.tile(
+                np.arange(1, NUM_JOINTS + 1), int(broadcast.sum())
+            )
+
+        lowers, uppers = self._bounds[command]
+        lower = lowers[devices]
+        upper = uppers[devices]
+
+        # NaN fails both comparisons, so invert the check to reject it
+        invalid = ~((values >= lower) & (values <= upper))
+
+        if invalid.any():
+            i = int(np.argmax(invalid))
+            raise UnsafeCommandError(
+                f"The {PacketID(command).name} command {values[i]:.4g} for"
+                f" {packets[sources[i]].device_id} is outside of [{lower[i]:.4g},"
+                f" {upper[i]:.4g}]."
+            )
+
+        return devices, values
+
+    def _check_collisions(
+        self, devices: np.ndarray, values: np.ndarray, state: JointStateCache
+    ) -> None:
+        """Check whether position commands would move the arm into an obstacle.
+
+        Args:
+            devices: The device ID of each command.
+            values: The commanded positions.
+            state: The latest state of the joints.
+
+        Raises:
+            UnsafeCommandError: The commanded positions are in collision, or the
+                positions of the joints that weren't commanded are unknown.
+        """
+        if not len(self._box_lower) and not len(self._cylinder_start):
+            return
+
+        positions = np.array(state.positions())
+        joints = (devices >= 1) & (devices <= NUM_JOINTS)
+        positions[devices[joints] - 1] = values[joints]
+
+        # The linear jaws don't move the links, so their position isn't needed
+        if np.isnan(positions[1:]).any():
+            raise UnsafeCommandError(
+                "The position of every joint must be known to check for collisions."
+            )
+
+        origins = self.kinematics.origins(positions)
+        starts = origins[:-1]
+        points = (
+            starts + self._samples[:, np.newaxis] * (origins[1:] - starts)
+        ).reshape(-1, 3)
+
+        if len(self._box_lower):
+            inside = (
+                (points[:, np.newaxis] >= self._box_lower)
+                & (points[:, np.newaxis] <= self._box_upper)
+            ).all(axis=2)
+
+            if inside.any():
+                box = self.boxes[int(np.argmax(inside.any(axis=0)))]
+                raise UnsafeCommandError(f"The commanded positions collide with {box}.")
+
+        if len(self._cylinder_start):
+            offsets = points[:, np.newaxis] - self._cylinder_start
+            t = np.clip(
+                (offsets * self._cylinder_axis).sum(axis=2) / self._cylinder_length_sq,
+                0.0,
+                1.0,
+            )
+            distance_sq = (
+                (offsets - t[..., np.newaxis] * self._cylinder_axis) ** 2
+            ).sum(axis=2)
+            inside = distance_sq <= self._cylinder_radius_sq
+
+            if inside.any():
+                cylinder = self.cylinders[int(np.argmax(inside.any(axis=0)))]
+                raise UnsafeCommandError(
+                    f"The commanded positions collide with {cylinder}."
+                )
+
+    def _compile(self) -> None:
+        """Precompute the arrays used to check for collisions with the obstacles."""
+        boxes = np.array(self.boxes, dtype=np.float64).reshape(-1, 6)
+        self._box_lower = np.minimum(boxes[:, :3], boxes[:, 3:])
+        self._box_upper = np.maximum(boxes[:, :3], boxes[:, 3:])
+
+        cylinders = np.array(self.cylinders, dtype=np.float64).reshape(-1, 7)
+        self._cylinder_start = cylinders[:, :3]
+        self._cylinder_axis = cylinders[:, 3:6] - cylinders[:, :3]
+
+        # Guard against degenerate cylinders, whose ends coincide
+        self._cylinder_length_sq = np.maximum(
+            (self._cylinder_axis**2).sum(axis=1), np.finfo(np.float64).tiny
+        )
+        self._cylinder_radius_sq = cylinders[:, 6] ** 2
@@ -18,8 +18,23 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+from .codec import CrcError, FrameError, LengthError
 from .device_id import DeviceID
 from .packet import Packet
 from .packet_id import PacketID
+from .payload import PayloadCodec, decode_batch, decode_payload, encode_payload
+from .stream import PacketStreamDecoder
 
-__all__ = ["DeviceID", "PacketID", "Packet"]
+__all__ = [
+    "CrcError",
+    "FrameError",
+    "LengthError",
+    "DeviceID",
+    "PacketID",
+    "Packet",
+    "PacketStreamDecoder",
+    "PayloadCodec",
+    "decode_batch",
+    "decode_payload",
+    "encode_payload",
+]
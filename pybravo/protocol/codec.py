@@ -0,0 +1,295 @@
+# Copyright (c) 2023 Evan Palmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+r"""Implements the framing used by the Reach serial protocol.
+
+Each frame on the wire is the COBS encoding of the packet data, followed by the packet
+ID, device ID, packet length, and a CRC-8 checksum, and is terminated by a ``0x00``
+delimiter. The CRC uses the reflected polynomial ``0x4D`` with a final XOR of ``0xFF``.
+
+The checksum is computed using a precomputed 256-entry lookup table, and the COBS
+encoding is performed block-wise so that the frame can be built in a single pass.
+
+Examples:
+    >>> encode_frame(0x60, 0x01, b"\x03")
+    b'\x06\x03`\x01\x05R\x00'
+    >>> decode_frame(b'\x06\x03`\x01\x05R\x00')
+    (1, 96, b'\x03')
+"""
+
+from __future__ import annotations
+
+# The CRC-8 polynomial used by the Reach serial protocol (0x4D), bit-reversed for the
+# reflected table-driven implementation.
+_CRC8_POLYNOMIAL_REFLECTED = 0xB2
+_CRC8_FINAL_XOR = 0xFF
+
+# The maximum number of non-zero bytes in a single COBS block, and the code byte used
+# for a full block, which is not followed by an implicit zero
+_COBS_MAX_BLOCK = 0xFE
+_COBS_FULL_BLOCK_CODE = 0xFF
+
+# The packet ID, device ID, length, and CRC bytes that follow the packet data
+_FRAME_OVERHEAD = 4
+
+
+class FrameError(ValueError):
+    """A frame could not be decoded."""
+
+
+class CrcError(FrameError):
+    """The CRC of a frame doesn't match its contents."""
+
+
+class LengthError(FrameError):
+    """The length of a frame doesn't match the length that it specifies."""
+
+
+def _build_crc8_table() -> tuple[int, ...]:
+    """Build the lookup table for the reflected CRC-8 computation.
+
+    Returns:
+        A table with the CRC remainder for each possible byte value.
+    """
+    table = []
+
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ _CRC8_POLYNOMIAL_REFLECTED if crc & 1 else crc >> 1
+        table.append(crc)
+
+    return tuple(table)
+
+
+_CRC8_TABLE = _build_crc8_table()
+
+
+def crc8(data: bytes | bytearray | memoryview) -> int:
+    """Calculate the CRC-8 checksum of the provided data.
+
+    Args:
+        data: The data to calculate the checksum of.
+
+    Returns:
+        The checksum of the data.
+    """
+    table = _CRC8_TABLE
+    crc = 0
+
+    for byte in data:
+        crc = table[crc ^ byte]
+
+    return crc ^ _CRC8_FINAL_XOR
+
+
+def cobs_encode(data: bytes | bytearray | memoryview) -> bytes:
+    """Encode the data using the COBS encoding algorithm.
+
+    The encoded data does not include the trailing ``0x00`` delimiter.
+
+    Args:
+        data: The data to encode.
+
+    Returns:
+        The encoded data.
+    """
+    encoded = bytearray()
+    blocks = bytes(data).split(b"\x00")
+    last = len(blocks) - 1
+
+    for i, run in enumerate(blocks):
+        # Runs of non-zero bytes that are longer than the maximum block size are split
+        # into multiple blocks that are not followed by an implicit zero
+        while len(run) >= _COBS_MAX_BLOCK:
+            encoded.append(_COBS_FULL_BLOCK_CODE)
+            encoded += run[:_COBS_MAX_BLOCK]
+            run = run[_COBS_MAX_BLOCK:]  # noqa: PLW2901
+
+            # A full block at the end of the data doesn't need a trailing code byte
+            if not run and i == last:
+                return bytes(encoded)
+
+        encoded.append(len(run) + 1)
+        encoded += run
+
+    return bytes(encoded)
+
+
+def cobs_decode(data: bytes | bytearray | memoryview) -> bytes:
+    """Decode data that was encoded using the COBS encoding algorithm.
+
+    The data should not include the trailing ``0x00`` delimiter.
+
+    Args:
+        data: The encoded data.
+
+    Raises:
+        FrameError: The data is not a valid COBS encoding.
+
+    Returns:
+        The decoded data.
+    """
+    decoded = bytearray()
+    length = len(data)
+    i = 0
+
+    while i < length:
+        code = data[i]
+
+        if code == 0:
+            raise FrameError("Zero byte found in the COBS-encoded data.")
+
+        end = i + code
+
+        if end > length:
+            raise FrameError("The COBS-encoded data is truncated.")
+
+        block = data[i + 1 : end]
+
+        if 0 in block:
+            raise FrameError("Zero byte found in the COBS-encoded data.")
+
+        decoded += block
+        i = end
+
+        if code != _COBS_FULL_BLOCK_CODE and i < length:
+            decoded.append(0)
+
+    return bytes(decoded)
+
+
+def encode_frame(
+    packet_id: int, device_id: int, data: bytes | bytearray | memoryview
+) -> bytes:
+    """Build a complete, delimited frame for a packet.
+
+    Args:
+        packet_id: The integer ID of the packet.
+        device_id: The integer ID of the device that the packet is targeting.
+        data: The packet data.
+
+    Returns:
+        The encoded frame, including the trailing ``0x00`` delimiter.
+    """
+    raw = bytearray(data)
+    raw += bytes((packet_id, device_id, len(raw) + _FRAME_OVERHEAD))
+    raw.append(crc8(raw))
+
+    return cobs_encode(raw) + b"\x00"
+
+
+def decode_frame(frame: bytes | bytearray | memoryview) -> tuple[int, int, bytes]:
+    """Decode and verify a single frame.
+
+    Args:
+        frame: The encoded frame. The trailing ``0x00`` delimiter is optional.
+
+    Raises:
+        FrameError: The provided data is empty
+        FrameError: The frame is not a valid COBS encoding
+        CrcError: Invalid CRC value
+        LengthError: The actual payload is not equal to the specified payload
+
+    Returns:
+        The integer device ID, the integer packet ID, and the packet data.
+    """
+    if len(frame) <= 0:
+        raise FrameError("Cannot decode an empty byte array!")
+
+    if frame[-1] == 0:
+        frame = frame[:-1]
+
+    decoded = cobs_decode(frame)
+
+    if len(decoded) < _FRAME_OVERHEAD:
+        raise LengthError("The frame is too short to contain a packet.")
+
+    if crc8(decoded[:-1]) != decoded[-1]:
+        raise CrcError("The expected and actual CRC values do not match.")
+
+    if len(decoded) != decoded[-2]:
+        raise LengthError(
+            "The specified payload size is not equal to the actual payload size."
+        )
+
+    return decoded[-3], decoded[-4], decoded[:-4]
+
+
+def decode_frame_into(
+    view: memoryview, start: int, end: int
+) -> tuple[int, int, memoryview]:
+    """Decode and verify a single frame in place, without allocating a new buffer.
+
+    The COBS encoding is never shorter than the data that it encodes, so the frame can
+    be decoded by moving each block towards the start of the buffer. The contents of
+    the buffer in the range ``[start, end)`` are overwritten.
+
+    Args:
+        view: A writable view of the buffer that holds the frame.
+        start: The index of the first byte of the frame.
+        end: The index after the last byte of the frame, excluding the delimiter.
+
+    Raises:
+        FrameError: The provided data is empty
+        FrameError: The frame is not a valid COBS encoding
+        CrcError: Invalid CRC value
+        LengthError: The actual payload is not equal to the specified payload
+
+    Returns:
+        The integer device ID, the integer packet ID, and a view of the packet data.
+    """
+    if end <= start:
+        raise FrameError("Cannot decode an empty byte array!")
+
+    write = start
+    read = start
+
+    while read < end:
+        code = view[read]
+        block_end = read + code
+
+        if code == 0:
+            raise FrameError("Zero byte found in the COBS-encoded data.")
+
+        if block_end > end:
+            raise FrameError("The COBS-encoded data is truncated.")
+
+        size = code - 1
+        view[write : write + size] = view[read + 1 : block_end]
+        write += size
+        read = block_end
+
+        if code != _COBS_FULL_BLOCK_CODE and read < end:
+            view[write] = 0
+            write += 1
+
+    if write - start < _FRAME_OVERHEAD:
+        raise LengthError("The frame is too short to contain a packet.")
+
+    if crc8(view[start : write - 1]) != view[write - 1]:
+        raise CrcError("The expected and actual CRC values do not match.")
+
+    if write - start != view[write - 2]:
+        raise LengthError(
+            "The specified payload size is not equal to the actual payload size."
+        )
+
+    return view[write - 3], view[write - 4], view[start : write - _FRAME_OVERHEAD]
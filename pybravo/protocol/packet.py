@@ -23,6 +23,10 @@ r"""Provides a wrapper for packets defined using Reach serial protocol.
 A ``Packet`` provides an abstraction for serial data received from the Reach Bravo 7
 manipulator. A ``Packet`` can also be used to create commands to send to the Bravo.
 
+Packets are immutable. The device and packet IDs are stored as integers and resolved to
+their enum members when accessed, so packets with IDs that aren't known to pybravo can
+still be decoded; their IDs are reported as plain integers.
+
 Examples:
     >>> Packet(DeviceID.LINEAR_JAWS, PacketID.REQUEST, bytes([PacketID.POSITION.value]))
     Packet(Packet ID: PacketID.REQUEST, Device ID: DeviceID.LINEAR_JAWS, Data: b'\x03')
@@ -30,40 +34,131 @@ Examples:
 
 from __future__ import annotations
 
-import struct
-
-from cobs import cobs
-from crc import Calculator, Configuration
+from typing import Iterable
 
+from pybravo.protocol.codec import decode_frame, encode_frame
 from pybravo.protocol.device_id import DeviceID
 from pybravo.protocol.packet_id import PacketID
 
+# The default maximum datagram size: the Ethernet MTU minus the IPv4 and UDP headers
+DEFAULT_MTU = 1472
+
+# Lookup tables used to resolve integer IDs without the overhead of an enum lookup
+_DEVICE_IDS: dict[int, DeviceID] = {member.value: member for member in DeviceID}
+_PACKET_IDS: dict[int, PacketID] = {member.value: member for member in PacketID}
+
 
 class Packet:
     """A serial packet defined using the Reach serial specification."""
 
-    _crc_calculator = Calculator(
-        Configuration(
-            width=8,
-            polynomial=0x4D,
-            init_value=0x00,
-            final_xor_value=0xFF,
-            reverse_input=True,
-            reverse_output=True,
-        )
-    )
+    __slots__ = ("_device_id", "_packet_id", "_data")
 
-    def __init__(self, device_id: DeviceID, packet_id: PacketID, data: bytes) -> None:
+    def __init__(
+        self,
+        device_id: DeviceID | int,
+        packet_id: PacketID | int,
+        data: bytes | memoryview,
+    ) -> None:
         """Create a new serial packet.
 
         Args:
             device_id: The device ID that the packet is targeting.
             packet_id: The ID of the packet.
-            data: The packet data.
+            data: The packet data. Packets received using the zero-copy receive path
+                hold a view into the receive buffer instead of a copy of the data.
+        """
+        self._device_id = device_id if isinstance(device_id, int) else device_id.value
+        self._packet_id = packet_id if isinstance(packet_id, int) else packet_id.value
+        self._data = data
+
+    @property
+    def device_id(self) -> DeviceID | int:
+        """Get the ID of the device that the packet is targeting.
+
+        Returns:
+            The device ID, or the integer ID if it isn't a known device.
+        """
+        return _DEVICE_IDS.get(self._device_id, self._device_id)
+
+    @property
+    def packet_id(self) -> PacketID | int:
+        """Get the ID of the packet.
+
+        Returns:
+            The packet ID, or the integer ID if it isn't a known packet type.
+        """
+        return _PACKET_IDS.get(self._packet_id, self._packet_id)
+
+    @property
+    def raw_device_id(self) -> int:
+        """Get the integer ID of the device that the packet is targeting.
+
+        Returns:
+            The integer device ID.
+        """
+        return self._device_id
+
+    @property
+    def raw_packet_id(self) -> int:
+        """Get the integer ID of the packet.
+
+        Returns:
+            The integer packet ID.
+        """
+        return self._packet_id
+
+    @property
+    def data(self) -> bytes | memoryview:
+        """Get the packet data.
+
+        Returns:
+            The packet data.
+        """
+        return self._data
+
+    def __eq__(self, other: object) -> bool:
+        """Check whether two packets have the same IDs and data.
+
+        Args:
+            other: The object to compare against.
+
+        Returns:
+            Whether or not the packets are equal.
+        """
+        if not isinstance(other, Packet):
+            return NotImplemented
+
+        return (
+            self._device_id == other._device_id
+            and self._packet_id == other._packet_id
+            and self._data == other._data
+        )
+
+    def __hash__(self) -> int:
+        """Hash the packet IDs and data.
+
+        Packets received using the zero-copy receive path aren't hashable, since their
+        data changes when the receive buffer is reused. Copy the data into a new packet
+        to hash it.
+
+        Returns:
+            The hash of the packet.
+
+        Raises:
+            TypeError: The packet holds a view into a receive buffer.
         """
-        self.device_id = device_id
-        self.packet_id = packet_id
-        self.data = data
+        if isinstance(self._data, memoryview):
+            raise TypeError("Packets that hold a view of their data aren't hashable.")
+
+        return hash((self._device_id, self._packet_id, bytes(self._data)))
+
+    def __repr__(self) -> str:
+        """Represent the packet as a string.
+
+        Returns:
+            A string description of the packet.
+        """
+        return str(self)
 
     def __str__(self) -> str:
         """Print the packet as a string.
@@ -73,7 +168,7 @@ class Packet:
         """
         return (
             f"Packet(Packet ID: {self.packet_id}, Device ID: {self.device_id},"
-            f" Data: {self.data!r})"
+            f" Data: {bytes(self.data)!r})"
         )
 
     def encode(self) -> bytes:
@@ -82,53 +177,62 @@ class Packet:
         Returns:
             The encoded serial data.
         """
-        data = self.data
-        data += struct.pack(
-            ">BBB",
-            self.packet_id.value,
-            self.device_id.value,
-            len(self.data) + 4,
-        )
-        data += struct.pack(">B", self._crc_calculator.checksum(data))
+        return encode_frame(self._packet_id, self._device_id, self._data)
 
-        return cobs.encode(data) + b"\x00"
+    @staticmethod
+    def encode_many(packets: Iterable[Packet], mtu: int = DEFAULT_MTU) -> list[bytes]:
+        """Encode several packets into as few datagrams as possible.
 
-    @classmethod
-    def decode(cls, data: bytes) -> Packet:
-        """Decode the provided serial data.
+        The encoded frames are concatenated in order, and a new datagram is only started
+        when the next frame would exceed the MTU. Each frame is always kept whole.
 
         Args:
-            data: The encoded serial data to decode.
+            packets: The packets to encode.
+            mtu: The maximum size of a single datagram. Defaults to 1472.
 
         Raises:
-            ValueError: Invalid CRC value
-            ValueError: The actual payload is not equal to the specified payload
-            ValueError: The provided data is empty
+            ValueError: A single encoded packet is larger than the MTU.
 
         Returns:
-            A packet with decoded serial data.
+            The encoded datagrams.
         """
-        if len(data) <= 0:
-            raise ValueError("Cannot decode an empty byte array!")
+        datagrams = []
+        buffer = bytearray()
+
+        for packet in packets:
+            frame = packet.encode()
 
-        if data[-1] == 0:
-            decoded = bytearray(cobs.decode(data[:-1]))
-        else:
-            decoded = bytearray(cobs.decode(data))
+            if len(frame) > mtu:
+                raise ValueError(
+                    f"The encoded packet {packet} is larger than the MTU ({mtu})."
+                )
 
-        actual_crc = decoded.pop()
+            if len(buffer) + len(frame) > mtu:
+                datagrams.append(bytes(buffer))
+                buffer.clear()
 
-        if not cls._crc_calculator.verify(decoded, actual_crc):
-            raise ValueError("The expected and actual CRC values do not match.")
+            buffer += frame
+
+        if buffer:
+            datagrams.append(bytes(buffer))
+
+        return datagrams
+
+    @classmethod
+    def decode(cls, data: bytes) -> Packet:
+        """Decode the provided serial data.
 
-        length = decoded.pop()
+        Args:
+            data: The encoded serial data to decode.
 
-        if len(decoded) + 2 != length:
-            raise ValueError(
-                "The specified payload size is not equal to the actual payload size."
-            )
+        Raises:
+            CrcError: Invalid CRC value
+            LengthError: The actual payload is not equal to the specified payload
+            FrameError: The provided data is empty
 
-        device_id = decoded.pop()
-        packet_id = decoded.pop()
+        Returns:
+            A packet with decoded serial data.
+        """
+        device_id, packet_id, decoded = decode_frame(data)
 
-        return Packet(DeviceID(device_id), PacketID(packet_id), bytes(decoded))
+        return Packet(device_id, packet_id, decoded)
@@ -0,0 +1,366 @@
+# Copyright (c) 2023 Evan Palmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Provides codecs for the data carried by each type of packet.
+
+Each ``PayloadCodec`` wraps a precompiled ``struct.Struct`` for the packet data, along
+with the scale factors needed to convert the values to SI units. The Bravo reports the
+linear jaws and the end effector position in millimeters, which are converted to
+meters.
+
+The batch decoding functions require NumPy, which is an optional dependency.
+
+Examples:
+    >>> decode_payload(packet)
+    (1.5707,)
+    >>> encode_payload(DeviceID.BEND_ELBOW, PacketID.POSITION, 1.5707)
+    Packet(Packet ID: PacketID.POSITION, Device ID: DeviceID.BEND_ELBOW, Data: ...)
+    >>> decode_batch(packets, PacketID.POSITION).shape
+    (7, 1)
+"""
+
+from __future__ import annotations
+
+import struct
+from types import ModuleType
+from typing import TYPE_CHECKING, Sequence
+
+from pybravo.protocol.device_id import DeviceID
+from pybravo.protocol.packet import Packet
+from pybravo.protocol.packet_id import PacketID
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Conversion factors from the units reported by the Bravo to SI units
+MM_TO_M = 0.001
+MA_TO_A = 0.001
+
+
+class PayloadCodec:
+    """Encodes and decodes the data of a single packet type."""
+
+    def __init__(
+        self,
+        fmt: str,
+        fields: Sequence[str],
+        scale: Sequence[float] | None = None,
+        device_scale: dict[DeviceID, float] | None = None,
+    ) -> None:
+        """Create a new payload codec.
+
+        Args:
+            fmt: The ``struct`` format of the packet data.
+            fields: The names of the values in the packet data.
+            scale: The factor used to convert each value to SI units. Defaults to no
+                conversion.
+            device_scale: An additional factor used to convert the values reported by
+                specific devices to SI units. Defaults to no conversion.
+        """
+        self.struct = struct.Struct(fmt)
+        self.fields = tuple(fields)
+
+        if len(self.fields) != len(self.struct.unpack(bytes(self.struct.size))):
+            raise ValueError("The number of fields must match the payload format.")
+
+        self.scale = tuple(scale) if scale is not None else (1.0,) * len(self.fields)
+
+        if len(self.scale) != len(self.fields):
+            raise ValueError("The number of scale factors must match the fields.")
+        self.device_scale = {
+            device.value: factor for device, factor in (device_scale or {}).items()
+        }
+
+        self._unscaled = scale is None and not self.device_scale
+        self._is_float = all(c == "f" or c.isdigit() for c in fmt.lstrip("<>=!@"))
+
+    @property
+    def size(self) -> int:
+        """Get the size of the packet data.
+
+        Returns:
+            The size of the packet data (bytes).
+        """
+        return self.struct.size
+
+    def _scales(self, device_id: int) -> tuple[float, ...]:
+        """Get the factors used to convert the values reported by a device.
+
+        Args:
+            device_id: The integer ID of the device.
+
+        Returns:
+            The conversion factor for each value.
+        """
+        factor = self.device_scale.get(device_id, 1.0)
+        return tuple(s * factor for s in self.scale)
+
+    def decode(self, packet: Packet, si_units: bool = True) -> tuple:
+        """Decode the data of a packet.
+
+        Args:
+            packet: The packet to decode.
+            si_units: Convert the values to SI units. Defaults to True.
+
+        Returns:
+            The values in the packet data.
+        """
+        values = self.struct.unpack(packet.data)
+
+        if not si_units or self._unscaled:
+            return values
+
+        # The scales are checked against the fields when the codec is created
+        scales = self._scales(packet.raw_device_id)
+
+        return tuple(v * s for v, s in zip(values, scales))  # noqa: B905
+
+    def encode(
+        self,
+        device_id: DeviceID | int,
+        packet_id: PacketID | int,
+        *values: float,
+        si_units: bool = True,
+    ) -> Packet:
+        """Create a packet with the provided values.
+
+        Args:
+            device_id: The device that the packet is targeting.
+            packet_id: The ID of the packet.
+            values: The values to encode.
+            si_units: The values are in SI units, and should be converted to the units
+                used by the Bravo. Defaults to True.
+
+        Raises:
+            ValueError: The number of values doesn't match the payload format.
+
+        Returns:
+            The encoded packet.
+        """
+        if len(values) != len(self.fields):
+            raise ValueError(
+                f"Expected {len(self.fields)} values, but {len(values)} were provided."
+            )
+
+        if si_units and not self._unscaled:
+            raw_id = device_id if isinstance(device_id, int) else device_id.value
+            scales = self._scales(raw_id)
+            values = tuple(v / s for v, s in zip(values, scales))  # noqa: B905
+
+        return Packet(device_id, packet_id, self.struct.pack(*values))
+
+    def decode_batch(
+        self, packets: Sequence[Packet], si_units: bool = True
+    ) -> np.ndarray:
+        """Decode the float data of many packets into a single array.
+
+        Args:
+            packets: The packets to decode. All packets must have the same type.
+            si_units: Convert the values to SI units. Defaults to True.
+
+        Raises:
+            ValueError: The payload doesn't consist only of floats.
+
+        Returns:
+            An array with one row per packet and one column per field.
+        """
+        np = _import_numpy()
+
+        if not self._is_float:
+            raise ValueError("Only payloads that consist of floats can be batched.")
+
+        raw = b"".join(packet.data for packet in packets)
+
+        if len(raw) != len(packets) * self.size:
+            raise ValueError("A packet in the batch has an unexpected size.")
+
+        values = (
+            np.frombuffer(raw, dtype="<f4")
+            .reshape(len(packets), len(self.fields))
+            .astype(np.float64)
+        )
+
+        if si_units and not self._unscaled:
+            values *= np.asarray(self.scale)
+
+            if self.device_scale:
+                factors = np.asarray(
+                    [self.device_scale.get(p.raw_device_id, 1.0) for p in packets]
+                )
+                values *= factors[:, np.newaxis]
+
+        return values
+
+
+def _import_numpy() -> ModuleType:
+    """Import NumPy, which is needed by the batch decoding functions.
+
+    Raises:
+        ImportError: NumPy is not installed.
+
+    Returns:
+        The NumPy module.
+    """
+    try:
+        import numpy
+    except ImportError as e:
+        raise ImportError(
+            "NumPy is required for batch decoding. Install it with"
+            " `python3 -m pip install pybravo[numpy]`."
+        ) from e
+
+    return numpy
+
+
+_FLOAT = ("value",)
+_JAWS_SCALE = {DeviceID.LINEAR_JAWS: MM_TO_M}
+_POSE = ("x", "y", "z", "rz", "ry", "rx")
+_POSE_SCALE = (MM_TO_M, MM_TO_M, MM_TO_M, 1.0, 1.0, 1.0)
+
+PAYLOAD_CODECS: dict[PacketID, PayloadCodec] = {
+    PacketID.MODE: PayloadCodec("<B", ("mode",)),
+    PacketID.POSITION: PayloadCodec("<f", _FLOAT, device_scale=_JAWS_SCALE),
+    PacketID.VELOCITY: PayloadCodec("<f", _FLOAT, device_scale=_JAWS_SCALE),
+    PacketID.CURRENT: PayloadCodec("<f", _FLOAT, scale=(MA_TO_A,)),
+    PacketID.RELATIVE_POSITION: PayloadCodec("<f", _FLOAT, device_scale=_JAWS_SCALE),
+    PacketID.INDEXED_POSITION: PayloadCodec("<f", _FLOAT, device_scale=_JAWS_SCALE),
+    PacketID.SERIAL_NUMBER: PayloadCodec("<f", _FLOAT),
+    PacketID.MODEL_NUMBER: PayloadCodec("<f", _FLOAT),
+    PacketID.TEMPERATURE: PayloadCodec("<f", _FLOAT),
+    PacketID.VOLTAGE: PayloadCodec("<f", _FLOAT),
+    PacketID.SOFTWARE_VERSION: PayloadCodec("<BBB", ("major", "minor", "patch")),
+    PacketID.HEARTBEAT_FREQUENCY: PayloadCodec("<B", ("frequency",)),
+    PacketID.KM_END_POS: PayloadCodec("<6f", _POSE, scale=_POSE_SCALE),
+    PacketID.KM_END_VEL: PayloadCodec("<6f", _POSE, scale=_POSE_SCALE),
+    PacketID.KM_END_VEL_LOCAL: PayloadCodec("<6f", _POSE, scale=_POSE_SCALE),
+    PacketID.POSITION_LIMITS: PayloadCodec(
+        "<ff", ("max", "min"), device_scale=_JAWS_SCALE
+    ),
+    PacketID.VELOCITY_LIMITS: PayloadCodec(
+        "<ff", ("max", "min"), device_scale=_JAWS_SCALE
+    ),
+    PacketID.CURRENT_LIMITS: PayloadCodec(
+        "<ff", ("max", "min"), scale=(MA_TO_A, MA_TO_A)
+    ),
+    PacketID.ATI_FT_READING: PayloadCodec("<6f", ("fx", "fy", "fz", "tx", "ty", "tz")),
+}
+
+for _box in (
+    PacketID.KM_BOX_OBSTACLE_02,
+    PacketID.KM_BOX_OBSTACLE_03,
+    PacketID.KM_BOX_OBSTACLE_04,
+    PacketID.KM_BOX_OBSTACLE_05,
+):
+    PAYLOAD_CODECS[_box] = PayloadCodec(
+        "<6f", ("x1", "y1", "z1", "x2", "y2", "z2"), scale=(MM_TO_M,) * 6
+    )
+
+for _cylinder in (
+    PacketID.KM_CYLINDER_OBSTACLE_02,
+    PacketID.KM_CYLINDER_OBSTACLE_03,
+    PacketID.KM_CYLINDER_OBSTACLE_04,
+    PacketID.KM_CYLINDER_OBSTACLE_05,
+):
+    PAYLOAD_CODECS[_cylinder] = PayloadCodec(
+        "<7f", ("x1", "y1", "z1", "x2", "y2", "z2", "radius"), scale=(MM_TO_M,) * 7
+    )
+
+
+def register_payload_codec(packet_id: PacketID, codec: PayloadCodec) -> None:
+    """Register the codec used for a packet type, replacing any existing codec.
+
+    Args:
+        packet_id: The ID of the packet that the codec handles.
+        codec: The codec to use for the packet.
+    """
+    PAYLOAD_CODECS[packet_id] = codec
+
+
+def get_payload_codec(packet_id: PacketID | int) -> PayloadCodec:
+    """Get the codec used for a packet type.
+
+    Args:
+        packet_id: The ID of the packet.
+
+    Raises:
+        KeyError: No codec has been registered for the packet type.
+
+    Returns:
+        The codec for the packet type.
+    """
+    try:
+        if isinstance(packet_id, int):
+            packet_id = PacketID(packet_id)
+
+        return PAYLOAD_CODECS[packet_id]
+    except (KeyError, ValueError):
+        raise KeyError(f"No payload codec is registered for {packet_id}.") from None
+
+
+def decode_payload(packet: Packet, si_units: bool = True) -> tuple:
+    """Decode the data of a packet using the codec registered for its type.
+
+    Args:
+        packet: The packet to decode.
+        si_units: Convert the values to SI units. Defaults to True.
+
+    Returns:
+        The values in the packet data.
+    """
+    return get_payload_codec(packet.packet_id).decode(packet, si_units)
+
+
+def encode_payload(
+    device_id: DeviceID | int,
+    packet_id: PacketID | int,
+    *values: float,
+    si_units: bool = True,
+) -> Packet:
+    """Create a packet using the codec registered for its type.
+
+    Args:
+        device_id: The device that the packet is targeting.
+        packet_id: The ID of the packet.
+        values: The values to encode.
+        si_units: The values are in SI units, and should be converted to the units used
+            by the Bravo. Defaults to True.
+
+    Returns:
+        The encoded packet.
+    """
+    return get_payload_codec(packet_id).encode(
+        device_id, packet_id, *values, si_units=si_units
+    )
+
+
+def decode_batch(
+    packets: Sequence[Packet], packet_id: PacketID, si_units: bool = True
+) -> np.ndarray:
+    """Decode the float data of many packets of the same type into a single array.
+
+    Args:
+        packets: The packets to decode.
+        packet_id: The ID of the packets.
+        si_units: Convert the values to SI units. Defaults to True.
+
+    Returns:
+        An array with one row per packet and one column per field.
+    """
+    return get_payload_codec(packet_id).decode_batch(packets, si_units)
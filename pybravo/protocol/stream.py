@@ -0,0 +1,213 @@
+# Copyright (c) 2023 Evan Palmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+r"""Provides an incremental decoder for streams of serial packets.
+
+A single read from the Bravo may contain several frames, or only part of a frame. The
+``PacketStreamDecoder`` splits the incoming data on the ``0x00`` frame delimiter and
+carries any partial frame over to the next call.
+
+Examples:
+    >>> decoder = PacketStreamDecoder()
+    >>> decoder.feed(b"\x06\x03`\x01")
+    []
+    >>> packets = decoder.feed(b"\x05R\x00\x06\x03`\x01\x05R\x00")
+    >>> len(packets)
+    2
+"""
+
+from __future__ import annotations
+
+from typing import Callable
+
+from pybravo.protocol.codec import LengthError, decode_frame_into
+from pybravo.protocol.packet import Packet
+
+
+class PacketStreamDecoder:
+    """Incrementally decodes packets from arbitrary chunks of serial data."""
+
+    def __init__(
+        self,
+        on_error: Callable[[bytes, Exception], None] | None = None,
+        max_frame_size: int = 512,
+    ) -> None:
+        """Create a new stream decoder.
+
+        Args:
+            on_error: An optional function to call with the raw frame and the raised
+                exception when a frame fails to decode. Defaults to None.
+            max_frame_size: The maximum number of bytes to buffer while waiting for a
+                frame delimiter. Partial frames that exceed this size are discarded.
+                Defaults to 512.
+        """
+        self.on_error = on_error
+        self.max_frame_size = max_frame_size
+        self._buffer = bytearray()
+
+    @property
+    def pending(self) -> int:
+        """Get the number of buffered bytes that belong to an incomplete frame.
+
+        Returns:
+            The number of buffered bytes.
+        """
+        return len(self._buffer)
+
+    def reset(self) -> None:
+        """Discard any partially received frame."""
+        self._buffer.clear()
+
+    def feed(self, data: bytes | bytearray | memoryview) -> list[Packet]:
+        """Add data to the stream and decode all completed frames.
+
+        Frames that fail to decode are skipped and reported to the ``on_error``
+        handler so that a single corrupted frame doesn't discard the rest of the data.
+
+        Args:
+            data: The next chunk of serial data.
+
+        Returns:
+            The packets decoded from all frames completed by the new data.
+        """
+        buffer = self._buffer
+        buffer += data
+        packets = []
+        start = 0
+
+        while True:
+            end = buffer.find(0, start)
+
+            if end < 0:
+                break
+
+            # Consecutive delimiters produce empty frames, which are ignored
+            if end > start:
+                self._decode(bytes(buffer[start:end]), packets)
+
+            start = end + 1
+
+        del buffer[:start]
+
+        if len(buffer) > self.max_frame_size:
+            frame = bytes(buffer)
+            buffer.clear()
+            self._report(frame, LengthError("The frame exceeded the maximum size."))
+
+        return packets
+
+    def _decode(self, frame: bytes, packets: list[Packet]) -> None:
+        """Decode a single frame and add it to the list of decoded packets.
+
+        Args:
+            frame: The frame to decode, without the trailing delimiter.
+            packets: The list of decoded packets.
+        """
+        try:
+            packets.append(Packet.decode(frame))
+        except Exception as e:
+            self._report(frame, e)
+
+    def _report(self, frame: bytes, error: Exception) -> None:
+        """Report a frame that could not be decoded.
+
+        Args:
+            frame: The invalid frame.
+            error: The exception raised while decoding the frame.
+        """
+        if self.on_error is not None:
+            self.on_error(frame, error)
+
+
+class ReceiveRing:
+    """A fixed ring of preallocated receive buffers.
+
+    Packets decoded by ``decode_in_place`` reference the buffer that they were received
+    into, so each buffer is only reused after all of the other buffers in the ring have
+    been filled. Consumers that need to keep the packet data for longer than that must
+    copy it.
+    """
+
+    def __init__(self, slots: int = 64, size: int = 4096) -> None:
+        """Create a new ring of receive buffers.
+
+        Args:
+            slots: The number of buffers in the ring. Defaults to 64.
+            size: The size of each buffer (bytes). Defaults to 4096.
+        """
+        if slots < 1:
+            raise ValueError("The ring must contain at least one buffer.")
+
+        self._buffers = [bytearray(size) for _ in range(slots)]
+        self._views = [memoryview(buffer) for buffer in self._buffers]
+        self._index = 0
+
+    def next(self) -> tuple[bytearray, memoryview]:
+        """Get the next buffer in the ring.
+
+        Returns:
+            The next buffer and a view of it.
+        """
+        self._index = (self._index + 1) % len(self._buffers)
+        return self._buffers[self._index], self._views[self._index]
+
+
+def decode_in_place(
+    buffer: bytearray,
+    view: memoryview,
+    length: int,
+    on_error: Callable[[bytes, Exception], None] | None = None,
+) -> list[Packet]:
+    """Decode all frames in a received buffer without copying the packet data.
+
+    The buffer is treated as a complete datagram, so any data following the final
+    delimiter is decoded as a frame. The data of each packet is a view into the buffer.
+
+    Args:
+        buffer: The buffer that holds the received data.
+        view: A view of the buffer.
+        length: The number of bytes received into the buffer.
+        on_error: An optional function to call with a copy of the frame and the raised
+            exception when a frame fails to decode. The frame may have already been
+            partially decoded in place. Defaults to None.
+
+    Returns:
+        The decoded packets.
+    """
+    packets = []
+    start = 0
+
+    while start < length:
+        end = buffer.find(0, start, length)
+
+        if end < 0:
+            end = length
+
+        if end > start:
+            try:
+                device_id, packet_id, data = decode_frame_into(view, start, end)
+                packets.append(Packet(device_id, packet_id, data))
+            except Exception as e:
+                if on_error is not None:
+                    on_error(bytes(view[start:end]), e)
+
+        start = end + 1
+
+    return packets
@@ -0,0 +1,70 @@
+# Copyright (c) 2023 Evan Palmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Runs the Bravo 7 simulator from the command line.
+
+Examples:
+    $ python3 -m pybravo.simulator --port 6789 --loss 0.01 --seed 0
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+
+from pybravo.simulator import BravoSimulator, Impairments
+
+
+def main() -> None:
+    """Run the simulator until it is interrupted."""
+    parser = argparse.ArgumentParser(description="Simulate a Reach Bravo 7 over UDP.")
+    parser.add_argument("--host", default="127.0.0.1", help="The address to bind.")
+    parser.add_argument("--port", type=int, default=6789, help="The port to bind.")
+    parser.add_argument("--loss", type=float, default=0.0)
+    parser.add_argument("--reorder", type=float, default=0.0)
+    parser.add_argument("--delay", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--corruption", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    simulator = BravoSimulator(
+        args.host,
+        args.port,
+        Impairments(args.loss, args.reorder, args.delay, args.jitter, args.corruption),
+        args.seed,
+    )
+
+    logging.getLogger("BravoSimulator").info(
+        f"Simulating a Reach Bravo 7 on {simulator.address}."
+    )
+
+    try:
+        simulator.serve_forever()
+    except KeyboardInterrupt:
+        ...
+    finally:
+        simulator.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,503 @@
+# Copyright (c) 2023 Evan Palmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Simulates a Reach Bravo 7 manipulator over UDP.
+
+The ``BravoSimulator`` speaks the same serial protocol as the Bravo 7, so that the
+drivers can be tested and benchmarked without the physical arm. It replies to
+``REQUEST`` packets for every device, streams the packets configured using
+``HEARTBEAT_SET`` and ``HEARTBEAT_FREQUENCY``, and integrates ``POSITION`` and
+``VELOCITY`` commands into a simple kinematic model of each joint.
+
+Network impairments (loss, reordering, delay, and corruption) can be injected into the
+datagrams sent by the simulator. The impairments are drawn from a seeded random number
+generator, so that test runs are reproducible.
+
+Examples:
+    >>> simulator = BravoSimulator(impairments=Impairments(loss=0.01), seed=0)
+    >>> simulator.start()
+    >>> bravo = BravoDriver()
+    >>> bravo.connect(*simulator.address)
+    >>> bravo.request(DeviceID.BEND_ELBOW, PacketID.POSITION)
+    Packet(Packet ID: PacketID.POSITION, Device ID: DeviceID.BEND_ELBOW, Data: ...)
+"""
+
+from __future__ import annotations
+
+import heapq
+import logging
+import random
+import select
+import socket
+import threading
+import time
+from typing import NamedTuple
+
+from pybravo.protocol import DeviceID, Packet, PacketID, PacketStreamDecoder
+from pybravo.protocol.payload import PAYLOAD_CODECS
+
+# The joints of the Bravo 7, which are simulated by default
+JOINTS = tuple(d for d in DeviceID if 0 < d.value < DeviceID.FORCE_TORQUE_SENSOR.value)
+
+# The maximum amount of time (s) that the simulator blocks while waiting for data
+POLL_TIMEOUT = 0.1
+
+# The maximum amount of time (s) that a reordered datagram is held back when no other
+# datagram is sent to overtake it
+MAX_REORDER_HOLD = 0.05
+
+# The operating modes reported by the simulated joints
+MODE_STANDBY = 0x00
+MODE_POSITION = 0x02
+MODE_VELOCITY = 0x03
+
+
+class Impairments(NamedTuple):
+    """The network impairments applied to the datagrams sent by the simulator."""
+
+    # The probability that a datagram is dropped
+    loss: float = 0.0
+
+    # The probability that a datagram is held back and sent after the next datagram, or
+    # after ``MAX_REORDER_HOLD`` if no other datagram is sent
+    reorder: float = 0.0
+
+    # The fixed delay (s) added to each datagram
+    delay: float = 0.0
+
+    # The maximum random delay (s) added to each datagram on top of the fixed delay
+    jitter: float = 0.0
+
+    # The probability that a byte of a datagram is corrupted
+    corruption: float = 0.0
+
+
+class _Joint:
+    """A simple kinematic model of a single joint."""
+
+    __slots__ = ("mode", "position", "velocity", "target", "max_velocity", "stamp")
+
+    def __init__(self, max_velocity: float) -> None:
+        """Create a new joint at rest.
+
+        Args:
+            max_velocity: The maximum speed of the joint (rad/s or m/s).
+        """
+        self.mode = MODE_STANDBY
+        self.position = 0.0
+        self.velocity = 0.0
+        self.target = 0.0
+        self.max_velocity = max_velocity
+        self.stamp = time.monotonic()
+
+    def advance(self, now: float) -> None:
+        """Integrate the motion of the joint up to the current time.
+
+        Args:
+            now: The current monotonic time (s).
+        """
+        dt = now - self.stamp
+        self.stamp = now
+
+        if dt <= 0:
+            return
+
+        if self.mode == MODE_VELOCITY:
+            self.position += self.velocity * dt
+        elif self.mode == MODE_POSITION:
+            error = self.target - self.position
+            limit = self.max_velocity * dt
+            step = min(max(error, -limit), limit)
+            self.position += step
+            self.velocity = step / dt if abs(step) < abs(error) else 0.0
+
+
+class BravoSimulator:
+    """A local UDP server that behaves like the Bravo 7."""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        impairments: Impairments | None = None,
+        seed: int | None = None,
+        max_velocity: float = 1.0,
+    ) -> None:
+        """Create a new simulator.
+
+        Args:
+            host: The address to listen on. Defaults to "127.0.0.1".
+            port: The port to listen on. Defaults to an unused port.
+            impairments: The network impairments to inject into the sent datagrams.
+                Defaults to no impairments.
+            seed: The seed used to generate the impairments. Defaults to a random
+                seed.
+            max_velocity: The maximum speed of each joint (rad/s or m/s) when moving to
+                a commanded position. Defaults to 1.0.
+        """
+        self.impairments = impairments if impairments is not None else Impairments()
+        self.joints = {joint.value: _Joint(max_velocity) for joint in JOINTS}
+
+        # The number of packets received, and datagrams sent, dropped, corrupted, and
+        # reordered by the simulator
+        self.received = 0
+        self.malformed = 0
+        self.sent = 0
+        self.dropped = 0
+        self.corrupted = 0
+        self.reordered = 0
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.setblocking(False)
+
+        # Replies and heartbeats are sent to the client that most recently sent a packet
+        self.client: tuple[str, int] | None = None
+
+        # The heartbeat configuration of each device: the packets to stream, the rate
+        # (Hz), and the time at which the next packets are due
+        self._heartbeats: dict[int, tuple[list[int], int, float]] = {}
+
+        # Datagrams waiting to be sent, ordered by the time at which they are due
+        self._outbox: list[tuple[float, int, bytes]] = []
+        self._sequence = 0
+
+        # The datagram held back to be reordered, and the time at which it is sent if
+        # no other datagram overtakes it
+        self._held: tuple[float, bytes] | None = None
+
+        self._rng = random.Random(seed)
+        self._decoder = PacketStreamDecoder()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+        self._logger = logging.getLogger("BravoSimulator")
+
+    def __enter__(self) -> BravoSimulator:
+        """Start the simulator.
+
+        Returns:
+            The simulator.
+        """
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Stop the simulator."""
+        self.stop()
+
+    @property
+    def address(self) -> tuple[str, int]:
+        """Get the address that the simulator is listening on.
+
+        Returns:
+            The IP address and port of the simulator.
+        """
+        return self.sock.getsockname()
+
+    def start(self) -> None:
+        """Start serving clients on a background thread."""
+        if self._thread is not None:
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self.serve_forever, name="BravoSimulator", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop serving clients and close the socket."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+        self.sock.close()
+
+    def serve_forever(self) -> None:
+        """Serve clients on the current thread until the simulator is stopped."""
+        while not self._stop.is_set():
+            timeout = self._next_deadline() - time.monotonic()
+            readable, _, _ = select.select(
+                [self.sock], [], [], min(max(timeout, 0.0), POLL_TIMEOUT)
+            )
+
+            if readable:
+                self._receive()
+
+            now = time.monotonic()
+            self._stream(now)
+            self._flush(now)
+
+    def _next_deadline(self) -> float:
+        """Get the time at which the next heartbeat or delayed datagram is due.
+
+        Returns:
+            The monotonic time (s) of the next event.
+        """
+        deadline = time.monotonic() + POLL_TIMEOUT
+
+        for _, _, due in self._heartbeats.values():
+            deadline = min(deadline, due)
+
+        if self._outbox:
+            deadline = min(deadline, self._outbox[0][0])
+
+        if self._held is not None:
+            deadline = min(deadline, self._held[0])
+
+        return deadline
+
+    def _receive(self) -> None:
+        """Read and handle every datagram waiting on the socket."""
+        while True:
+            try:
+                data, address = self.sock.recvfrom(4096)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                self._logger.debug(f"Failed to receive a datagram: {e}")
+                return
+
+            self.client = address
+            replies: list[Packet] = []
+
+            for packet in self._decoder.feed(data):
+                self.received += 1
+
+                # A malformed packet from one client shouldn't stop the simulator
+                try:
+                    replies.extend(self._handle(packet))
+                except Exception as e:
+                    self.malformed += 1
+                    self._logger.warning(f"Failed to handle the packet {packet}: {e}")
+
+            # The Bravo batches the replies to a request into a single datagram
+            for datagram in Packet.encode_many(replies):
+                self._send(datagram)
+
+    def _handle(self, packet: Packet) -> list[Packet]:
+        """Apply a packet received from a client.
+
+        Args:
+            packet: The received packet.
+
+        Returns:
+            The replies to send to the client.
+        """
+        devices = self._devices(packet.raw_device_id)
+        packet_id = packet.raw_packet_id
+        now = time.monotonic()
+
+        if packet_id == PacketID.REQUEST.value:
+            return [
+                reply
+                for device in devices
+                for requested in bytes(packet.data)
+                if (reply := self._report(device, requested, now)) is not None
+            ]
+
+        if packet_id == PacketID.HEARTBEAT_SET.value:
+            ids = [p for p in bytes(packet.data) if p != 0]
+
+            for device in devices:
+                _, frequency, _ = self._heartbeats.get(device, ([], 0, now))
+                self._heartbeats[device] = (ids, frequency, now)
+
+        elif packet_id == PacketID.HEARTBEAT_FREQUENCY.value and packet.data:
+            for device in devices:
+                ids, _, _ = self._heartbeats.get(device, ([], 0, now))
+                self._heartbeats[device] = (ids, packet.data[0], now)
+
+        elif packet_id in (PacketID.POSITION.value, PacketID.VELOCITY.value):
+            (value,) = PAYLOAD_CODECS[PacketID(packet_id)].decode(packet)
+
+            for device in devices:
+                joint = self.joints[device]
+                joint.advance(now)
+
+                if packet_id == PacketID.POSITION.value:
+                    joint.mode = MODE_POSITION
+                    joint.target = value
+                else:
+                    joint.mode = MODE_VELOCITY
+                    joint.velocity = value
+
+        elif packet_id == PacketID.MODE.value and packet.data:
+            for device in devices:
+                self.joints[device].advance(now)
+                self.joints[device].mode = packet.data[0]
+
+                if packet.data[0] == MODE_STANDBY:
+                    self.joints[device].velocity = 0.0
+
+        return []
+
+    def _devices(self, device_id: int) -> list[int]:
+        """Get the simulated devices targeted by a packet.
+
+        Args:
+            device_id: The device ID of the packet.
+
+        Returns:
+            The IDs of the targeted joints.
+        """
+        if device_id == DeviceID.ALL_JOINTS.value:
+            return list(self.joints)
+
+        return [device_id] if device_id in self.joints else []
+
+    def _report(self, device: int, packet_id: int, now: float) -> Packet | None:
+        """Create a packet reporting the state of a joint.
+
+        Args:
+            device: The ID of the joint.
+            packet_id: The type of packet to report.
+            now: The current monotonic time (s).
+
+        Returns:
+            The report, or None if the packet type isn't simulated.
+        """
+        joint = self.joints[device]
+        joint.advance(now)
+
+        values = {
+            PacketID.MODE.value: (joint.mode,),
+            PacketID.POSITION.value: (joint.position,),
+            PacketID.VELOCITY.value: (joint.velocity,),
+            PacketID.CURRENT.value: (abs(joint.velocity) * 0.5,),
+            PacketID.TEMPERATURE.value: (25.0,),
+            PacketID.VOLTAGE.value: (24.0,),
+            PacketID.SERIAL_NUMBER.value: (float(device),),
+            PacketID.MODEL_NUMBER.value: (7.0,),
+            PacketID.SOFTWARE_VERSION.value: (1, 0, 0),
+        }.get(packet_id)
+
+        if values is None:
+            return None
+
+        codec = PAYLOAD_CODECS[PacketID(packet_id)]
+
+        return codec.encode(DeviceID(device), PacketID(packet_id), *values)
+
+    def _stream(self, now: float) -> None:
+        """Send the heartbeat packets that are due.
+
+        Args:
+            now: The current monotonic time (s).
+        """
+        packets: list[Packet] = []
+
+        for device, (ids, frequency, due) in self._heartbeats.items():
+            if frequency == 0 or not ids or now < due:
+                continue
+
+            for packet_id in ids:
+                report = self._report(device, packet_id, now)
+
+                if report is not None:
+                    packets.append(report)
+
+            # Schedule the next heartbeat from the previous deadline to avoid drift,
+            # unless the simulator has fallen more than a period behind
+            period = 1.0 / frequency
+            next_due = due + period if due + period > now else now + period
+            self._heartbeats[device] = (ids, frequency, next_due)
+
+        if packets:
+            for datagram in Packet.encode_many(packets):
+                self._send(datagram)
+
+    def _send(self, datagram: bytes) -> None:
+        """Apply the impairments to a datagram and queue it to be sent.
+
+        Args:
+            datagram: The datagram to send.
+        """
+        impairments = self.impairments
+        rng = self._rng
+
+        if impairments.loss and rng.random() < impairments.loss:
+            self.dropped += 1
+            return
+
+        if impairments.corruption and rng.random() < impairments.corruption:
+            corrupted = bytearray(datagram)
+            corrupted[rng.randrange(len(corrupted))] ^= rng.randrange(1, 256)
+            datagram = bytes(corrupted)
+            self.corrupted += 1
+
+        if (
+            impairments.reorder
+            and self._held is None
+            and rng.random() < impairments.reorder
+        ):
+            due = time.monotonic() + impairments.delay + MAX_REORDER_HOLD
+            self._held = (due, datagram)
+            self.reordered += 1
+            return
+
+        due = time.monotonic() + impairments.delay
+
+        if impairments.jitter:
+            due += rng.uniform(0.0, impairments.jitter)
+
+        self._enqueue(due, datagram)
+
+        # Release the held datagram right after the one that overtook it
+        if self._held is not None:
+            self._enqueue(due, self._held[1])
+            self._held = None
+
+        self._flush(time.monotonic())
+
+    def _enqueue(self, due: float, datagram: bytes) -> None:
+        """Queue a datagram to be sent at a given time.
+
+        Args:
+            due: The monotonic time (s) at which to send the datagram.
+            datagram: The datagram to send.
+        """
+        heapq.heappush(self._outbox, (due, self._sequence, datagram))
+        self._sequence += 1
+
+    def _flush(self, now: float) -> None:
+        """Send the queued datagrams that are due.
+
+        Args:
+            now: The current monotonic time (s).
+        """
+        # Release a held datagram that wasn't overtaken before its deadline
+        if self._held is not None and self._held[0] <= now:
+            self._enqueue(self._held[0], self._held[1])
+            self._held = None
+
+        while self._outbox and self._outbox[0][0] <= now:
+            _, _, datagram = heapq.heappop(self._outbox)
+
+            if self.client is None:
+                continue
+
+            try:
+                self.sock.sendto(datagram, self.client)
+                self.sent += 1
+            except OSError as e:
+                self._logger.debug(f"Failed to send a datagram: {e}")
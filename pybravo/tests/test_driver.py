@@ -0,0 +1,504 @@
+# Copyright (c) 2023 Evan Palmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+import pytest  # noqa
+
+import pybravo.driver
+from pybravo import AsyncBravoDriver, BravoDriver, DeviceID, Packet, PacketID  # noqa
+from pybravo.driver import (
+    BackpressurePolicy,
+    CommandScheduler,
+    DriverMetrics,
+    HeartbeatManager,
+    JointStateCache,
+    ThreadPoolDispatcher,
+)
+from pybravo.protocol import PacketStreamDecoder
+
+
+class FakeBravo(asyncio.DatagramProtocol):
+    """Replies to position requests with the ID of the device as its position."""
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        """Save the transport used to reply to requests."""
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr: tuple[str, int]) -> None:
+        """Reply to a request packet."""
+        request = Packet.decode(data)
+        reply = Packet(
+            request.device_id,
+            PacketID.POSITION,
+            struct.pack("<f", request.device_id.value),
+        )
+        self.transport.sendto(reply.encode(), addr)  # type: ignore
+
+
+def test_async_request_reply() -> None:
+    """Test that concurrent requests are resolved by the matching replies."""
+
+    async def run() -> list[Packet]:
+        loop = asyncio.get_running_loop()
+        server, _ = await loop.create_datagram_endpoint(
+            FakeBravo, local_addr=("127.0.0.1", 0)
+        )
+        port = server.get_extra_info("sockname")[1]
+
+        received = []
+        bravo = AsyncBravoDriver()
+        bravo.attach_callback(PacketID.POSITION, received.append)
+        await bravo.connect("127.0.0.1", port)
+
+        replies = await asyncio.gather(
+            bravo.request(DeviceID.BEND_ELBOW, PacketID.POSITION),
+            bravo.request(DeviceID.ROTATE_BASE, PacketID.POSITION),
+        )
+
+        bravo.disconnect()
+        server.close()
+
+        assert len(received) == len(replies)
+
+        return replies
+
+    elbow, base = asyncio.run(run())
+
+    assert elbow.device_id == DeviceID.BEND_ELBOW
+    assert struct.unpack("<f", elbow.data)[0] == DeviceID.BEND_ELBOW.value
+    assert base.device_id == DeviceID.ROTATE_BASE
+
+
+def test_async_coroutine_callbacks(caplog: pytest.LogCaptureFixture) -> None:
+    """Test that coroutine callbacks run to completion and their errors are logged."""
+    finished = []
+
+    async def on_position(packet: Packet) -> None:
+        await asyncio.sleep(0)
+        finished.append(packet)
+
+    async def on_failure(packet: Packet) -> None:
+        await asyncio.sleep(0)
+        raise RuntimeError("callback failed")
+
+    async def run() -> None:
+        bravo = AsyncBravoDriver()
+        bravo.attach_callback(PacketID.POSITION, on_position)
+        bravo.attach_callback(PacketID.POSITION, on_failure)
+
+        bravo._dispatch(Packet(DeviceID.BEND_ELBOW, PacketID.POSITION, b""))
+        assert len(bravo._callback_tasks) == 2  # noqa: PLR2004
+
+        await asyncio.sleep(0.01)
+        assert not bravo._callback_tasks
+
+    with caplog.at_level(logging.WARNING, logger="AsyncBravoDriver"):
+        asyncio.run(run())
+
+    assert len(finished) == 1
+    assert "callback failed" in caplog.text
+
+
+def test_async_request_timeout() -> None:
+    """Test that requests without a reply time out."""
+
+    async def run() -> None:
+        bravo = AsyncBravoDriver()
+        await bravo.connect("127.0.0.1", 9)
+
+        with pytest.raises(asyncio.TimeoutError):
+            await bravo.request(DeviceID.BEND_ELBOW, PacketID.POSITION, timeout=0.05)
+
+        bravo.disconnect()
+
+    asyncio.run(run())
+
+
+def test_request_shares_reply() -> None:
+    """Test that pipelined requests for the same packet share one request and reply."""
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(("127.0.0.1", 0))
+    requests = []
+    ready = threading.Event()
+
+    def reply() -> None:
+        data, addr = server.recvfrom(256)
+        requests.append(data)
+
+        # Don't reply until both requests are pending
+        ready.wait(1.0)
+        server.sendto(
+            Packet(DeviceID.BEND_ELBOW, PacketID.POSITION, b"\x00" * 4).encode(), addr
+        )
+
+    thread = threading.Thread(target=reply, daemon=True)
+    thread.start()
+
+    bravo = BravoDriver()
+    bravo.connect("127.0.0.1", server.getsockname()[1])
+
+    first = bravo.request_future(DeviceID.BEND_ELBOW, PacketID.POSITION)
+    second = bravo.request_future(DeviceID.BEND_ELBOW, PacketID.POSITION)
+    ready.set()
+
+    assert first.result(1.0) is second.result(1.0)
+    assert len(requests) == 1
+
+    with pytest.raises(TimeoutError):
+        bravo.request(DeviceID.ROTATE_BASE, PacketID.POSITION, timeout=0.05)
+
+    bravo.disconnect()
+    server.close()
+
+
+def test_thread_pool_dispatcher_backpressure() -> None:
+    """Test that a full dispatch queue applies the backpressure policy."""
+    packets = [Packet(DeviceID(i), PacketID.POSITION, b"") for i in range(1, 8)]
+    handled = []
+    release = threading.Event()
+
+    def slow_callback(packet: Packet) -> None:
+        release.wait(1.0)
+        handled.append(packet.device_id)
+
+    dispatcher = ThreadPoolDispatcher(
+        queue_size=2, policy=BackpressurePolicy.DROP_OLDEST
+    )
+    dispatcher.start()
+
+    # The first packet is taken by the worker, which blocks until it is released
+    dispatcher.dispatch([slow_callback], packets[0])
+    while dispatcher.backlog > 0:
+        ...
+
+    for packet in packets[1:]:
+        dispatcher.dispatch([slow_callback], packet)
+
+    release.set()
+    dispatcher.stop()
+
+    # Only the newest packets should have been kept in the queue
+    assert handled == [
+        DeviceID.LINEAR_JAWS,
+        DeviceID.BEND_SHOULDER,
+        DeviceID.ROTATE_BASE,
+    ]
+    assert dispatcher.dropped == len(packets) - len(handled)
+    assert dispatcher.callback_stats[slow_callback].count == len(handled)
+
+
+def test_thread_pool_dispatcher_stop_from_worker() -> None:
+    """Test that a worker can stop the dispatcher while the queue is full."""
+    packet = Packet(DeviceID.BEND_ELBOW, PacketID.POSITION, b"")
+    stopped = threading.Event()
+    dispatcher = ThreadPoolDispatcher(queue_size=1)
+
+    def noop(packet: Packet) -> None:
+        """Receive the packets queued behind the stopping callback."""
+
+    def stop(packet: Packet) -> None:
+        dispatcher.dispatch([noop], packet)
+        assert dispatcher.backlog == 1
+        dispatcher.stop()
+        stopped.set()
+
+    dispatcher.start()
+    (worker,) = dispatcher._threads
+    dispatcher.dispatch([stop], packet)
+
+    assert stopped.wait(1.0)
+    worker.join(1.0)
+    assert not worker.is_alive()
+    assert dispatcher.backlog == 0
+
+
+def test_disconnect_from_worker_callback() -> None:
+    """Test that a callback on a dispatcher worker can disconnect the driver."""
+    peer = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    peer.bind(("127.0.0.1", 0))
+    peer.settimeout(1.0)
+
+    dispatcher = ThreadPoolDispatcher()
+    bravo = BravoDriver(dispatcher=dispatcher)
+    disconnected = threading.Event()
+
+    def on_position(packet: Packet) -> None:
+        bravo.disconnect()
+        disconnected.set()
+
+    bravo.attach_callback(PacketID.POSITION, on_position)
+    bravo.connect(*peer.getsockname())
+    bravo.send(Packet(DeviceID.BEND_ELBOW, PacketID.MODE, b"\x00"))
+    _, address = peer.recvfrom(256)
+
+    position = Packet(DeviceID.BEND_ELBOW, PacketID.POSITION, struct.pack("<f", 1.0))
+    peer.sendto(position.encode(), address)
+
+    assert disconnected.wait(1.0)
+    assert bravo.transport is None
+    assert not dispatcher._threads
+
+    peer.close()
+
+
+def test_joint_state_cache() -> None:
+    """Test that the joint state cache stores the latest state of each joint."""
+    cache = JointStateCache()
+
+    assert math.isnan(cache.get(DeviceID.BEND_ELBOW).position)
+    assert cache.age(DeviceID.BEND_ELBOW) == math.inf
+
+    assert cache.update(
+        Packet(DeviceID.BEND_ELBOW, PacketID.POSITION, struct.pack("<f", 1.5))
+    )
+    assert cache.update(
+        Packet(DeviceID.LINEAR_JAWS, PacketID.POSITION, struct.pack("<f", 20.0))
+    )
+    assert cache.update(
+        Packet(DeviceID.BEND_ELBOW, PacketID.VELOCITY, struct.pack("<f", 0.25))
+    )
+    assert not cache.update(Packet(DeviceID.BEND_ELBOW, PacketID.MODE, b"\x00"))
+
+    state = cache.get(DeviceID.BEND_ELBOW)
+    assert state.position == pytest.approx(1.5)
+    assert state.velocity == pytest.approx(0.25)
+    assert math.isnan(state.current)
+    assert cache.age(DeviceID.BEND_ELBOW, PacketID.VELOCITY) < 1.0
+
+    # The jaw position is converted from mm to m
+    assert cache.positions()[0] == pytest.approx(0.02)
+    assert cache.sequence == 3  # noqa: PLR2004
+
+
+def test_heartbeat_resubscribe() -> None:
+    """Test that replacing a subscription detaches the dropped packets."""
+    bravo = BravoDriver()
+    heartbeat = HeartbeatManager(bravo)
+
+    heartbeat.subscribe([PacketID.POSITION, PacketID.VELOCITY], frequency=10)
+    heartbeat.subscribe([PacketID.POSITION], frequency=10)
+
+    assert len(bravo.callbacks) == 1
+    assert bravo.callbacks.route(
+        Packet(DeviceID.BEND_ELBOW, PacketID.POSITION, b"")
+    ) == (heartbeat._on_packet,)
+
+    heartbeat.unsubscribe()
+    assert len(bravo.callbacks) == 0
+
+
+def test_heartbeat_tracks_each_joint() -> None:
+    """Test that one stalled joint makes a packet stale until it is received again."""
+    heartbeat = HeartbeatManager(BravoDriver(), fallback_timeout=0.05)
+    heartbeat.subscribe([PacketID.POSITION], frequency=10)
+    time.sleep(0.1)
+
+    for device_id in range(DeviceID.LINEAR_JAWS.value, DeviceID.ROTATE_BASE.value):
+        heartbeat._on_packet(Packet(device_id, PacketID.POSITION, b""))
+
+    assert heartbeat._stale(time.monotonic()) == [PacketID.POSITION]
+
+    # A fresh heartbeat from the stalled joint stops the fallback to polling
+    heartbeat.polled.add(PacketID.POSITION)
+    heartbeat._on_packet(Packet(DeviceID.ROTATE_BASE, PacketID.POSITION, b""))
+
+    assert heartbeat.polled == set()
+    assert heartbeat._stale(time.monotonic()) == []
+
+
+def test_heartbeat_fallback_to_polling() -> None:
+    """Test that the heartbeat is configured and polled when it stops arriving."""
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(("127.0.0.1", 0))
+    server.settimeout(1.0)
+
+    bravo = BravoDriver()
+    heartbeat = HeartbeatManager(bravo, fallback_timeout=0.05)
+    heartbeat.subscribe([PacketID.POSITION, PacketID.VELOCITY], frequency=50)
+    bravo.connect("127.0.0.1", server.getsockname()[1])
+
+    decoder = PacketStreamDecoder()
+    data, _ = server.recvfrom(256)
+    heartbeat_set, frequency = decoder.feed(data)
+
+    assert heartbeat_set.packet_id == PacketID.HEARTBEAT_SET
+    assert heartbeat_set.data[:2] == bytes([0x03, 0x02])
+    assert frequency.data == bytes([50])
+
+    # The Bravo never streams the packets, so the manager should start polling them
+    heartbeat.start()
+    (request,) = decoder.feed(server.recvfrom(256)[0])
+    heartbeat.stop()
+
+    assert request.packet_id == PacketID.REQUEST
+    assert request.data == bytes([0x02, 0x03])
+    assert heartbeat.polled == {PacketID.POSITION, PacketID.VELOCITY}
+
+    bravo.disconnect()
+    server.close()
+
+
+def test_command_scheduler_coalesces_commands() -> None:
+    """Test that only the latest command for each device is sent each tick."""
+    sent: list[list[Packet]] = []
+    flushed = threading.Event()
+
+    class FakeDriver:
+        def send_many(self, packets: list[Packet]) -> None:
+            sent.append(list(packets))
+            flushed.set()
+
+    scheduler = CommandScheduler(FakeDriver(), rate=200.0)  # type: ignore
+
+    for position in (b"\x01", b"\x02", b"\x03"):
+        scheduler.submit(Packet(DeviceID.BEND_ELBOW, PacketID.POSITION, position))
+
+    scheduler.submit(Packet(DeviceID.ROTATE_BASE, PacketID.POSITION, b"\x04"))
+
+    scheduler.start()
+    flushed.wait(1.0)
+    scheduler.stop()
+
+    assert [(p.device_id, p.data) for p in sent[0]] == [
+        (DeviceID.BEND_ELBOW, b"\x03"),
+        (DeviceID.ROTATE_BASE, b"\x04"),
+    ]
+    assert scheduler.jitter.snapshot()["count"] > 0
+
+
+def test_command_scheduler_skips_missed_ticks() -> None:
+    """Test that a stalled job doesn't make the scheduler run missed ticks late."""
+    calls: list[tuple[float, float]] = []
+    done = threading.Event()
+
+    scheduler = CommandScheduler(None, rate=10.0)  # type: ignore
+
+    def stall() -> None:
+        start = time.monotonic()
+
+        # Overrun the tick by half a period so that the next deadline is missed too
+        if not calls:
+            time.sleep(1.5 * scheduler.period)
+
+        calls.append((start, time.monotonic()))
+
+        if len(calls) == 2:  # noqa: PLR2004
+            done.set()
+
+    scheduler.add_job(stall)
+    scheduler.start()
+    done.wait(2.0)
+    scheduler.stop()
+
+    assert scheduler.missed_ticks == 1
+    assert calls[1][0] - calls[0][1] > 0.25 * scheduler.period
+
+
+def test_driver_metrics() -> None:
+    """Test that the driver counts its traffic and decode failures."""
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(("127.0.0.1", 0))
+    server.settimeout(1.0)
+
+    metrics = DriverMetrics()
+    bravo = BravoDriver(metrics=metrics)
+    bravo.connect("127.0.0.1", server.getsockname()[1])
+    bravo.send(Packet(DeviceID.BEND_ELBOW, PacketID.MODE, b"\x00"))
+    _, address = server.recvfrom(256)
+
+    valid = Packet(DeviceID.BEND_ELBOW, PacketID.POSITION, struct.pack("<f", 1.0))
+    corrupted = bytearray(valid.encode())
+    corrupted[3] ^= 0x01
+    unknown = Packet(DeviceID.BEND_ELBOW, 0x7F, b"")
+
+    server.sendto(valid.encode() + bytes(corrupted) + unknown.encode(), address)
+
+    deadline = time.monotonic() + 1.0
+    while metrics.rx.datagrams == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    bravo.disconnect()
+    server.close()
+
+    snapshot = metrics.snapshot()
+
+    assert snapshot["rx"]["datagrams"] == 1
+    assert snapshot["rx"]["by_packet"]["POSITION"] == {"packets": 1, "bytes": 4}
+    assert snapshot["tx"]["by_device"]["BEND_ELBOW"] == {"packets": 1, "bytes": 1}
+    assert snapshot["errors"]["crc"] == 1
+    assert snapshot["errors"]["unknown_id"] == 1
+
+
+def test_driver_lifecycle() -> None:
+    """Test that the driver can be connected and disconnected repeatedly."""
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(("127.0.0.1", 0))
+
+    bravo = BravoDriver()
+
+    # Disconnecting a driver that was never connected is a no-op
+    bravo.disconnect()
+
+    start = time.monotonic()
+
+    for _ in range(20):
+        with bravo:
+            bravo.connect(*server.getsockname())
+
+            with pytest.raises(RuntimeError):
+                bravo.connect(*server.getsockname())
+
+    # Shutting down shouldn't wait for the poll timeout
+    assert time.monotonic() - start < 1.0
+    assert bravo.transport is None
+
+    server.close()
+
+
+def test_lazy_imports() -> None:
+    """Test that the package only loads the modules behind the exports that are used."""
+    script = (
+        "import sys\n"
+        "import pybravo\n"
+        "heavy = {'typing', 'asyncio', 'socket', 'pybravo.driver'}\n"
+        "heavy.add('pybravo.protocol')\n"
+        "assert not heavy & set(sys.modules), heavy & set(sys.modules)\n"
+        "from pybravo import BravoDriver\n"
+        "assert 'asyncio' not in sys.modules\n"
+        "assert 'pybravo.driver.shared' not in sys.modules\n"
+        "from pybravo import AsyncBravoDriver\n"
+        "assert 'asyncio' in sys.modules\n"
+    )
+
+    subprocess.run([sys.executable, "-c", script], check=True)
+
+    with pytest.raises(AttributeError):
+        pybravo.driver.NotAnExport  # noqa: B018
@@ -0,0 +1,119 @@
+# Copyright (c) 2023 Evan Palmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import threading
+import time
+
+import pytest  # noqa
+
+from pybravo import DeviceID, Packet, PacketID
+from pybravo.driver import BravoFleet
+from pybravo.driver.mixins import RequestsMixin
+from pybravo.protocol import decode_payload, encode_payload
+from pybravo.simulator import BravoSimulator
+
+
+def test_fleet_routes_by_address() -> None:
+    """Test that a fleet routes the replies from each arm to the right arm."""
+    with BravoSimulator() as port_sim, BravoSimulator() as starboard_sim:
+        fleet = BravoFleet(bind=("127.0.0.1", 0))
+        port = fleet.add_arm("port", *port_sim.address)
+        starboard = fleet.add_arm("starboard", *starboard_sim.address)
+        fleet.start()
+
+        port.send(encode_payload(DeviceID.BEND_ELBOW, PacketID.VELOCITY, 0.5))
+        time.sleep(0.05)
+
+        port_reply = port.request(DeviceID.BEND_ELBOW, PacketID.POSITION)
+        starboard_reply = starboard.request(DeviceID.BEND_ELBOW, PacketID.POSITION)
+
+        fleet.close()
+
+    assert decode_payload(port_reply)[0] > 0.0
+    assert decode_payload(starboard_reply)[0] == 0.0
+    assert port.state.positions()[4] > 0.0
+    assert starboard.state.positions()[4] == 0.0
+
+
+def test_fleet_arm_callbacks_and_timeouts() -> None:
+    """Test that each arm has its own callbacks and request timeouts."""
+    received: list[Packet] = []
+    delivered = threading.Event()
+
+    def on_position(packet: Packet) -> None:
+        received.append(packet)
+        delivered.set()
+
+    with BravoSimulator() as simulator:
+        fleet = BravoFleet(bind=("127.0.0.1", 0))
+        arm = fleet.add_arm("arm", *simulator.address)
+        silent = fleet.add_arm("silent", "127.0.0.1", 9)
+        arm.attach_callback(PacketID.POSITION, on_position, DeviceID.BEND_ELBOW)
+        fleet.start()
+
+        arm.request(DeviceID.BEND_ELBOW, PacketID.POSITION)
+        assert delivered.wait(1.0)
+
+        with pytest.raises(ValueError):
+            arm.request(DeviceID.ALL_JOINTS, PacketID.POSITION)
+
+        with pytest.raises(TimeoutError):
+            silent.request(DeviceID.BEND_ELBOW, PacketID.POSITION, timeout=0.05)
+
+        assert arm.detach_callback(PacketID.POSITION, on_position, DeviceID.BEND_ELBOW)
+        fleet.close()
+
+    assert [p.device_id for p in received] == [DeviceID.BEND_ELBOW]
+
+
+def test_fleet_stop_from_callback() -> None:
+    """Test that a callback on the selector thread can stop the fleet."""
+    stopped = threading.Event()
+
+    with BravoSimulator() as simulator:
+        fleet = BravoFleet(bind=("127.0.0.1", 0))
+        arm = fleet.add_arm("arm", *simulator.address)
+
+        def on_position(packet: Packet) -> None:
+            fleet.stop()
+            stopped.set()
+
+        arm.attach_callback(PacketID.POSITION, on_position)
+        fleet.start()
+        loop = fleet._loop_t
+
+        arm.request_future(DeviceID.BEND_ELBOW, PacketID.POSITION)
+
+        assert stopped.wait(1.0)
+        loop.join(1.0)  # type: ignore
+        assert not loop.is_alive()  # type: ignore
+
+        fleet.close()
+
+
+def test_requests_mixin_is_abstract() -> None:
+    """Test that a host class without a transport can't be created."""
+
+    class Unsendable(RequestsMixin):
+        def _wakeup(self) -> None:
+            """Do nothing."""
+
+    with pytest.raises(TypeError):
+        Unsendable()  # type: ignore
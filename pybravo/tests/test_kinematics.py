@@ -0,0 +1,233 @@
+# Copyright (c) 2023 Evan Palmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from __future__ import annotations
+
+import math
+import socket
+import struct
+import threading
+import time
+
+import pytest  # noqa
+
+from pybravo import BravoDriver, DeviceID, Packet, PacketID
+from pybravo.driver import CommandScheduler, JointStateCache
+from pybravo.protocol import decode_payload, encode_payload
+
+np = pytest.importorskip("numpy")
+kinematics = pytest.importorskip("pybravo.kinematics")
+
+
+def test_incremental_matches_batch() -> None:
+    """Test that the incremental model matches the batched model."""
+    rng = np.random.default_rng(0)
+    positions = rng.uniform(-math.pi, math.pi, (5, 7))
+    model = kinematics.BravoKinematics()
+
+    transforms = model.forward(positions)
+    jacobians = model.jacobian(positions)
+
+    assert transforms.shape == (5, 4, 4)
+    assert jacobians.shape == (5, 6, 7)
+
+    for sample, transform, jacobian in zip(  # noqa: B905
+        positions, transforms, jacobians
+    ):
+        for device_id, position in enumerate(sample, start=1):
+            model.on_position(
+                encode_payload(DeviceID(device_id), PacketID.POSITION, position)
+            )
+
+        # The packets carry single-precision floats
+        assert np.allclose(model.end_transform(), transform, atol=1e-5)
+        assert np.allclose(model.end_jacobian(), jacobian, atol=1e-5)
+        assert np.allclose(model.forward(sample), transform)
+
+
+def test_jacobian_matches_finite_differences() -> None:
+    """Test that the Jacobian predicts the motion of the tool."""
+    positions = np.array([0.0, 0.3, -0.7, 1.1, 0.4, -0.2, 0.5])
+    velocities = np.array([0.0, 0.2, -0.1, 0.3, 0.05, 0.4, -0.25])
+    model = kinematics.BravoKinematics()
+
+    step = 1e-6
+    before = model.forward(positions)
+    after = model.forward(positions + velocities * step)
+
+    # Compare the linear velocity, and the angular velocity from the skew-symmetric
+    # part of the rotation derivative
+    twist = model.jacobian(positions) @ velocities
+    spin = (after[:3, :3] - before[:3, :3]) / step @ before[:3, :3].T
+
+    assert np.allclose(twist[:3], (after[:3, 3] - before[:3, 3]) / step, atol=1e-5)
+    assert np.allclose(twist[3:], [spin[2, 1], spin[0, 2], spin[1, 0]], atol=1e-5)
+
+    # The jaws don't move the tool frame
+    assert not model.jacobian(positions)[:, 0].any()
+
+
+def test_decode_end_transforms() -> None:
+    """Test that end effector poses are decoded into transforms."""
+    pose = (100.0, -50.0, 250.0, 0.3, -0.2, 0.1)
+    packet = encode_payload(
+        DeviceID.ALL_JOINTS, PacketID.KM_END_POS, *pose, si_units=False
+    )
+
+    (transform,) = kinematics.decode_end_transforms([packet])
+
+    assert np.allclose(transform[:3, 3], [0.1, -0.05, 0.25])
+    assert np.allclose(kinematics.transform_to_pose(transform)[3:], pose[3:])
+
+
+def test_safety_model_packets() -> None:
+    """Test that the obstacles and limits are encoded into configuration packets."""
+    model = kinematics.SafetyModel()
+    model.add_box(kinematics.Box(0.1, 0.2, 0.3, 0.4, 0.5, 0.6))
+    model.add_cylinder(kinematics.Cylinder(0.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.1))
+    model.set_limits(PacketID.VELOCITY_LIMITS, DeviceID.BEND_ELBOW, -0.5, 0.5)
+
+    packets = model.packets()
+
+    assert [p.packet_id for p in packets] == [
+        PacketID.KM_BOX_OBSTACLE_02,
+        PacketID.KM_CYLINDER_OBSTACLE_02,
+        PacketID.VELOCITY_LIMITS,
+    ]
+    assert np.allclose(decode_payload(packets[0]), model.boxes[0])
+    assert np.allclose(decode_payload(packets[2]), (0.5, -0.5))
+
+    for _ in range(3):
+        model.add_box(model.boxes[0])
+
+    with pytest.raises(ValueError):
+        model.add_box(model.boxes[0])
+
+
+def test_safety_model_check() -> None:
+    """Test that commands outside of the limits or inside obstacles are rejected."""
+    model = kinematics.SafetyModel()
+    model.set_limits(PacketID.POSITION_LIMITS, DeviceID.BEND_ELBOW, 0.5, 3.0)
+    model.set_limits(PacketID.VELOCITY_LIMITS, DeviceID.BEND_ELBOW, -0.5, 0.5)
+
+    def command(packet_id: PacketID, value: float, device_id: DeviceID) -> list:
+        return [encode_payload(device_id, packet_id, value)]
+
+    model.check(command(PacketID.POSITION, 1.0, DeviceID.BEND_ELBOW))
+    model.check(command(PacketID.VELOCITY, 0.6, DeviceID.ROTATE_BASE))
+
+    for packet_id, value in (
+        (PacketID.POSITION, 3.5),
+        (PacketID.VELOCITY, -0.6),
+        (PacketID.VELOCITY, math.nan),
+    ):
+        with pytest.raises(kinematics.UnsafeCommandError):
+            model.check(command(packet_id, value, DeviceID.BEND_ELBOW))
+
+    # Surround the tool with a box at the current joint positions
+    state = JointStateCache()
+    positions = np.full(7, 1.0)
+
+    for device_id, position in enumerate(positions, start=1):
+        state.update(encode_payload(DeviceID(device_id), PacketID.POSITION, position))
+
+    x, y, z = model.kinematics.origins(positions)[-1]
+    model.add_box(
+        kinematics.Box(x - 0.01, y - 0.01, z - 0.01, x + 0.01, y + 0.01, z + 0.01)
+    )
+
+    with pytest.raises(kinematics.UnsafeCommandError):
+        model.check(command(PacketID.POSITION, 1.0, DeviceID.BEND_ELBOW), state)
+
+    model.check(command(PacketID.POSITION, 2.0, DeviceID.BEND_ELBOW), state)
+
+    # Commands to every joint are checked against the limits of each joint
+    with pytest.raises(kinematics.UnsafeCommandError):
+        model.check(command(PacketID.VELOCITY, 0.6, DeviceID.ALL_JOINTS))
+
+    model.check(command(PacketID.VELOCITY, 0.1, DeviceID.ALL_JOINTS))
+
+    # Moving every joint to its current position keeps the tool inside the box
+    with pytest.raises(kinematics.UnsafeCommandError):
+        model.check(command(PacketID.POSITION, 1.0, DeviceID.ALL_JOINTS), state)
+
+    # Commands for devices that aren't joints don't move the arm out of the box
+    with pytest.raises(kinematics.UnsafeCommandError):
+        model.check([Packet(0, PacketID.POSITION, struct.pack("<f", 2.0))], state)
+
+
+def test_driver_guard() -> None:
+    """Test that the driver doesn't send commands rejected by its guard."""
+    peer = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    peer.bind(("127.0.0.1", 0))
+    peer.settimeout(1.0)
+
+    model = kinematics.SafetyModel()
+    model.set_limits(PacketID.VELOCITY_LIMITS, DeviceID.BEND_ELBOW, -0.5, 0.5)
+
+    with BravoDriver() as bravo:
+        bravo.connect(*peer.getsockname())
+        bravo.attach_guard(model)
+
+        with pytest.raises(kinematics.UnsafeCommandError):
+            bravo.send_many(
+                [
+                    encode_payload(DeviceID.ROTATE_BASE, PacketID.VELOCITY, 0.1),
+                    encode_payload(DeviceID.BEND_ELBOW, PacketID.VELOCITY, 1.0),
+                ]
+            )
+
+        bravo.send(encode_payload(DeviceID.BEND_ELBOW, PacketID.VELOCITY, 0.1))
+
+        # Only the accepted command reaches the arm
+        data, _ = peer.recvfrom(4096)
+        assert decode_payload(Packet.decode(data)) == pytest.approx((0.1,))
+
+    peer.close()
+
+
+def test_scheduler_rejected_commands() -> None:
+    """Test that the scheduler keeps running when its commands are rejected."""
+    model = kinematics.SafetyModel()
+    model.set_limits(PacketID.VELOCITY_LIMITS, DeviceID.BEND_ELBOW, -0.5, 0.5)
+    sent: list[list[Packet]] = []
+    flushed = threading.Event()
+
+    class GuardedDriver:
+        def send_many(self, packets: list[Packet]) -> None:
+            packets = list(packets)
+            model.check(packets)
+            sent.append(packets)
+            flushed.set()
+
+    scheduler = CommandScheduler(GuardedDriver(), rate=200.0)  # type: ignore
+    scheduler.submit(encode_payload(DeviceID.BEND_ELBOW, PacketID.VELOCITY, 1.0))
+    scheduler.start()
+
+    deadline = time.monotonic() + 1.0
+    while scheduler.rejected_batches == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    scheduler.submit(encode_payload(DeviceID.BEND_ELBOW, PacketID.VELOCITY, 0.1))
+    flushed.wait(1.0)
+    scheduler.stop()
+
+    assert scheduler.rejected_batches == 1
+    assert [decode_payload(p) for p in sent[0]] == [pytest.approx((0.1,))]
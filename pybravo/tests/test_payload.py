@@ -0,0 +1,88 @@
+# Copyright (c) 2023 Evan Palmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import struct
+
+import pytest  # noqa
+
+from pybravo.protocol import (  # noqa
+    DeviceID,
+    Packet,
+    PacketID,
+    decode_batch,
+    decode_payload,
+    encode_payload,
+)
+from pybravo.protocol.payload import get_payload_codec
+
+
+def test_payload_unit_conversion() -> None:
+    """Test that the jaw position is converted between millimeters and meters."""
+    packet = encode_payload(DeviceID.LINEAR_JAWS, PacketID.POSITION, 0.01)
+
+    assert struct.unpack("<f", packet.data)[0] == pytest.approx(10.0)
+    assert decode_payload(packet) == pytest.approx((0.01,))
+    assert decode_payload(packet, si_units=False) == pytest.approx((10.0,))
+
+    packet = encode_payload(DeviceID.BEND_ELBOW, PacketID.POSITION, 1.5)
+    assert decode_payload(packet) == pytest.approx((1.5,))
+
+
+def test_payload_raw_ids() -> None:
+    """Test that codecs are looked up and applied using integer IDs."""
+    assert get_payload_codec(PacketID.POSITION.value) is get_payload_codec(
+        PacketID.POSITION
+    )
+
+    packet = encode_payload(DeviceID.LINEAR_JAWS.value, PacketID.POSITION.value, 0.01)
+    assert packet.device_id == DeviceID.LINEAR_JAWS
+    assert struct.unpack("<f", packet.data)[0] == pytest.approx(10.0)
+
+    with pytest.raises(KeyError):
+        get_payload_codec(0x7F)
+
+    with pytest.raises(ValueError):
+        encode_payload(DeviceID.BEND_ELBOW, PacketID.POSITION, 1.0, 2.0)
+
+
+def test_decode_batch() -> None:
+    """Test that many float payloads are decoded into a single array."""
+    np = pytest.importorskip("numpy")
+
+    packets = [
+        Packet(DeviceID(i), PacketID.POSITION, struct.pack("<f", i))
+        for i in range(1, 8)
+    ]
+    positions = decode_batch(packets, PacketID.POSITION)
+
+    expected = np.arange(1.0, 8.0)
+    expected[0] *= 0.001
+    assert positions.shape == (len(packets), 1)
+    np.testing.assert_allclose(positions[:, 0], expected, rtol=1e-6)
+
+    pose = encode_payload(
+        DeviceID.ALL_JOINTS, PacketID.KM_END_POS, 0.1, 0.2, 0.3, 0.0, 0.5, 1.0
+    )
+    np.testing.assert_allclose(
+        decode_batch([pose], PacketID.KM_END_POS)[0],
+        [0.1, 0.2, 0.3, 0.0, 0.5, 1.0],
+        rtol=1e-6,
+    )
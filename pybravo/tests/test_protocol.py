@@ -20,7 +20,9 @@
 
 import pytest  # noqa
 
-from pybravo.protocol import DeviceID, Packet, PacketID  # noqa
+from pybravo.protocol import DeviceID, Packet, PacketID, PacketStreamDecoder  # noqa
+from pybravo.protocol.codec import cobs_decode, cobs_encode, crc8
+from pybravo.protocol.stream import ReceiveRing, decode_in_place
 
 
 def test_packet_encoding() -> None:
@@ -40,3 +42,118 @@ def test_data_decoding() -> None:
     decoded_data = bytes([0x01, 0x02, 0x03, 0x04])
 
     assert decoded_data == Packet.decode(encoded_data).data
+
+
+def test_crc8_check_value() -> None:
+    """Test that the table-driven CRC matches the protocol CRC-8 check value."""
+    # The standard check value is the checksum of the ASCII string "123456789"
+    expected_check = 0x7B
+    expected_request_crc = 0x52
+
+    assert crc8(b"123456789") == expected_check
+    assert crc8(bytes([0x03, 0x60, 0x01, 0x05])) == expected_request_crc
+
+
+def test_cobs_round_trip() -> None:
+    """Test that the COBS encoding round-trips data with zeros and long runs."""
+    for data in (b"", b"\x00", b"\x00\x00", b"\x11\x00\x22", bytes(range(1, 256))):
+        encoded = cobs_encode(data)
+        assert 0 not in encoded
+        assert cobs_decode(encoded) == data
+
+    # A full block at the end of the data does not get a trailing code byte
+    assert cobs_encode(b"\x01" * 254) == b"\xff" + b"\x01" * 254
+
+
+def test_decode_invalid_crc() -> None:
+    """Test that frames with a corrupted checksum are rejected."""
+    with pytest.raises(ValueError):
+        Packet.decode(bytes([0x06, 0x03, 0x60, 0x01, 0x05, 0x53, 0x00]))
+
+
+def test_stream_decoder_splits_frames() -> None:
+    """Test that the stream decoder handles batched and partial frames."""
+    first = Packet(DeviceID.LINEAR_JAWS, PacketID.POSITION, b"\x01\x02\x03\x04")
+    second = Packet(DeviceID.BEND_ELBOW, PacketID.VELOCITY, b"\x00\x00\x80\x3f")
+    stream = first.encode() + second.encode()
+
+    errors = []
+    decoder = PacketStreamDecoder(on_error=lambda frame, e: errors.append(frame))
+
+    # Split the second frame across two chunks
+    packets = decoder.feed(stream[:-3])
+    assert [p.device_id for p in packets] == [DeviceID.LINEAR_JAWS]
+    assert decoder.pending > 0
+
+    packets = decoder.feed(stream[-3:])
+    assert [p.device_id for p in packets] == [DeviceID.BEND_ELBOW]
+    assert packets[0].data == second.data
+    assert decoder.pending == 0
+
+    # A corrupted frame should not prevent the following frames from being decoded
+    packets = decoder.feed(b"\x02\x01\x00" + first.encode())
+    assert len(packets) == 1
+    assert len(errors) == 1
+
+
+def test_encode_many_splits_at_mtu() -> None:
+    """Test that batched packets are packed into datagrams no larger than the MTU."""
+    packets = [
+        Packet(DeviceID(i), PacketID.POSITION, b"\x01\x02\x03\x04") for i in range(1, 8)
+    ]
+    frame_size = len(packets[0].encode())
+
+    datagrams = Packet.encode_many(packets)
+    assert datagrams == [b"".join(p.encode() for p in packets)]
+
+    # Only whole frames should be placed in each datagram
+    datagrams = Packet.encode_many(packets, mtu=frame_size * 3 + 1)
+    assert [len(d) for d in datagrams] == [frame_size * 3] * 2 + [frame_size]
+
+    with pytest.raises(ValueError):
+        Packet.encode_many(packets, mtu=frame_size - 1)
+
+
+def test_decode_in_place() -> None:
+    """Test that frames are decoded in place into views of the receive buffer."""
+    first = Packet(DeviceID.LINEAR_JAWS, PacketID.POSITION, b"\x01\x00\x00\x04")
+    second = Packet(DeviceID.BEND_ELBOW, PacketID.VELOCITY, bytes(range(1, 200)))
+    datagram = first.encode() + b"\x02\x01\x00" + second.encode()
+
+    ring = ReceiveRing(slots=2, size=512)
+    buffer, view = ring.next()
+    buffer[: len(datagram)] = datagram
+
+    errors = []
+    packets = decode_in_place(
+        buffer, view, len(datagram), lambda frame, e: errors.append(e)
+    )
+
+    assert [p.device_id for p in packets] == [first.device_id, second.device_id]
+    assert all(isinstance(p.data, memoryview) for p in packets)
+    assert packets[0].data == first.data
+    assert packets[1].data == second.data
+    assert len(errors) == 1
+
+    # The views change when the buffer is reused, so they can't be used as keys
+    with pytest.raises(TypeError):
+        hash(packets[0])
+
+    copy = Packet(packets[0].device_id, packets[0].packet_id, bytes(packets[0].data))
+    assert hash(copy) == hash(first)
+
+
+def test_packet_unknown_ids() -> None:
+    """Test that packets with unknown IDs are decoded using their integer IDs."""
+    encoded = Packet(0x42, 0x7A, b"\x01").encode()
+    packet = Packet.decode(encoded)
+
+    assert packet.device_id == packet.raw_device_id == 0x42  # noqa: PLR2004
+    assert packet.packet_id == packet.raw_packet_id == 0x7A  # noqa: PLR2004
+    assert packet == Packet(0x42, 0x7A, b"\x01")
+    assert Packet.decode(Packet(DeviceID(1), PacketID(3), b"").encode()).device_id == (
+        DeviceID.LINEAR_JAWS
+    )
+
+    with pytest.raises(AttributeError):
+        packet.data = b""  # type: ignore
@@ -0,0 +1,156 @@
+# Copyright (c) 2023 Evan Palmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from __future__ import annotations
+
+import os
+import struct
+from pathlib import Path
+
+import pytest  # noqa
+
+from pybravo import DeviceID, Packet, PacketID
+from pybravo.driver import TelemetryLog, TelemetryRecorder
+
+
+def record_positions(path: Path, count: int) -> list[Packet]:
+    """Record alternating position packets from two joints.
+
+    Args:
+        path: The path of the log to write.
+        count: The number of packets to record.
+
+    Returns:
+        The recorded packets.
+    """
+    packets = [
+        Packet(
+            DeviceID.BEND_ELBOW if i % 2 else DeviceID.ROTATE_BASE,
+            PacketID.POSITION,
+            struct.pack("<f", i),
+        )
+        for i in range(count)
+    ]
+
+    with TelemetryRecorder(path) as recorder:
+        for packet in packets:
+            recorder.record(packet)
+
+    return packets
+
+
+def test_record_and_read(tmp_path: Path) -> None:
+    """Test that recorded packets can be read, filtered, and seeked."""
+    path = tmp_path / "log.bravo"
+    packets = record_positions(path, 1000)
+
+    with TelemetryLog(path) as log:
+        records = list(log)
+
+        assert len(log) == len(packets)
+        assert [r.packet() for r in records] == packets
+
+        elbow = list(log.records(device_ids=[DeviceID.BEND_ELBOW]))
+        assert len(elbow) == len(packets) // 2
+
+        # Seeking by time should skip the earlier records
+        start = records[600].timestamp_ns
+        assert next(log.records(start_ns=start)).timestamp_ns >= start
+        assert len(list(log.records(start_ns=start))) <= 400  # noqa: PLR2004
+
+        replayed: list[Packet] = []
+        assert log.replay(replayed.append, speed=0) == len(packets)
+        assert replayed == packets
+
+        replayed.clear()
+        log.replay(replayed.append, speed=100.0, records=log.records(end_ns=start))
+        assert replayed == packets[: len(replayed)]
+        assert len(replayed) >= 601  # noqa: PLR2004
+
+
+def test_read_truncated_log(tmp_path: Path) -> None:
+    """Test that a log that wasn't closed cleanly can still be read."""
+    path = tmp_path / "log.bravo"
+    record_positions(path, 10)
+
+    # Drop the index and part of the last record
+    with open(path, "r+b") as file:
+        file.truncate(os.path.getsize(path) - 45)
+
+    with TelemetryLog(path) as log:
+        assert len(log) == 9  # noqa: PLR2004
+
+
+def test_export_arrays(tmp_path: Path) -> None:
+    """Test that the log can be exported as columnar arrays."""
+    np = pytest.importorskip("numpy")
+
+    path = tmp_path / "log.bravo"
+    record_positions(path, 10)
+
+    with TelemetryLog(path) as log:
+        arrays = log.to_arrays(PacketID.POSITION, device_ids=[DeviceID.ROTATE_BASE])
+
+    assert np.all(np.diff(arrays["timestamp_ns"]) >= 0)
+    assert arrays["device_id"].tolist() == [DeviceID.ROTATE_BASE.value] * 5
+    assert arrays["values"][:, 0].tolist() == [0.0, 2.0, 4.0, 6.0, 8.0]
+
+    # A filter that matches nothing exports empty arrays with the same columns
+    with TelemetryLog(path) as log:
+        empty = log.to_arrays(PacketID.VELOCITY)
+
+    assert empty["timestamp_ns"].shape == (0,)
+    assert empty["values"].shape == (0, 1)
+
+
+def test_record_receive_timestamps(tmp_path: Path) -> None:
+    """Test that records keep the receive timestamp and the frame from the wire."""
+    path = tmp_path / "log.bravo"
+    packet = Packet(DeviceID.BEND_ELBOW, PacketID.POSITION, struct.pack("<f", 1.0))
+
+    with TelemetryRecorder(path) as recorder:
+        recorder.record(packet, stamp=0.5)
+        recorder.record(packet)
+
+    with TelemetryLog(path) as log:
+        kernel, user = list(log)
+
+    assert kernel.timestamp_ns == 500_000_000  # noqa: PLR2004
+    assert user.timestamp_ns > kernel.timestamp_ns
+    assert kernel.frame == packet.encode()
+
+
+def test_record_only_while_running(tmp_path: Path) -> None:
+    """Test that packets aren't queued while the recorder is stopped."""
+    path = tmp_path / "log.bravo"
+    packet = Packet(DeviceID.BEND_ELBOW, PacketID.POSITION, struct.pack("<f", 1.0))
+    recorder = TelemetryRecorder(path)
+
+    recorder.record(packet)
+    assert recorder._queue.empty()
+
+    with recorder:
+        recorder.record(packet)
+
+    recorder.record(packet)
+    assert recorder._queue.empty()
+
+    with TelemetryLog(path) as log:
+        assert len(log) == 1
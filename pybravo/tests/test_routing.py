@@ -0,0 +1,92 @@
+# Copyright (c) 2023 Evan Palmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from __future__ import annotations
+
+import pytest  # noqa
+
+from pybravo import DeviceID, Packet, PacketID
+from pybravo.driver import CallbackRouter
+
+
+def on_elbow_position(packet: Packet) -> None:
+    """Receive the elbow position packets."""
+
+
+def on_position(packet: Packet) -> None:
+    """Receive the position packets."""
+
+
+def on_elbow(packet: Packet) -> None:
+    """Receive the elbow packets."""
+
+
+def on_any(packet: Packet) -> None:
+    """Receive every packet."""
+
+
+def test_routing_wildcards() -> None:
+    """Test that packets are routed to the exact and wildcard subscriptions."""
+    router = CallbackRouter()
+    router.attach(on_any)
+    router.attach(on_elbow_position, PacketID.POSITION, DeviceID.BEND_ELBOW)
+    router.attach(on_position, PacketID.POSITION)
+    router.attach(on_elbow, device_id=DeviceID.BEND_ELBOW)
+
+    # Duplicate subscriptions are ignored
+    router.attach(on_position, PacketID.POSITION)
+    assert len(router) == 4  # noqa: PLR2004
+
+    def route(device_id: DeviceID | int, packet_id: PacketID | int) -> tuple:
+        return router.route(Packet(device_id, packet_id, b""))
+
+    assert route(DeviceID.BEND_ELBOW, PacketID.POSITION) == (
+        on_any,
+        on_elbow_position,
+        on_position,
+        on_elbow,
+    )
+    assert route(DeviceID.ROTATE_BASE, PacketID.POSITION) == (on_any, on_position)
+    assert route(DeviceID.BEND_ELBOW, PacketID.VELOCITY) == (on_any, on_elbow)
+    assert route(DeviceID.ROTATE_BASE, PacketID.VELOCITY) == (on_any,)
+
+    # Packets with unknown IDs are routed to the wildcard subscriptions
+    assert route(0xEE, 0xEE) == (on_any,)
+
+
+def test_routing_detach() -> None:
+    """Test that detached callbacks no longer receive packets."""
+    router = CallbackRouter()
+    router.attach(on_position, PacketID.POSITION)
+    router.attach(on_elbow_position, PacketID.POSITION, DeviceID.BEND_ELBOW)
+
+    packet = Packet(DeviceID.BEND_ELBOW, PacketID.POSITION, b"")
+
+    # The callback must be detached using the IDs that it was attached with
+    assert not router.detach(on_position)
+    assert router.detach(on_position, PacketID.POSITION)
+    assert not router.detach(on_position, PacketID.POSITION)
+
+    assert router.route(packet) == (on_elbow_position,)
+
+    router.detach(on_elbow_position, PacketID.POSITION, DeviceID.BEND_ELBOW)
+
+    assert router.route(packet) == ()
+    assert len(router) == 0
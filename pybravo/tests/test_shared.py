@@ -0,0 +1,152 @@
+# Copyright (c) 2023 Evan Palmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import queue
+import time
+
+import pytest  # noqa
+
+from pybravo import BravoDriver, DeviceID, PacketID
+from pybravo.driver import TelemetryPublisher, TelemetrySubscriber
+from pybravo.driver.shared import COMMAND_TIMEOUT, LANE_CAPACITY, MAX_LANES
+from pybravo.protocol import decode_payload, encode_payload
+from pybravo.simulator import BravoSimulator
+
+
+def test_shared_telemetry() -> None:
+    """Test that subscribers receive the state and packets, and can send commands."""
+    name = f"pybravo-test-{os.getpid()}"
+
+    with BravoSimulator() as simulator, BravoDriver() as bravo:
+        bravo.connect(*simulator.address)
+
+        with TelemetryPublisher(bravo, name), TelemetrySubscriber(name) as subscriber:
+            reply = bravo.request(DeviceID.BEND_ELBOW, PacketID.POSITION)
+
+            (packet,) = subscriber.read()
+            assert packet == reply
+            assert subscriber.positions()[4] == decode_payload(reply)[0]
+            assert subscriber.get(DeviceID.BEND_ELBOW).stamp > 0
+
+            # Commands are forwarded to the arm by the publisher
+            subscriber.send(encode_payload(DeviceID.BEND_ELBOW, PacketID.VELOCITY, 0.5))
+            time.sleep(0.05)
+
+            moved = bravo.request(DeviceID.BEND_ELBOW, PacketID.POSITION)
+            assert decode_payload(moved)[0] > decode_payload(reply)[0]
+
+
+def test_shared_telemetry_overrun() -> None:
+    """Test that subscribers skip the packets that were overwritten."""
+    name = f"pybravo-test-{os.getpid()}"
+    packets = [
+        encode_payload(DeviceID.ROTATE_BASE, PacketID.POSITION, float(i))
+        for i in range(20)
+    ]
+
+    with TelemetryPublisher(BravoDriver(), name, capacity=8) as publisher:
+        with TelemetrySubscriber(name) as subscriber:
+            for packet in packets:
+                publisher.publish(packet)
+
+            assert subscriber.read(max_packets=4) == packets[-8:-4]
+            assert subscriber.read() == packets[-4:]
+            assert subscriber.dropped == 12  # noqa: PLR2004
+            assert subscriber.positions()[6] == 19.0  # noqa: PLR2004
+
+    # The segment is removed when the publisher stops
+    with pytest.raises(FileNotFoundError):
+        TelemetrySubscriber(name)
+
+
+def test_shared_telemetry_zero_copy() -> None:
+    """Test that zero-copy subscribers can close while their packets are referenced."""
+    name = f"pybravo-test-{os.getpid()}"
+    packet = encode_payload(DeviceID.ROTATE_BASE, PacketID.POSITION, 1.0)
+
+    with TelemetryPublisher(BravoDriver(), name) as publisher:
+        with TelemetrySubscriber(name, zero_copy=True) as subscriber:
+            publisher.publish(packet)
+
+            packets = subscriber.read()
+            assert isinstance(packets[0].data, memoryview)
+            assert packets == [packet]
+
+        # The views are released when the subscriber is closed
+        with pytest.raises(ValueError):
+            bytes(packets[0].data)
+
+
+def test_shared_command_lanes() -> None:
+    """Test that each subscriber claims a lane, and that lanes are reclaimed."""
+    name = f"pybravo-test-{os.getpid()}"
+    command = encode_payload(DeviceID.BEND_ELBOW, PacketID.VELOCITY, 0.0)
+
+    with TelemetryPublisher(BravoDriver(), name):
+        subscribers = [TelemetrySubscriber(name) for _ in range(MAX_LANES + 1)]
+
+        for subscriber in subscribers[:-1]:
+            subscriber.send(command)
+
+        with pytest.raises(RuntimeError):
+            subscribers[-1].send(command)
+
+        # Closing a subscriber releases its lane to the next one that sends a command
+        subscribers[2].close()
+        subscribers[-1].send(command)
+        assert subscribers[-1]._lane == 2  # noqa: PLR2004
+
+        for subscriber in subscribers[:2] + subscribers[3:]:
+            subscriber.close()
+
+
+def test_shared_command_lane_full() -> None:
+    """Test that a subscriber can't queue more commands than its lane holds."""
+    name = f"pybravo-test-{os.getpid()}"
+    command = encode_payload(DeviceID.BEND_ELBOW, PacketID.VELOCITY, 0.0)
+
+    # Don't drain the lanes while the test is running
+    publisher = TelemetryPublisher(BravoDriver(), name)
+    publisher.poll_interval = 60.0
+
+    with publisher, TelemetrySubscriber(name) as subscriber:
+        subscriber.send_many([command] * LANE_CAPACITY)
+
+        with pytest.raises(queue.Full):
+            subscriber.send(command)
+
+
+def test_shared_stale_commands() -> None:
+    """Test that commands older than the timeout are dropped instead of being sent."""
+    name = f"pybravo-test-{os.getpid()}"
+    stale = encode_payload(DeviceID.BEND_ELBOW, PacketID.VELOCITY, 0.0)
+    fresh = encode_payload(DeviceID.BEND_ELBOW, PacketID.VELOCITY, 0.1)
+
+    publisher = TelemetryPublisher(BravoDriver(), name)
+    publisher.poll_interval = 60.0
+
+    with publisher, TelemetrySubscriber(name) as subscriber:
+        subscriber.send(stale)
+        time.sleep(2 * COMMAND_TIMEOUT)
+        subscriber.send(fresh)
+
+        assert publisher._drain() == [fresh]
+        assert publisher.dropped_commands == 1
@@ -0,0 +1,145 @@
+# Copyright (c) 2023 Evan Palmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from __future__ import annotations
+
+import socket
+import threading
+import time
+
+import pytest  # noqa
+
+from pybravo import BravoDriver, DeviceID, Packet, PacketID
+from pybravo.protocol import PacketStreamDecoder, decode_payload, encode_payload
+from pybravo.simulator import BravoSimulator, Impairments
+
+
+def test_simulator_request_reply() -> None:
+    """Test that the simulator replies to requests from the driver."""
+    with BravoSimulator() as simulator:
+        bravo = BravoDriver()
+        bravo.connect(*simulator.address)
+
+        bravo.send(encode_payload(DeviceID.BEND_ELBOW, PacketID.VELOCITY, 0.5))
+        time.sleep(0.05)
+
+        reply = bravo.request(DeviceID.BEND_ELBOW, PacketID.POSITION)
+        bravo.disconnect()
+
+    (position,) = decode_payload(reply)
+    assert 0.0 < position < 1.0
+
+
+def test_simulator_heartbeat() -> None:
+    """Test that the simulator streams the configured heartbeat."""
+    received: list[Packet] = []
+    streamed = threading.Event()
+
+    def on_position(packet: Packet) -> None:
+        received.append(packet)
+
+        if len(received) >= 14:  # noqa: PLR2004
+            streamed.set()
+
+    with BravoSimulator() as simulator:
+        bravo = BravoDriver()
+        bravo.attach_callback(PacketID.POSITION, on_position)
+        bravo.connect(*simulator.address)
+
+        bravo.send_many(
+            [
+                Packet(
+                    DeviceID.ALL_JOINTS,
+                    PacketID.HEARTBEAT_SET,
+                    bytes([PacketID.POSITION.value]),
+                ),
+                Packet(DeviceID.ALL_JOINTS, PacketID.HEARTBEAT_FREQUENCY, bytes([100])),
+            ]
+        )
+
+        assert streamed.wait(1.0)
+        bravo.disconnect()
+
+    assert {p.device_id for p in received} == {
+        d for d in DeviceID if 0 < d.value < 8  # noqa: PLR2004
+    }
+
+
+def run_impaired(seed: int) -> tuple[int, int, int]:
+    """Request positions from a simulator with a lossy, corrupting link.
+
+    Args:
+        seed: The seed of the simulator.
+
+    Returns:
+        The number of dropped, corrupted, and reordered datagrams.
+    """
+    impairments = Impairments(loss=0.2, reorder=0.2, corruption=0.2)
+    request = Packet(
+        DeviceID.BEND_ELBOW, PacketID.REQUEST, bytes([PacketID.POSITION.value])
+    ).encode()
+
+    client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    client.settimeout(0.01)
+    decoder = PacketStreamDecoder()
+
+    with BravoSimulator(impairments=impairments, seed=seed) as simulator:
+        for _ in range(100):
+            client.sendto(request, simulator.address)
+
+            try:
+                decoder.feed(client.recv(256))
+            except socket.timeout:
+                ...
+
+    client.close()
+
+    return simulator.dropped, simulator.corrupted, simulator.reordered
+
+
+def test_simulator_impairments_are_reproducible() -> None:
+    """Test that seeded impairments are injected reproducibly."""
+    dropped, corrupted, reordered = run_impaired(seed=1)
+
+    assert dropped > 0
+    assert corrupted > 0
+    assert reordered > 0
+    assert run_impaired(seed=1) == (dropped, corrupted, reordered)
+
+
+def test_simulator_survives_malformed_packets() -> None:
+    """Test that malformed packets are skipped and held datagrams are released."""
+    client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    client.settimeout(1.0)
+
+    # Every datagram is held back, so each reply is only sent once its hold expires
+    with BravoSimulator(impairments=Impairments(reorder=1.0), seed=0) as simulator:
+        short = Packet(DeviceID.BEND_ELBOW, PacketID.POSITION, b"\x01")
+        request = Packet(DeviceID.BEND_ELBOW, PacketID.REQUEST, b"\x03")
+        client.sendto(short.encode() + request.encode(), simulator.address)
+
+        data, _ = client.recvfrom(4096)
+        (reply,) = PacketStreamDecoder().feed(data)
+
+        assert reply.packet_id == PacketID.POSITION
+        assert simulator.malformed == 1
+        assert simulator.reordered == 1
+
+    client.close()
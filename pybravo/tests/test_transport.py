@@ -0,0 +1,243 @@
+# Copyright (c) 2023 Evan Palmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from __future__ import annotations
+
+import os
+import select
+import socket
+import struct
+import sys
+import threading
+import time
+
+import pytest  # noqa
+
+from pybravo import BravoDriver, DeviceID, Packet, PacketID
+from pybravo.driver import (
+    SerialTransport,
+    SocketOptions,
+    TcpTransport,
+    Transport,
+    UdpTransport,
+    mmsg,
+)
+from pybravo.simulator import BravoSimulator
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Requires a POSIX pty.")
+def test_serial_transport() -> None:
+    """Test that the driver can communicate over a serial port."""
+    controller, port = os.openpty()
+    received: list[Packet] = []
+    done = threading.Event()
+
+    def on_position(packet: Packet) -> None:
+        received.append(packet)
+
+        if len(received) == 3:  # noqa: PLR2004
+            done.set()
+
+    bravo = BravoDriver()
+    bravo.attach_callback(PacketID.POSITION, on_position)
+    bravo.connect(transport=SerialTransport(os.ttyname(port)))
+
+    # Split the frames across writes so that they have to be reassembled
+    stream = b"".join(
+        Packet(DeviceID(i), PacketID.POSITION, struct.pack("<f", i)).encode()
+        for i in range(1, 4)
+    )
+    os.write(controller, stream[:5])
+    os.write(controller, stream[5:])
+
+    assert done.wait(1.0)
+
+    command = Packet(DeviceID.BEND_ELBOW, PacketID.VELOCITY, struct.pack("<f", 0.5))
+    bravo.send(command)
+    assert os.read(controller, 256) == command.encode()
+
+    bravo.disconnect()
+    os.close(controller)
+    os.close(port)
+
+    assert [p.raw_device_id for p in received] == [1, 2, 3]
+
+
+def test_tcp_transport() -> None:
+    """Test that the driver can request packets over a TCP stream."""
+    server = socket.create_server(("127.0.0.1", 0))
+    reply = Packet(DeviceID.BEND_ELBOW, PacketID.POSITION, struct.pack("<f", 1.0))
+
+    def serve() -> None:
+        conn, _ = server.accept()
+
+        with conn:
+            conn.recv(256)
+            conn.sendall(reply.encode())
+            conn.recv(256)
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+
+    bravo = BravoDriver()
+    bravo.connect(transport=TcpTransport(*server.getsockname()))
+
+    assert bravo.request(DeviceID.BEND_ELBOW, PacketID.POSITION) == reply
+
+    bravo.disconnect()
+    thread.join()
+    server.close()
+
+
+def test_transport_interface(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that incomplete transports are rejected and failed opens are cleaned up."""
+
+    class ReadOnlyTransport(Transport):
+        def read(self) -> bytes:
+            return b""
+
+    with pytest.raises(TypeError):
+        ReadOnlyTransport()  # type: ignore
+
+    class UnconfigurableSocket:
+        closed = False
+
+        def settimeout(self, timeout: float | None) -> None:
+            ...
+
+        def setsockopt(self, *args: int) -> None:
+            raise OSError("Unsupported option.")
+
+        def close(self) -> None:
+            self.closed = True
+
+    sock = UnconfigurableSocket()
+    monkeypatch.setattr(socket, "create_connection", lambda *args: sock)
+
+    transport = TcpTransport("127.0.0.1", 9)
+
+    with pytest.raises(OSError):
+        transport.open()
+
+    assert sock.closed
+    assert transport.sock is None
+
+
+def test_driver_reconnects() -> None:
+    """Test that the driver reopens a transport that was closed by the server."""
+    server = socket.create_server(("127.0.0.1", 0))
+    connections = []
+
+    def serve() -> None:
+        # Drop the first connection and keep the second one open
+        conn, _ = server.accept()
+        conn.close()
+
+        conn, _ = server.accept()
+        connections.append(conn)
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+
+    connected = threading.Semaphore(0)
+
+    with BravoDriver() as bravo:
+        bravo.attach_connect_callback(connected.release)
+        bravo.connect(transport=TcpTransport(*server.getsockname()))
+
+        # The connect callbacks run again once the connection has been re-established
+        assert connected.acquire(timeout=1.0)
+        assert connected.acquire(timeout=2.0)
+
+    thread.join(1.0)
+
+    for conn in connections:
+        conn.close()
+
+    server.close()
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Requires Linux.")
+@pytest.mark.parametrize("batched_calls", [True, False])
+def test_udp_transport_batches(batched_calls: bool, monkeypatch) -> None:
+    """Test that the UDP transport reads and writes batches of timestamped datagrams."""
+    if not batched_calls:
+        monkeypatch.setattr(mmsg, "AVAILABLE", False)
+
+    peer = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    peer.bind(("127.0.0.1", 0))
+
+    options = SocketOptions(
+        recv_buffer_size=1 << 16, dscp=46, timestamps=True, batch_size=8
+    )
+    transport = UdpTransport(*peer.getsockname(), options)
+    transport.open()
+
+    # The kernel reports double the requested size on Linux
+    assert transport.sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF) >= 1 << 16
+    assert transport.sock.getsockopt(socket.IPPROTO_IP, socket.IP_TOS) == 46 << 2
+
+    transport.send_batch([bytes([i]) * 8 for i in range(12)])
+
+    for _ in range(12):
+        data, address = peer.recvfrom(64)
+        peer.sendto(data, address)
+
+    received = []
+
+    while len(received) < 12:  # noqa: PLR2004
+        select.select([transport], [], [], 1.0)
+        batch = transport.read_batch()
+
+        assert 0 < len(batch) <= options.batch_size
+        received += batch
+
+    assert [d.data for d in received] == [bytes([i]) * 8 for i in range(12)]
+
+    # The kernel timestamps are converted to the monotonic clock
+    for datagram in received:
+        assert datagram.stamp is not None
+        assert 0 <= time.monotonic() - datagram.stamp < 1.0
+
+    transport.close()
+    peer.close()
+
+
+def test_udp_transport_options() -> None:
+    """Test that invalid socket options are rejected."""
+    with pytest.raises(ValueError):
+        UdpTransport(options=SocketOptions(dscp=64))
+
+    with pytest.raises(ValueError):
+        UdpTransport(options=SocketOptions(batch_size=0))
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Requires Linux.")
+def test_driver_batched_receive() -> None:
+    """Test that the driver stamps the joint state using the kernel timestamps."""
+    options = SocketOptions(timestamps=True, batch_size=16)
+
+    with BravoSimulator() as simulator, BravoDriver() as bravo:
+        bravo.connect(transport=UdpTransport(*simulator.address, options))
+
+        before = time.monotonic()
+        bravo.request(DeviceID.BEND_ELBOW, PacketID.POSITION)
+
+        assert before <= bravo.state.get(DeviceID.BEND_ELBOW).stamp <= time.monotonic()